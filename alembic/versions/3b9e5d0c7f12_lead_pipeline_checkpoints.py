@@ -0,0 +1,28 @@
+"""leads.amo_contact_id / amo_note_id pipeline checkpoints
+
+Revision ID: 3b9e5d0c7f12
+Revises: e4a7c2f91b35
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e5d0c7f12'
+down_revision: Union[str, None] = 'e4a7c2f91b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('leads', sa.Column('amo_contact_id', sa.BigInteger(), nullable=True))
+    op.add_column('leads', sa.Column('amo_note_id', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('leads', 'amo_note_id')
+    op.drop_column('leads', 'amo_contact_id')
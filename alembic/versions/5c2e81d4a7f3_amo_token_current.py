@@ -0,0 +1,56 @@
+"""amo_token_current single row, compact amo_tokens history
+
+Revision ID: 5c2e81d4a7f3
+Revises: ba146966ed64
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e81d4a7f3'
+down_revision: Union[str, None] = 'ba146966ed64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same default as AMOCRM_TOKEN_HISTORY_KEEP
+HISTORY_KEEP = 20
+
+
+def upgrade() -> None:
+    op.create_table('amo_token_current',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('access_token', sa.Text(), nullable=False),
+    sa.Column('refresh_token', sa.Text(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.CheckConstraint('id = 1', name='ck_amo_token_current_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        """
+        INSERT INTO amo_token_current (id, access_token, refresh_token, expires_at)
+        SELECT 1, access_token, refresh_token, expires_at
+        FROM amo_tokens
+        ORDER BY id DESC
+        LIMIT 1
+        """
+    )
+    op.execute(
+        f"""
+        DELETE FROM amo_tokens
+        WHERE id <= (
+            SELECT id FROM amo_tokens ORDER BY id DESC OFFSET {HISTORY_KEEP} LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    # Pruned history can't be restored; the current pair is still the
+    # newest amo_tokens row, which is what the old lookup reads.
+    op.drop_table('amo_token_current')
@@ -0,0 +1,41 @@
+"""leads.next_retry_at backoff schedule, due-lead index, dead letters
+
+Revision ID: a71c4e2d9b08
+Revises: 3b9e5d0c7f12
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71c4e2d9b08'
+down_revision: Union[str, None] = '3b9e5d0c7f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same default as RETRY_MAX_ATTEMPTS (and the old get_failed_leads limit)
+MAX_RETRIES = 5
+
+
+def upgrade() -> None:
+    # The retry lease becomes the schedule: the column keeps its meaning
+    # while a sweep holds the lead and otherwise says when it is due
+    op.alter_column('leads', 'locked_until', new_column_name='next_retry_at')
+    op.create_index(
+        'idx_leads_retry_due', 'leads', ['next_retry_at'],
+        unique=False, postgresql_where=sa.text("status = 'error'"),
+    )
+    op.execute(
+        f"UPDATE leads SET status = 'dead' "
+        f"WHERE status = 'error' AND retry_count >= {MAX_RETRIES}"
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE leads SET status = 'error' WHERE status = 'dead'")
+    op.drop_index('idx_leads_retry_due', table_name='leads', postgresql_where=sa.text("status = 'error'"))
+    op.alter_column('leads', 'next_retry_at', new_column_name='locked_until')
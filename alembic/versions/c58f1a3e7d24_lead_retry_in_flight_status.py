@@ -0,0 +1,40 @@
+"""leads 'retrying' status for leased retries; due-lead index covers it
+
+Revision ID: c58f1a3e7d24
+Revises: a71c4e2d9b08
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c58f1a3e7d24'
+down_revision: Union[str, None] = 'a71c4e2d9b08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A claimed lead is 'retrying' until its lease expires, so a CRM
+    # recovery can make 'error' leads due now without touching it
+    op.drop_index('idx_leads_retry_due', table_name='leads', postgresql_where=sa.text("status = 'error'"))
+    op.create_index(
+        'idx_leads_retry_due', 'leads', ['next_retry_at'],
+        unique=False, postgresql_where=sa.text("status IN ('error', 'retrying')"),
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE leads SET status = 'error' WHERE status = 'retrying'")
+    op.drop_index(
+        'idx_leads_retry_due', table_name='leads',
+        postgresql_where=sa.text("status IN ('error', 'retrying')"),
+    )
+    op.create_index(
+        'idx_leads_retry_due', 'leads', ['next_retry_at'],
+        unique=False, postgresql_where=sa.text("status = 'error'"),
+    )
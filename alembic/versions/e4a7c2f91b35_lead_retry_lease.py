@@ -0,0 +1,26 @@
+"""leads.locked_until lease for the retry sweep
+
+Revision ID: e4a7c2f91b35
+Revises: 8d1f3b6e9a20
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c2f91b35'
+down_revision: Union[str, None] = '8d1f3b6e9a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('leads', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('leads', 'locked_until')
@@ -0,0 +1,94 @@
+"""Local HTTP stand-in for the AmoCRM API v4, used by benchmark scripts.
+
+Serves structurally valid responses for the endpoints the bot calls and
+can inject a fixed latency per request to emulate a remote server.
+"""
+
+import asyncio
+import itertools
+
+from aiohttp import web
+
+_ids = itertools.count(1000)
+
+
+class StubAuth:
+    """Minimal stand-in for AmoCRMAuth pointing at a local server."""
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+
+    async def get_access_token(self) -> str:
+        return "stub-token"
+
+    async def handle_401(self, rejected_token: str | None = None) -> None:
+        pass
+
+
+def _created(key: str, items: list) -> web.Response:
+    return web.json_response({
+        "_embedded": {
+            key: [
+                {"id": next(_ids), "request_id": str(i)}
+                for i in range(len(items) or 1)
+            ]
+        }
+    })
+
+
+def create_stub_app(latency: float = 0.0) -> web.Application:
+    """Build an aiohttp app emulating AmoCRM with ``latency`` seconds per call."""
+
+    @web.middleware
+    async def latency_mw(request: web.Request, handler):
+        request.app["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def find_contacts(_request: web.Request) -> web.Response:
+        return web.json_response({"_embedded": {"contacts": []}})
+
+    async def create_contacts(request: web.Request) -> web.Response:
+        return _created("contacts", await request.json())
+
+    async def update_contacts(_request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def create_leads(request: web.Request) -> web.Response:
+        return _created("leads", await request.json())
+
+    async def create_complex(request: web.Request) -> web.Response:
+        return web.json_response([
+            {
+                "id": next(_ids),
+                "contact_id": next(_ids),
+                "company_id": None,
+                "request_id": [str(i)],
+                "merged": False,
+            }
+            for i in range(len(await request.json()))
+        ])
+
+    async def create_notes(request: web.Request) -> web.Response:
+        return _created("notes", await request.json())
+
+    app = web.Application(middlewares=[latency_mw])
+    app["requests"] = 0
+    app.router.add_get("/api/v4/contacts", find_contacts)
+    app.router.add_post("/api/v4/contacts", create_contacts)
+    app.router.add_patch("/api/v4/contacts", update_contacts)
+    app.router.add_post("/api/v4/leads", create_leads)
+    app.router.add_post("/api/v4/leads/complex", create_complex)
+    app.router.add_post("/api/v4/leads/{lead_id}/notes", create_notes)
+    return app
+
+
+async def start_stub_server(latency: float = 0.0) -> tuple[web.AppRunner, str]:
+    """Start the stand-in on a free local port. Returns (runner, base_url)."""
+    runner = web.AppRunner(create_stub_app(latency))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
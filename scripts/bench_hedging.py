@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Simulated classify latency with and without hedged fallback requests.
+
+Replays REQUESTS classifications against a stand-in for the OpenAI API
+whose primary model is usually fast but stalls on a share of calls (the
+tail that dominates p99), once with AI_HEDGE_ENABLED off and once on.
+Latencies are scaled down (1 simulated second = SCALE real seconds) and
+random but seeded, so runs are comparable. Reports p50/p90/p99 latency
+and the extra model calls the hedges cost.
+
+No network or database needed.
+
+Usage:
+    python -m scripts.bench_hedging [REQUESTS] [STALL_SHARE]
+"""
+
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.insert(0, ".")
+
+from src.config import settings
+from src.services.openai_client import client as client_module
+from src.services.openai_client.client import OpenAIClient
+
+SCALE = 0.02
+CONCURRENCY = 20
+# Simulated seconds: (median, stalled) per model
+LATENCY = {
+    settings.OPENAI_MODEL: (1.2, 9.0),
+    settings.OPENAI_FALLBACK_MODEL: (2.0, 12.0),
+}
+REPLY = json.dumps({"intent": "sell", "confidence": 0.9, "entities": {}, "reply": "ok"})
+
+
+class StubOpenAI:
+    """Just enough of AsyncOpenAI for ``_call_model``."""
+
+    def __init__(self, stall_share: float, seed: int) -> None:
+        self.calls = 0
+        self._stall_share = stall_share
+        self._random = random.Random(seed)
+        self.chat = MagicMock()
+        self.chat.completions.create = self._create
+
+    async def _create(self, *, model: str, timeout: float, **kwargs):
+        self.calls += 1
+        median, stalled = LATENCY[model]
+        seconds = self._random.lognormvariate(0, 0.3) * median
+        if self._random.random() < self._stall_share:
+            seconds = stalled
+        if seconds > timeout / SCALE:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"{model} timed out")
+        await asyncio.sleep(seconds * SCALE)
+        completion = MagicMock()
+        completion.choices[0].message.content = REPLY
+        return completion
+
+    async def close(self) -> None:
+        pass
+
+
+async def run(requests: int, stall_share: float, hedge: bool) -> tuple[list[float], int]:
+    settings.AI_HEDGE_ENABLED = hedge
+    # Timeouts are in real seconds: scale them along with latency
+    settings.AI_TIMEOUT_MIN_SECONDS = 2.0 * SCALE
+    client_module.REQUEST_TIMEOUT = 10 * SCALE
+    stub = StubOpenAI(stall_share, seed=42)
+    client = OpenAIClient(client=stub)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    timings = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await client.classify(f"продам машину {i}")
+            timings.append((time.perf_counter() - start) / SCALE)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return timings, stub.calls
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q * 100) - 1]
+
+
+async def main() -> None:
+    logging.disable(logging.CRITICAL)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    stall_share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.03
+
+    print(f"{requests} requests, {stall_share:.0%} of calls stall, simulated seconds\n")
+    print(f"{'mode':>10} {'p50':>6} {'p90':>6} {'p99':>6} {'calls':>6} {'extra':>6}")
+    for hedge in (False, True):
+        timings, calls = await run(requests, stall_share, hedge)
+        print(
+            f"{'hedged' if hedge else 'sequential':>10} "
+            f"{percentile(timings, 0.5):>6.2f} {percentile(timings, 0.9):>6.2f} "
+            f"{percentile(timings, 0.99):>6.2f} {calls:>6} {calls / requests - 1:>6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
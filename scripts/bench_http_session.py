@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Benchmark per-lead AmoCRM latency with and without the pooled HTTP session.
+
+Runs the classic lead pipeline (find contact -> create contact -> create
+lead -> add note) against a local AmoCRM stand-in, once opening a new
+aiohttp session per request and once reusing ``create_http_session()``.
+
+Usage:
+    python -m scripts.bench_http_session [LEADS] [LATENCY_MS]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from scripts.amocrm_stub import StubAuth, start_stub_server
+from src.services.amocrm.client import AmoCRMClient
+from src.services.amocrm.contacts import ContactsService
+from src.services.amocrm.http import create_http_session
+from src.services.amocrm.leads import LeadsService
+from src.services.amocrm.notes import NotesService
+from src.services.amocrm.rate_limiter import PriorityRateLimiter
+
+
+async def run_leads(client: AmoCRMClient, count: int) -> list[float]:
+    contacts = ContactsService(client)
+    leads = LeadsService(client)
+    notes = NotesService(client)
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        phone = f"+7999{i:07d}"
+        existing = await contacts.find_by_phone(phone)
+        if existing:
+            contact_id = existing["id"]
+        else:
+            contact_id = await contacts.create("Bench", phone, telegram_id=i)
+        lead_id = await leads.create("Bench lead", contact_id, "sell", {})
+        await notes.add_to_lead(lead_id, "bench")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<16} mean={statistics.mean(timings):7.2f}ms "
+        f"p50={statistics.median(timings):7.2f}ms p95={p95:7.2f}ms"
+    )
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    runner, base_url = await start_stub_server(latency_ms / 1000)
+    auth = StubAuth(base_url)
+    try:
+        # Rate limiting disabled: measure transport cost only
+        unlimited = PriorityRateLimiter(rate=0, burst=1)
+        per_request = await run_leads(
+            AmoCRMClient(auth, rate_limiter=unlimited), count,
+        )
+
+        http_session = create_http_session()
+        try:
+            pooled = await run_leads(
+                AmoCRMClient(auth, http_session=http_session, rate_limiter=unlimited),
+                count,
+            )
+        finally:
+            await http_session.close()
+    finally:
+        await runner.cleanup()
+
+    print(f"{count} leads, injected latency {latency_ms:.0f}ms per request")
+    report("session/request", per_request)
+    report("pooled session", pooled)
+    print(
+        f"per-lead mean latency reduced by "
+        f"{(1 - statistics.mean(pooled) / statistics.mean(per_request)) * 100:.1f}%"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
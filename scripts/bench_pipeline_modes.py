@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark the classic vs complex AmoCRM lead pipeline for new customers.
+
+Drives LeadProcessor's CRM stages (contact lookup, contact + lead
+creation, note) against a local AmoCRM stand-in that injects a fixed
+latency per request, and reports per-lead latency and round trips.
+
+Usage:
+    python -m scripts.bench_pipeline_modes [LEADS] [LATENCY_MS]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.insert(0, ".")
+
+from scripts.amocrm_stub import StubAuth, start_stub_server
+from src.config import settings
+from src.services.amocrm.client import AmoCRMClient
+from src.services.amocrm.contacts import ContactsService
+from src.services.amocrm.http import create_http_session
+from src.services.amocrm.leads import LeadsService
+from src.services.amocrm.notes import NotesService
+from src.services.amocrm.rate_limiter import PriorityRateLimiter
+from src.services.lead_processor import LeadProcessor
+
+
+async def run_mode(mode: str, client: AmoCRMClient, count: int) -> list[float]:
+    settings.AMOCRM_PIPELINE_MODE = mode
+    processor = LeadProcessor(
+        ContactsService(client), LeadsService(client), NotesService(client), MagicMock(),
+    )
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        _, amo_lead_id = await processor._create_crm_lead(
+            phone=f"+7999{i:07d}",
+            name="Bench",
+            telegram_id=i,
+            telegram_username=None,
+            service_type="sell",
+            data={"car_brand": "BMW"},
+        )
+        await processor._notes.add_to_lead(amo_lead_id, "bench")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+
+    runner, base_url = await start_stub_server(latency_ms / 1000)
+    http_session = create_http_session()
+    client = AmoCRMClient(
+        StubAuth(base_url),
+        http_session=http_session,
+        rate_limiter=PriorityRateLimiter(rate=0, burst=1),
+    )
+    results = {}
+    try:
+        for mode in ("classic", "complex"):
+            before = runner.app["requests"]
+            timings = await run_mode(mode, client, count)
+            results[mode] = (timings, (runner.app["requests"] - before) / count)
+    finally:
+        await http_session.close()
+        await runner.cleanup()
+
+    print(f"{count} new-customer leads, injected latency {latency_ms:.0f}ms per request")
+    for mode, (timings, round_trips) in results.items():
+        print(
+            f"{mode:<8} round trips/lead={round_trips:.1f} "
+            f"mean={statistics.mean(timings):7.1f}ms "
+            f"p50={statistics.median(timings):7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Offline benchmark of the rule-based pre-classifier on labeled messages.
+
+Runs ``RuleClassifier`` over TSVs of ``intent<TAB>message`` rows (faq/
+unknown rows are messages the rules should leave to the model) and
+reports, per confidence threshold, the
+share of OpenAI calls avoided and the precision of the answers given
+instead, then a calibration table (mean confidence vs accuracy per
+confidence bin) and the mistakes made at AI_RULES_CONFIDENCE.
+
+By default both scripts/data/intent_samples.tsv and
+scripts/data/intent_holdout.tsv are scored. The pattern weights were
+tuned on the former, so only the held-out numbers say how the rules do
+on messages they haven't seen; judge a threshold by those.
+
+No network or database needed.
+
+Usage:
+    python -m scripts.bench_rule_classifier [SAMPLES_TSV ...]
+"""
+
+import csv
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, ".")
+
+from src.config import settings
+from src.services.openai_client.rules import RuleClassifier
+
+DEFAULT_SAMPLES = (
+    ("tuning set, in-sample", "scripts/data/intent_samples.tsv"),
+    ("held-out set", "scripts/data/intent_holdout.tsv"),
+)
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+BINS = (0.0, 0.5, 0.7, 0.8, 0.9, 0.95, 1.01)
+
+
+def load(path: str) -> list[tuple[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return [(row["intent"], row["message"]) for row in csv.DictReader(f, delimiter="\t")]
+
+
+def main() -> None:
+    sets = [(path, path) for path in sys.argv[1:]] or DEFAULT_SAMPLES
+    classifier = RuleClassifier()
+    for title, path in sets:
+        print(f"== {title} ({path})")
+        report(load(path), classifier)
+        print()
+
+
+def report(samples: list[tuple[str, str]], classifier: RuleClassifier) -> None:
+    start = time.perf_counter()
+    results = [(label, message, classifier.classify(message)) for label, message in samples]
+    per_message_us = (time.perf_counter() - start) / len(samples) * 1e6
+
+    print(f"{len(samples)} labeled messages, {per_message_us:.0f}us per classification\n")
+    print(f"{'threshold':>9} {'avoided':>8} {'precision':>9} {'answered':>9}")
+    for threshold in THRESHOLDS:
+        answered = [(label, r) for label, _, r in results if r.confidence >= threshold]
+        correct = sum(label == r.intent for label, r in answered)
+        precision = correct / len(answered) if answered else 1.0
+        print(
+            f"{threshold:>9.2f} {len(answered) / len(results):>8.1%} "
+            f"{precision:>9.1%} {len(answered):>9}"
+        )
+
+    print(f"\n{'confidence':>11} {'n':>4} {'mean conf':>9} {'accuracy':>8}")
+    for low, high in zip(BINS, BINS[1:]):
+        in_bin = [(label, r) for label, _, r in results if low <= r.confidence < high]
+        if not in_bin:
+            continue
+        mean = sum(r.confidence for _, r in in_bin) / len(in_bin)
+        accuracy = sum(label == r.intent for label, r in in_bin) / len(in_bin)
+        print(f"{low:>5.2f}-{min(high, 1.0):<5.2f} {len(in_bin):>4} {mean:>9.2f} {accuracy:>8.1%}")
+
+    threshold = settings.AI_RULES_CONFIDENCE
+    by_intent: dict[str, list[bool]] = defaultdict(list)
+    mistakes = []
+    for label, message, r in results:
+        if r.confidence < threshold:
+            continue
+        by_intent[r.intent].append(label == r.intent)
+        if label != r.intent:
+            mistakes.append((label, r.intent, r.confidence, message))
+
+    print(f"\nAt AI_RULES_CONFIDENCE={threshold}:")
+    for intent, hits in sorted(by_intent.items()):
+        print(f"  {intent:<6} answered={len(hits):<3} precision={sum(hits) / len(hits):.1%}")
+    for label, intent, confidence, message in mistakes:
+        print(f"  wrong: {message!r} labeled {label}, got {intent} ({confidence:.2f})")
+
+
+if __name__ == "__main__":
+    main()
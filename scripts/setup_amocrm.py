@@ -25,6 +25,7 @@ sys.path.insert(0, ".")
 from src.config import settings
 from src.db.engine import async_session, engine
 from src.db.models import AmoToken
+from src.db.repositories.token import TokenRepository
 
 
 async def exchange_code(auth_code: str) -> dict:
@@ -63,7 +64,7 @@ async def save_tokens(data: dict) -> None:
             refresh_token=data["refresh_token"],
             expires_at=expires_at,
         )
-        session.add(token)
+        await TokenRepository(session).save(token)
         await session.commit()
 
     await engine.dispose()
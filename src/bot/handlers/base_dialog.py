@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import logging
+import uuid
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Callable
 
 from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -24,6 +26,7 @@ from src.bot.keyboards.confirm import get_confirm_keyboard, get_edit_fields_keyb
 from src.bot.keyboards.main_menu import WELCOME_TEXT, get_main_menu_keyboard
 from src.bot.keyboards.navigation import get_nav_keyboard
 from src.utils.formatters import FIELD_LABELS, format_confirmation
+from src.utils.idempotency import IdempotencyGuard
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +63,26 @@ SUCCESS_TEXT = (
     "Если у вас появятся вопросы -- нажмите /start"
 )
 
+# Shown right after confirm:send when the lead goes through the outbox;
+# replaced by SUCCESS_TEXT or SAVED_TEXT once it has been delivered.
+QUEUED_TEXT = (
+    "\u2705 Спасибо! Ваша заявка принята и передаётся менеджеру.\n\n"
+    "Если у вас появятся вопросы -- нажмите /start"
+)
+
+SAVED_TEXT = (
+    "Спасибо! Ваша заявка принята, но возникла техническая ошибка "
+    "при отправке. Мы сохранили её и обработаем в ближайшее время.\n\n"
+    "Если у вас появятся вопросы -- нажмите /start"
+)
+
+# Message shown for each confirm:send outcome
+OUTCOME_TEXTS = {
+    "sent": SUCCESS_TEXT,
+    "saved": SAVED_TEXT,
+    "queued": QUEUED_TEXT,
+}
+
 
 class BaseDialogHandler:
     """Generic multi-step dialog engine.
@@ -204,6 +227,7 @@ class BaseDialogHandler:
             prefill = {k: v for k, v in existing_data.items() if not k.startswith("__")}
             if prefill:
                 await state.update_data(**prefill)
+        await state.update_data(__dialog_id__=uuid.uuid4().hex)
         # Remove buttons from the old message so stale menus don't stay active
         try:
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -418,25 +442,112 @@ class BaseDialogHandler:
         await callback.answer()
         data = await state.get_data()
 
+        # Double taps and redelivered updates carry the same dialog: only
+        # the first one runs the pipeline, the rest get its outcome.
+        guard: IdempotencyGuard | None = kwargs.get("confirm_guard")
+        if guard is not None:
+            key = self._submission_key(callback, data)
+            previous = await guard.begin(key)
+            if previous is not None:
+                logger.info("Duplicate confirm:send for %s (%s)", key, previous)
+                await self._show_outcome(callback, previous)
+                return
+
         # Clean internal keys
         clean_data = {k: v for k, v in data.items() if not k.startswith("__")}
 
-        success = await self._process_lead(callback, state, clean_data, **kwargs)
+        try:
+            outcome = await self._submit_lead(callback, clean_data, **kwargs)
+        except BaseException:
+            if guard is not None:
+                await guard.abort(key)
+            # The queued text may already be shown: bring the buttons back
+            # so the user can send again
+            try:
+                await self._show_confirmation(callback.message, state, edit=True)
+            except TelegramBadRequest:
+                # "message is not modified": the buttons are still there
+                pass
+            except Exception:
+                logger.warning("Could not restore the confirmation for %s", callback.from_user.id)
+            raise
+        if guard is not None:
+            await guard.finish(key, outcome)
 
         await state.clear()
-        if success:
-            await callback.message.edit_text(SUCCESS_TEXT)
+        if outcome == "queued":
+            # The message already shows QUEUED_TEXT and the worker owns it now
+            kwargs["lead_outbox"].notify()
         else:
-            await callback.message.edit_text(
-                "Спасибо! Ваша заявка принята, но возникла техническая ошибка "
-                "при отправке. Мы сохранили её и обработаем в ближайшее время.\n\n"
-                "Если у вас появятся вопросы -- нажмите /start"
-            )
+            await callback.message.edit_text(OUTCOME_TEXTS[outcome])
+
+    async def _submit_lead(
+        self,
+        callback: CallbackQuery,
+        data: dict,
+        **kwargs: Any,
+    ) -> str:
+        """Hand the lead over for delivery. Returns the outcome (OUTCOME_TEXTS key)."""
+        lead_outbox = kwargs.get("lead_outbox")
+        if lead_outbox is not None and await self._enqueue_lead(callback, data, **kwargs):
+            return "queued"
+        success = await self._process_lead(callback, data, **kwargs)
+        return "sent" if success else "saved"
+
+    @staticmethod
+    def _submission_key(callback: CallbackQuery, data: dict) -> str:
+        """Idempotency key of this dialog instance's submission."""
+        dialog_id = data.get("__dialog_id__")
+        if dialog_id is None:
+            # Dialog started before dialog IDs existed: the confirmation
+            # message identifies it just as well for repeated taps
+            dialog_id = f"msg:{callback.message.chat.id}:{callback.message.message_id}"
+        return f"{callback.from_user.id}:{dialog_id}"
+
+    @staticmethod
+    async def _show_outcome(callback: CallbackQuery, outcome: str) -> None:
+        text = OUTCOME_TEXTS.get(outcome)
+        if text is None:
+            # Still in progress; the first callback updates the message
+            return
+        try:
+            await callback.message.edit_text(text)
+        except TelegramBadRequest:
+            # Usually "message is not modified": it already shows the outcome
+            pass
+
+    async def _enqueue_lead(
+        self,
+        callback: CallbackQuery,
+        data: dict,
+        **kwargs: Any,
+    ) -> bool:
+        """Save the lead for background delivery. False if it can't be queued."""
+        session = kwargs.get("session")
+        lead_processor = kwargs.get("lead_processor")
+        if not (lead_processor and session):
+            return False
+
+        # Shown before the commit: once the lead is committed a worker may
+        # deliver it and edit the message to its outcome before we get here
+        await callback.message.edit_text(QUEUED_TEXT)
+        await lead_processor.enqueue(
+            session=session,
+            telegram_user={
+                "id": callback.from_user.id,
+                "username": callback.from_user.username,
+                "first_name": callback.from_user.first_name,
+            },
+            service_type=self.service_type,
+            data=data,
+            chat_id=callback.message.chat.id,
+            message_id=callback.message.message_id,
+        )
+        return True
 
     async def _process_lead(
         self,
         callback: CallbackQuery,
-        state: FSMContext,
         data: dict,
         **kwargs: Any,
     ) -> bool:
@@ -1,6 +1,9 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Boolean, DateTime, Float, ForeignKey, Index, Integer, String, Text, func
+from sqlalchemy import (
+    BigInteger, Boolean, CheckConstraint, DateTime, Float, ForeignKey, Index, Integer,
+    SmallInteger, String, Text, func, text,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -39,9 +42,15 @@ class Lead(Base):
     service_type: Mapped[str] = mapped_column(String(50), nullable=False)
     data: Mapped[dict] = mapped_column(JSONB, nullable=False, server_default="{}")
     status: Mapped[str] = mapped_column(String(20), server_default="draft")
+    # Pipeline checkpoints: set as each AmoCRM stage completes
+    amo_contact_id: Mapped[int | None] = mapped_column(BigInteger)
     amo_lead_id: Mapped[int | None] = mapped_column(BigInteger)
+    amo_note_id: Mapped[int | None] = mapped_column(BigInteger)
     error_message: Mapped[str | None] = mapped_column(Text)
     retry_count: Mapped[int] = mapped_column(Integer, server_default="0")
+    # When the retry sweep may try an "error" lead next (NULL = now). While
+    # a sweep works on the lead ("retrying") it holds the end of the lease.
+    next_retry_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
@@ -50,9 +59,36 @@ class Lead(Base):
     __table_args__ = (
         Index("idx_leads_status", "status"),
         Index("idx_leads_user_id", "user_id"),
+        Index(
+            "idx_leads_retry_due",
+            "next_retry_at",
+            postgresql_where=text("status IN ('error', 'retrying')"),
+        ),
     )
 
 
+class LeadOutbox(Base):
+    """A lead waiting for background delivery to AmoCRM.
+
+    Inserted in the same transaction as the lead and deleted once it has
+    been delivered (or has failed over to the retry sweep). ``locked_until``
+    is the lease of the worker processing it; an expired lease makes the
+    row claimable again.
+    """
+
+    __tablename__ = "lead_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    lead_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("leads.id", ondelete="CASCADE"), unique=True, nullable=False
+    )
+    chat_id: Mapped[int | None] = mapped_column(BigInteger)
+    message_id: Mapped[int | None] = mapped_column(BigInteger)
+    attempts: Mapped[int] = mapped_column(Integer, server_default="0")
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class AmoToken(Base):
     __tablename__ = "amo_tokens"
 
@@ -63,6 +99,24 @@ class AmoToken(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+class AmoTokenCurrent(Base):
+    """The one current token pair (id is always 1); amo_tokens keeps history."""
+
+    __tablename__ = "amo_token_current"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=1)
+    access_token: Mapped[str] = mapped_column(Text, nullable=False)
+    refresh_token: Mapped[str] = mapped_column(Text, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __table_args__ = (
+        CheckConstraint("id = 1", name="ck_amo_token_current_single_row"),
+    )
+
+
 class AiLog(Base):
     __tablename__ = "ai_logs"
 
@@ -1,9 +1,16 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import select, update
+from sqlalchemy import case, exists, func, or_, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from src.db.models import Lead
+from src.db.models import Lead, LeadOutbox
+
+# Statuses the retry sweep picks up (once next_retry_at is due)
+RETRYABLE_STATUSES = ("error", "retrying")
+
+# Postgres NOTIFY channel waking the retry scheduler (payload: the reason)
+RETRY_CHANNEL = "lead_retry"
 
 
 class LeadRepository:
@@ -27,18 +34,27 @@ class LeadRepository:
         await self.session.flush()
         return lead
 
+    async def get_with_user(self, lead_id: int) -> Lead | None:
+        result = await self.session.execute(
+            select(Lead).options(joinedload(Lead.user)).where(Lead.id == lead_id)
+        )
+        return result.scalar_one_or_none()
+
     async def update_status(
         self,
         lead_id: int,
         status: str,
         amo_lead_id: int | None = None,
         error_message: str | None = None,
+        next_retry_at: datetime | None = None,
     ) -> None:
         values: dict = {"status": status}
         if amo_lead_id is not None:
             values["amo_lead_id"] = amo_lead_id
         if error_message is not None:
             values["error_message"] = error_message
+        if next_retry_at is not None:
+            values["next_retry_at"] = next_retry_at
         if status == "sent":
             values["sent_at"] = datetime.now(timezone.utc)
 
@@ -56,6 +72,131 @@ class LeadRepository:
         )
         return list(result.scalars().all())
 
+    async def claim_failed_leads(
+        self,
+        limit: int,
+        lease_seconds: float,
+        due_before: datetime | None = None,
+    ) -> list[int]:
+        """Lease up to ``limit`` failed leads that are due for a retry, oldest first.
+
+        Marks them ``retrying``, counts the attempt and returns the lead
+        IDs. Leads locked by a concurrent claim are skipped, and the lease
+        (``next_retry_at`` moved to its end) keeps them away from other
+        sweeps until the attempt has rescheduled them, so several processes
+        can sweep at once. A ``retrying`` lead whose lease ran out (its
+        process died) is due again. Only leads due by ``due_before``
+        (default: now) are claimed.
+        """
+        now = func.now()
+        cutoff = due_before if due_before is not None else now
+        claimable = (
+            select(Lead.id)
+            .where(Lead.status.in_(RETRYABLE_STATUSES))
+            .where(or_(Lead.next_retry_at.is_(None), Lead.next_retry_at <= cutoff))
+            .order_by(Lead.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.scalars(
+            update(Lead)
+            .where(Lead.id.in_(claimable.scalar_subquery()))
+            .values(
+                status="retrying",
+                next_retry_at=now + timedelta(seconds=lease_seconds),
+                retry_count=Lead.retry_count + 1,
+            )
+            .returning(Lead.id)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.all())
+
+    async def unclaim(self, lead_ids: list[int]) -> int:
+        """Give back claims that were not attempted, due again now.
+
+        The attempt counted by ``claim_failed_leads`` is taken back, so a
+        lead skipped by its sweep (e.g. circuit open) loses no retry.
+        Returns how many were given back.
+        """
+        result = await self.session.execute(
+            update(Lead)
+            .where(Lead.id.in_(lead_ids))
+            .where(Lead.status == "retrying")
+            .values(
+                status="error",
+                next_retry_at=func.now(),
+                retry_count=case((Lead.retry_count > 0, Lead.retry_count - 1), else_=0),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.flush()
+        return result.rowcount
+
+    async def next_retry_due(self) -> datetime | None:
+        """Earliest time a failed lead is due for a retry, or None if there are none."""
+        result = await self.session.execute(
+            select(
+                func.count(Lead.id),
+                func.min(func.coalesce(Lead.next_retry_at, func.now())),
+            ).where(Lead.status.in_(RETRYABLE_STATUSES))
+        )
+        count, due = result.one()
+        return due if count else None
+
+    async def make_due_now(self) -> int:
+        """Reschedule every failed lead to be retried now. Returns how many.
+
+        Leads a sweep is working on (``retrying``) keep their lease.
+        """
+        result = await self.session.execute(
+            update(Lead)
+            .where(Lead.status == "error")
+            .where(Lead.next_retry_at > func.now())
+            .values(next_retry_at=func.now())
+        )
+        await self.session.flush()
+        return result.rowcount
+
+    async def release_unfinished(self, lead_ids: list[int]) -> int:
+        """Hand leads whose delivery was interrupted to the retry sweep, due now.
+
+        Leads that are done (sent, failed) or still owned by the outbox are
+        left alone. Returns how many were released.
+        """
+        return await self._requeue(Lead.id.in_(lead_ids), ("pending", "retrying"))
+
+    async def rescue_stale_pending(self, older_than_seconds: float) -> int:
+        """Requeue ``pending`` leads older than ``older_than_seconds``.
+
+        A lead stays ``pending`` only while a delivery is running, so an old
+        one was left behind by a process that died (outbox leads excepted:
+        the outbox retries those). Returns how many were rescued.
+        """
+        return await self._requeue(
+            Lead.created_at < func.now() - timedelta(seconds=older_than_seconds),
+            ("pending",),
+        )
+
+    async def _requeue(self, condition, statuses: tuple[str, ...]) -> int:
+        in_outbox = exists().where(LeadOutbox.lead_id == Lead.id)
+        result = await self.session.execute(
+            update(Lead)
+            .where(condition)
+            .where(Lead.status.in_(statuses))
+            .where(~in_outbox)
+            .values(status="error", next_retry_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.flush()
+        return result.rowcount
+
+    async def notify_retry(self, reason: str) -> None:
+        """Wake retry schedulers once the current transaction commits."""
+        await self.session.execute(
+            text("SELECT pg_notify(:channel, :reason)"),
+            {"channel": RETRY_CHANNEL, "reason": reason},
+        )
+
     async def increment_retry(self, lead_id: int) -> None:
         await self.session.execute(
             update(Lead)
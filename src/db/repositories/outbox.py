@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import LeadOutbox
+
+
+class OutboxRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def add(
+        self,
+        lead_id: int,
+        chat_id: int | None = None,
+        message_id: int | None = None,
+    ) -> LeadOutbox:
+        item = LeadOutbox(lead_id=lead_id, chat_id=chat_id, message_id=message_id)
+        self.session.add(item)
+        await self.session.flush()
+        return item
+
+    async def claim(self, limit: int, lease_seconds: float) -> list[LeadOutbox]:
+        """Lease up to ``limit`` unclaimed (or lease-expired) rows, oldest first.
+
+        Rows locked by a concurrent claim are skipped, so several workers
+        and processes can claim at once without getting the same row.
+        """
+        now = func.now()
+        claimable = (
+            select(LeadOutbox.id)
+            .where(or_(LeadOutbox.locked_until.is_(None), LeadOutbox.locked_until < now))
+            .order_by(LeadOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.scalars(
+            update(LeadOutbox)
+            .where(LeadOutbox.id.in_(claimable.scalar_subquery()))
+            .values(
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=LeadOutbox.attempts + 1,
+            )
+            .returning(LeadOutbox)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.all(), key=lambda item: item.id)
+
+    async def renew(
+        self, item_id: int, locked_until: datetime, lease_seconds: float
+    ) -> datetime | None:
+        """Extend the lease on a claimed row, if it is still ours.
+
+        ``locked_until`` is the lease end our claim (or last renewal) set;
+        it no longer matches once the lease ran out and another worker
+        claimed the row, or the row is gone. Returns the new lease end, or
+        None if the row isn't ours anymore.
+        """
+        return await self.session.scalar(
+            update(LeadOutbox)
+            .where(LeadOutbox.id == item_id)
+            .where(LeadOutbox.locked_until == locked_until)
+            .values(locked_until=func.now() + timedelta(seconds=lease_seconds))
+            .returning(LeadOutbox.locked_until)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def release(self, lead_ids: list[int]) -> None:
+        """End the lease on these leads' rows so they can be claimed right away."""
+        await self.session.execute(
+            update(LeadOutbox)
+            .where(LeadOutbox.lead_id.in_(lead_ids))
+            .values(locked_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.flush()
+
+    async def delete(self, item_id: int) -> None:
+        await self.session.execute(delete(LeadOutbox).where(LeadOutbox.id == item_id))
+        await self.session.flush()
+
+    async def stats(self) -> tuple[int, datetime | None]:
+        """(rows waiting, created_at of the oldest one)."""
+        result = await self.session.execute(
+            select(func.count(LeadOutbox.id), func.min(LeadOutbox.created_at))
+        )
+        depth, oldest = result.one()
+        return depth, oldest
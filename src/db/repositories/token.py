@@ -1,20 +1,53 @@
-from sqlalchemy import select
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.models import AmoToken
+from src.db.models import AmoToken, AmoTokenCurrent
+
+CURRENT_ID = 1
 
 
 class TokenRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    async def get_current(self) -> AmoToken | None:
-        result = await self.session.execute(
-            select(AmoToken).order_by(AmoToken.id.desc()).limit(1)
-        )
-        return result.scalar_one_or_none()
+    async def get_current(self) -> AmoTokenCurrent | None:
+        """The current token pair: a primary-key lookup of the single row."""
+        return await self.session.get(AmoTokenCurrent, CURRENT_ID, populate_existing=True)
 
     async def save(self, token: AmoToken) -> AmoToken:
+        """Append ``token`` to the history and make it the current pair.
+
+        Both happen in the caller's transaction, so the current row and the
+        newest history row change together.
+        """
         self.session.add(token)
+        values = {
+            "access_token": token.access_token,
+            "refresh_token": token.refresh_token,
+            "expires_at": token.expires_at,
+        }
+        await self.session.execute(
+            insert(AmoTokenCurrent)
+            .values(id=CURRENT_ID, **values)
+            .on_conflict_do_update(
+                index_elements=[AmoTokenCurrent.id],
+                set_={**values, "updated_at": func.now()},
+            )
+        )
         await self.session.flush()
         return token
+
+    async def prune_history(self, keep: int) -> int:
+        """Delete all but the newest ``keep`` history rows. Returns rows deleted."""
+        cutoff = (
+            select(AmoToken.id)
+            .order_by(AmoToken.id.desc())
+            .offset(keep)
+            .limit(1)
+            .scalar_subquery()
+        )
+        result = await self.session.execute(
+            delete(AmoToken).where(AmoToken.id <= cutoff)
+        )
+        return result.rowcount or 0
@@ -1,4 +1,4 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.models import User
@@ -40,3 +40,23 @@ class UserRepository:
 
         await self.session.flush()
         return user
+
+    async def get_contact_id_by_phone(self, phone: str) -> int | None:
+        """AmoCRM contact ID last stored for a user with this phone."""
+        result = await self.session.execute(
+            select(User.amo_contact_id)
+            .where(User.phone == phone)
+            .where(User.amo_contact_id.is_not(None))
+            .order_by(User.updated_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def clear_contact_id(self, amo_contact_id: int) -> None:
+        """Forget a contact ID that no longer exists in AmoCRM."""
+        await self.session.execute(
+            update(User)
+            .where(User.amo_contact_id == amo_contact_id)
+            .values(amo_contact_id=None)
+        )
+        await self.session.flush()
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 
+import aiohttp
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -9,23 +10,47 @@ from aiogram.fsm.storage.redis import RedisStorage
 from redis.asyncio import Redis
 
 from src.bot.handlers import get_main_router
+from src.bot.handlers.base_dialog import SAVED_TEXT, SUCCESS_TEXT
 from src.bot.middlewares.db import DbSessionMiddleware
+from src.bot.middlewares.inflight import InFlightMiddleware
 from src.bot.middlewares.logging_mw import LoggingMiddleware
 from src.bot.middlewares.throttling import ThrottlingMiddleware
 from src.config import settings
-from src.db.engine import async_session
+from src.db.engine import async_session, engine
+from src.services.amocrm.contact_index import ContactIndex
 from src.services.amocrm.contacts import ContactsService
 from src.services.amocrm.leads import LeadsService
+from src.services.amocrm.metadata import MetadataCache
 from src.services.amocrm.notes import NotesService
-from src.services.lead_processor import LeadProcessor, retry_failed_leads
-from src.services.openai_client import OpenAIClient
+from src.services.lead_processor import (
+    LeadProcessor,
+    release_unfinished,
+    retry_failed_leads,
+    seconds_until_next_retry,
+)
+from src.services.openai_client import ClassificationCache, OpenAIClient, RuleClassifier
+from src.services.outbox import LeadOutbox
+from src.services.retry_wakeup import RetryWakeup, announce_crm_recovered
+from src.utils.admin import AlertDigest, notify_admin
+from src.utils.idempotency import IdempotencyGuard
+from src.utils.metrics import REGISTRY
+from src.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Fire-and-forget tasks started by breaker listeners; the event loop only
+# keeps weak references, so they are held here until they finish
+_background_tasks: set[asyncio.Task] = set()
+
+# Longest the retry scheduler sleeps without looking for due leads
 RETRY_INTERVAL_SECONDS = 300  # 5 minutes
 
 
-def _create_crm_client():
+def _create_crm_client(
+    http_session: aiohttp.ClientSession | None = None,
+    bot: Bot | None = None,
+    redis: Redis | None = None,
+):
     """Create AmoCRM client (real or mock based on settings)."""
     if settings.AMOCRM_MOCK_MODE:
         from src.services.amocrm.mock import MockAmoCRMClient
@@ -34,23 +59,109 @@ def _create_crm_client():
     else:
         from src.services.amocrm.auth import AmoCRMAuth
         from src.services.amocrm.client import AmoCRMClient
-        auth = AmoCRMAuth(session_factory=async_session)
+        token_store = None
+        if settings.AMOCRM_TOKEN_STORE == "redis" and redis is not None:
+            from src.services.amocrm.token_store import RedisTokenStore
+            token_store = RedisTokenStore(redis)
+        auth = AmoCRMAuth(
+            session_factory=async_session,
+            http_session=http_session,
+            token_store=token_store,
+        )
         logger.info("Using real AmoCRM client (subdomain=%s)", settings.AMOCRM_SUBDOMAIN)
-        return AmoCRMClient(auth)
+        client = AmoCRMClient(auth, http_session=http_session)
+        if bot is not None:
+            client.breaker.add_listener(_breaker_alert(bot))
+        client.breaker.add_listener(_breaker_recovery)
+        return client
+
+
+def _breaker_alert(bot: Bot):
+    """Breaker listener: one admin message per outage instead of per lead."""
+    from src.services.amocrm.circuit_breaker import BreakerState
+
+    def listener(breaker, old_state, new_state) -> None:
+        if new_state == BreakerState.OPEN and old_state == BreakerState.CLOSED:
+            text = (
+                f"AmoCRM недоступен ({breaker.name}), приём лидов в CRM "
+                f"приостановлен. Заявки сохраняются и будут отправлены позже."
+            )
+        elif new_state == BreakerState.CLOSED:
+            text = f"AmoCRM снова доступен ({breaker.name})."
+        else:
+            return
+        _spawn(notify_admin(bot, text))
+
+    return listener
+
+
+def _breaker_recovery(breaker, old_state, new_state) -> None:
+    """Breaker listener: retry leads parked during the outage right away."""
+    from src.services.amocrm.circuit_breaker import BreakerState
+
+    if new_state == BreakerState.CLOSED and old_state != BreakerState.CLOSED:
+        _spawn(_announce_crm_recovered())
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _announce_crm_recovered() -> None:
+    try:
+        await announce_crm_recovered(async_session)
+    except Exception:
+        logger.exception("Failed to announce AmoCRM recovery")
+
+
+def _create_batchers(crm_client) -> dict:
+    """Batch writers for contact/lead/note creation, if batching is enabled."""
+    if not settings.AMOCRM_BATCHING_ENABLED:
+        return {}
+
+    from src.services.amocrm.batcher import BatchWriter
+
+    window = settings.AMOCRM_BATCH_WINDOW_MS / 1000
+    size = settings.AMOCRM_BATCH_MAX_SIZE
+    logger.info("AmoCRM batching enabled (window=%.3fs, max_size=%d)", window, size)
+    return {
+        "contacts": BatchWriter(crm_client, "/api/v4/contacts", "contacts", window, size),
+        "leads": BatchWriter(crm_client, "/api/v4/leads", "leads", window, size),
+        "notes": BatchWriter(crm_client, "/api/v4/leads/notes", "notes", window, size),
+    }
 
 
 async def health_check(_request: web.Request) -> web.Response:
     return web.Response(text="ok")
 
 
-async def run_health_server() -> None:
+async def amocrm_health(_request: web.Request) -> web.Response:
+    """Circuit breaker state and recent transitions for AmoCRM."""
+    from src.services.amocrm.circuit_breaker import all_breakers
+
+    return web.json_response(
+        {"breakers": [breaker.snapshot() for breaker in all_breakers()]}
+    )
+
+
+async def metrics(_request: web.Request) -> web.Response:
+    """Prometheus text exposition of in-process metrics."""
+    return web.Response(text=REGISTRY.render(), content_type="text/plain")
+
+
+async def run_health_server() -> web.AppRunner:
     app = web.Application()
     app.router.add_get("/health", health_check)
+    app.router.add_get("/health/amocrm", amocrm_health)
+    app.router.add_get("/metrics", metrics)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", settings.HEALTH_CHECK_PORT)
     await site.start()
     logger.info("Health check server started on port %d", settings.HEALTH_CHECK_PORT)
+    return runner
 
 
 async def retry_task(
@@ -58,13 +169,33 @@ async def retry_task(
     leads_service: LeadsService,
     notes: NotesService,
     bot: Bot,
+    contact_index: ContactIndex | None = None,
+    contact_flights: SingleFlight | None = None,
+    wakeup: RetryWakeup | None = None,
+    alerts: AlertDigest | None = None,
+    stop: asyncio.Event | None = None,
 ) -> None:
-    """Background task: retry failed leads every 5 minutes."""
-    while True:
-        await asyncio.sleep(RETRY_INTERVAL_SECONDS)
+    """Background task: retry failed leads as they become due.
+
+    Sleeps until the earliest due lead (at most RETRY_INTERVAL_SECONDS). A
+    wakeup (lead failed, AmoCRM recovered) re-reads the schedule and can
+    only bring the next sweep forward. Returns once ``stop`` is set,
+    letting a sweep in progress finish the batch it has claimed.
+    """
+    stop = stop or asyncio.Event()
+    while not stop.is_set():
+        sleeper = asyncio.create_task(_sleep_until_due(wakeup))
+        stopped = asyncio.create_task(stop.wait())
+        await asyncio.wait({sleeper, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        for task in (sleeper, stopped):
+            task.cancel()
+        await asyncio.gather(sleeper, stopped, return_exceptions=True)
+        if stop.is_set():
+            return
         try:
             count = await retry_failed_leads(
                 async_session, contacts, leads_service, notes, bot,
+                contact_index, contact_flights, alerts, stop,
             )
             if count:
                 logger.info("Retried %d failed leads successfully", count)
@@ -72,6 +203,39 @@ async def retry_task(
             logger.exception("Error in retry_failed_leads task")
 
 
+async def _sleep_until_due(wakeup: RetryWakeup | None) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + await _next_retry_delay()
+    while (remaining := deadline - loop.time()) > 0:
+        if wakeup is None:
+            await asyncio.sleep(remaining)
+            return
+        if await wakeup.wait(remaining):
+            deadline = min(deadline, loop.time() + await _next_retry_delay())
+
+
+async def _next_retry_delay() -> float:
+    try:
+        return await seconds_until_next_retry(async_session, RETRY_INTERVAL_SECONDS)
+    except Exception:
+        logger.exception("Failed to read the next retry time")
+        return RETRY_INTERVAL_SECONDS
+
+
+async def _load_metadata(metadata: MetadataCache, bot: Bot) -> None:
+    """Validate configured AmoCRM IDs against the account before polling starts."""
+    try:
+        problems = await metadata.load()
+    except Exception:
+        logger.exception("Failed to load AmoCRM metadata, using unvalidated field mapping")
+        return
+    if problems:
+        await notify_admin(
+            bot,
+            "Конфигурация AmoCRM не совпадает с аккаунтом:\n" + "\n".join(problems),
+        )
+
+
 async def main() -> None:
     logging.basicConfig(
         level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
@@ -86,17 +250,47 @@ async def main() -> None:
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
 
-    # AmoCRM services
-    crm_client = _create_crm_client()
-    contacts = ContactsService(crm_client)
-    leads_service = LeadsService(crm_client)
-    notes = NotesService(crm_client)
-    lead_processor = LeadProcessor(contacts, leads_service, notes, bot)
+    # AmoCRM services (one pooled HTTP session shared by client and auth)
+    http_session = None
+    if not settings.AMOCRM_MOCK_MODE:
+        from src.services.amocrm.http import create_http_session
+        http_session = create_http_session()
+    crm_client = _create_crm_client(http_session, bot, redis)
+    batchers = _create_batchers(crm_client)
+    metadata = MetadataCache(crm_client)
+    await _load_metadata(metadata, bot)
+    contacts = ContactsService(crm_client, batchers.get("contacts"))
+    leads_service = LeadsService(crm_client, batchers.get("leads"), metadata)
+    notes = NotesService(crm_client, batchers.get("notes"))
+    contact_index = ContactIndex(redis)
+    contact_flights = SingleFlight(
+        "amocrm_contact",
+        redis=redis if settings.AMOCRM_CONTACT_LOCK_SECONDS > 0 else None,
+        lock_timeout=settings.AMOCRM_CONTACT_LOCK_SECONDS,
+    )
+    # Failed-lead alerts go to the admin as periodic digests
+    admin_alerts = AlertDigest(bot, redis)
+    admin_alerts.start()
+
+    lead_processor = LeadProcessor(
+        contacts, leads_service, notes, bot, contact_index, contact_flights,
+        admin_alerts,
+    )
+
+    # Background delivery of confirmed leads (injected as "lead_outbox")
+    lead_outbox = None
+    if settings.LEAD_OUTBOX_ENABLED:
+        lead_outbox = LeadOutbox(
+            async_session, lead_processor, bot, SUCCESS_TEXT, SAVED_TEXT,
+        )
 
     # OpenAI client (injected into handlers as "openai_client" kwarg)
     openai_client = None
     if settings.OPENAI_API_KEY:
-        openai_client = OpenAIClient()
+        openai_client = OpenAIClient(
+            cache=ClassificationCache(redis) if settings.AI_CLASSIFY_CACHE_ENABLED else None,
+            rules=RuleClassifier() if settings.AI_RULES_ENABLED else None,
+        )
         logger.info("OpenAI client initialized (model=%s)", settings.OPENAI_MODEL)
     else:
         logger.warning("OPENAI_API_KEY not set, freetext AI will be unavailable")
@@ -105,8 +299,14 @@ async def main() -> None:
         storage=storage,
         openai_client=openai_client,
         lead_processor=lead_processor,
+        lead_outbox=lead_outbox,
+        confirm_guard=IdempotencyGuard(
+            redis, "confirm_send", settings.CONFIRM_IDEMPOTENCY_TTL_SECONDS,
+        ),
     )
 
+    in_flight = InFlightMiddleware()
+    dp.update.middleware(in_flight)
     dp.update.middleware(LoggingMiddleware())
     dp.update.middleware(ThrottlingMiddleware())
     dp.update.middleware(DbSessionMiddleware(session_pool=async_session))
@@ -114,14 +314,95 @@ async def main() -> None:
     main_router = get_main_router()
     dp.include_router(main_router)
 
-    await run_health_server()
+    health_runner = await run_health_server()
 
     # Start background retry task
-    asyncio.create_task(retry_task(contacts, leads_service, notes, bot))
-    logger.info("Background retry task started (interval=%ds)", RETRY_INTERVAL_SECONDS)
+    retry_wakeup = None
+    if settings.RETRY_LISTEN_ENABLED:
+        retry_wakeup = RetryWakeup()
+        retry_wakeup.start()
+    retry_stop = asyncio.Event()
+    retry = asyncio.create_task(retry_task(
+        contacts, leads_service, notes, bot, contact_index, contact_flights,
+        retry_wakeup, admin_alerts, retry_stop,
+    ), name="lead-retry")
+    logger.info("Background retry task started (max sleep=%ds)", RETRY_INTERVAL_SECONDS)
+    # Nothing to drain in these: cancelled right away on shutdown
+    idle_tasks = [asyncio.create_task(metadata.run(), name="amocrm-metadata")]
+    if lead_outbox is not None:
+        lead_outbox.start()
+    if not settings.AMOCRM_MOCK_MODE:
+        idle_tasks.append(asyncio.create_task(
+            crm_client.auth.run_refresher(), name="amocrm-token-refresher",
+        ))
 
     logger.info("Bot starting in long polling mode")
-    await dp.start_polling(bot)
+    try:
+        # The bot session stays open so handlers still running can reply
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        await _shutdown(
+            in_flight, retry, retry_stop, lead_outbox, idle_tasks,
+            settings.SHUTDOWN_GRACE_SECONDS,
+        )
+        await admin_alerts.stop()
+        try:
+            await admin_alerts.flush()
+        except Exception:
+            logger.warning("Final admin alert digest not sent, kept for next start", exc_info=True)
+        if retry_wakeup is not None:
+            await retry_wakeup.stop()
+        for batcher in batchers.values():
+            await batcher.close()
+        if http_session is not None:
+            await http_session.close()
+            logger.info("AmoCRM HTTP session closed")
+        if openai_client is not None:
+            await openai_client.close()
+        await health_runner.cleanup()
+        await bot.session.close()
+        await redis.aclose()
+        await engine.dispose()
+        logger.info("Shutdown complete")
+
+
+async def _shutdown(
+    in_flight: InFlightMiddleware,
+    retry: asyncio.Task,
+    retry_stop: asyncio.Event,
+    lead_outbox: LeadOutbox | None,
+    idle_tasks: list[asyncio.Task],
+    grace: float,
+) -> None:
+    """Drain in-flight work once polling has stopped.
+
+    Handlers, outbox deliveries and the retry sweep get ``grace`` seconds
+    in total to finish; what is still running then is cancelled and its
+    leads are made retryable, so nothing is left stuck in ``pending``.
+    """
+    logger.info("Shutting down, draining in-flight work for up to %.0fs", grace)
+    for task in idle_tasks:
+        task.cancel()
+    retry_stop.set()
+
+    async def drain_retry() -> None:
+        await asyncio.wait({retry}, timeout=grace)
+        retry.cancel()
+        await asyncio.gather(retry, *idle_tasks, return_exceptions=True)
+
+    async def drain_outbox() -> None:
+        if lead_outbox is not None:
+            await lead_outbox.stop(grace)
+
+    cancelled, *_ = await asyncio.gather(
+        in_flight.drain(grace), drain_outbox(), drain_retry(),
+    )
+    if cancelled:
+        logger.warning("Cancelled %d updates still in flight after %.0fs", cancelled, grace)
+    try:
+        await release_unfinished(async_session)
+    except Exception:
+        logger.exception("Failed to requeue leads interrupted by shutdown")
 
 
 if __name__ == "__main__":
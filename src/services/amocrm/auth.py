@@ -2,34 +2,72 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import random
+import time
 from datetime import datetime, timedelta, timezone
 
 import aiohttp
 
 from src.config import settings
 from src.db.models import AmoToken
+from src.services.amocrm.token_store import RedisTokenStore, TokenPair
+from src.utils.metrics import counter, gauge, histogram
 
 logger = logging.getLogger(__name__)
 
 # Refresh token when less than this many seconds until expiry
 REFRESH_MARGIN_SECONDS = 300  # 5 minutes
+# The background refresher wakes up to this much earlier than the margin,
+# at random, so replicas started together don't refresh in lockstep
+REFRESH_JITTER_SECONDS = 120
+# Delay before the background refresher tries again after a failure
+REFRESH_RETRY_SECONDS = 30
+
+REFRESH_DURATION = histogram(
+    "amocrm_token_refresh_duration_seconds",
+    "Latency of AmoCRM OAuth token refreshes",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REFRESHES = counter(
+    "amocrm_token_refreshes_total",
+    "AmoCRM OAuth token refreshes by result",
+    ["result"],
+)
+TOKEN_EXPIRY = gauge(
+    "amocrm_token_expiry_timestamp_seconds",
+    "Unix time at which the current AmoCRM access token expires",
+)
 
 
 class AmoCRMAuth:
     """Manages AmoCRM OAuth tokens.
 
-    - Caches current token in memory
-    - Refreshes lazily (before each request if about to expire)
+    - Caches current token in memory; reading it takes no lock
+    - ``run_refresher`` refreshes ahead of expiry in the background; a
+      request only refreshes inline if that hasn't happened in time
     - Persists new tokens to DB (each refresh_token is single-use)
-    - Uses asyncio.Lock to prevent concurrent refresh races
+    - Only one load/refresh runs at a time; concurrent callers await it
+    - With a ``token_store``, the pair is shared with other replicas via
+      Redis and only the holder of its refresh lock refreshes; the others
+      adopt the result without going to the DB
     """
 
-    def __init__(self, session_factory) -> None:
+    def __init__(
+        self,
+        session_factory,
+        http_session: aiohttp.ClientSession | None = None,
+        token_store: RedisTokenStore | None = None,
+    ) -> None:
         self._session_factory = session_factory
+        self._http_session = http_session
+        self._token_store = token_store
+        self._fence = 0
         self._access_token: str | None = None
         self._expires_at: datetime | None = None
         self._refresh_token: str | None = None
-        self._lock = asyncio.Lock()
+        self._update_task: asyncio.Task | None = None
+        self._refresh_ok = REFRESHES.labels("ok")
+        self._refresh_failed = REFRESHES.labels("error")
 
     @property
     def base_url(self) -> str:
@@ -37,42 +75,172 @@ class AmoCRMAuth:
 
     async def get_access_token(self) -> str:
         """Return a valid access token, refreshing if necessary."""
-        async with self._lock:
-            if self._access_token and self._expires_at:
-                now = datetime.now(timezone.utc)
-                if now < self._expires_at - timedelta(seconds=REFRESH_MARGIN_SECONDS):
-                    return self._access_token
-
-            # Try to load from DB if not in memory
-            if not self._refresh_token:
-                await self._load_from_db()
-
-            # If we have a refresh token and it's close to expiry, refresh
-            if self._refresh_token:
-                if not self._access_token or not self._expires_at or \
-                   datetime.now(timezone.utc) >= self._expires_at - timedelta(seconds=REFRESH_MARGIN_SECONDS):
+        token = self._access_token
+        if token and not self._needs_refresh():
+            return token
+
+        await self._update(force=False)
+
+        if not self._access_token:
+            raise RuntimeError(
+                "No AmoCRM token available. Run scripts/setup_amocrm.py first."
+            )
+        return self._access_token
+
+    async def handle_401(self, rejected_token: str | None = None) -> None:
+        """Force token refresh on 401 response.
+
+        If ``rejected_token`` was already replaced by a concurrent refresh,
+        there is nothing to do.
+        """
+        if rejected_token is not None and rejected_token != self._access_token:
+            return
+        logger.warning("Forcing token refresh due to 401")
+        await self._update(force=True)
+
+    async def run_refresher(self) -> None:
+        """Background task: refresh the token before requests need it.
+
+        Wakes REFRESH_MARGIN_SECONDS plus a random jitter before expiry.
+        """
+        while True:
+            try:
+                if self._expires_at is None:
+                    await self._update(force=False)
+                expires_at = self._expires_at
+                if expires_at is None:
+                    await asyncio.sleep(REFRESH_RETRY_SECONDS)
+                    continue
+
+                lead_time = REFRESH_MARGIN_SECONDS + random.uniform(0, REFRESH_JITTER_SECONDS)
+                delay = (
+                    expires_at - timedelta(seconds=lead_time) - datetime.now(timezone.utc)
+                ).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Someone else (a 401, another request) may have refreshed meanwhile
+                if self._expires_at == expires_at:
+                    await self._update(force=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Background AmoCRM token refresh failed")
+                await asyncio.sleep(REFRESH_RETRY_SECONDS)
+
+    def _needs_refresh(self) -> bool:
+        return self._expires_at is None or datetime.now(timezone.utc) >= (
+            self._expires_at - timedelta(seconds=REFRESH_MARGIN_SECONDS)
+        )
+
+    async def _update(self, force: bool) -> None:
+        """Start the load/refresh, or join the one already in flight."""
+        task = self._update_task
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load_or_refresh(force))
+            task.add_done_callback(self._update_done)
+            self._update_task = task
+        # Shielded: a caller giving up (deadline) must not abort the refresh
+        # other callers are waiting on, or lose a single-use refresh token.
+        await asyncio.shield(task)
+
+    def _update_done(self, task: asyncio.Task) -> None:
+        if self._update_task is task:
+            self._update_task = None
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter gave up
+
+    async def _load_or_refresh(self, force: bool) -> None:
+        if self._token_store is not None and await self._adopt_shared(force):
+            return
+        if not self._refresh_token:
+            await self._load_from_db()
+            if self._token_store is not None:
+                await self._seed_shared()
+        if self._refresh_token and (
+            force or not self._access_token or self._needs_refresh()
+        ):
+            started = time.monotonic()
+            try:
+                if self._token_store is not None:
+                    await self._refresh_shared()
+                else:
                     await self._refresh()
+            except Exception:
+                self._refresh_failed.inc()
+                raise
+            finally:
+                REFRESH_DURATION.observe(time.monotonic() - started)
+            self._refresh_ok.inc()
+        if self._expires_at is not None:
+            TOKEN_EXPIRY.set(self._expires_at.timestamp())
+
+    async def _adopt_shared(self, force: bool) -> bool:
+        """Take the pair from the shared store. True if that is all we need."""
+        pair = await self._token_store.get()
+        if pair is None:
+            return False
+        changed = pair.access_token != self._access_token
+        if changed:
+            self._set_pair(pair)
+            logger.info("Adopted shared AmoCRM token, expires at %s", self._expires_at)
+        if force:
+            # A 401 is fixed by a token other than the rejected one
+            return changed
+        return not self._needs_refresh()
 
-            if not self._access_token:
+    async def _seed_shared(self) -> None:
+        """Publish the DB token if the shared store is empty."""
+        if self._refresh_token is None or await self._token_store.get() is not None:
+            return
+        fence = await self._token_store.acquire()
+        if fence is None:
+            return
+        try:
+            if await self._token_store.save(self._current_pair(fence), fence):
+                self._fence = fence
+        finally:
+            await self._token_store.release(fence)
+
+    async def _refresh_shared(self) -> None:
+        """Refresh under the cross-replica lock, or wait for its holder's result."""
+        store = self._token_store
+        fence = await store.acquire()
+        if fence is None:
+            pair = await store.wait_for_newer(self._fence)
+            if pair is None:
                 raise RuntimeError(
-                    "No AmoCRM token available. Run scripts/setup_amocrm.py first."
+                    "Timed out waiting for another replica to refresh the AmoCRM token"
                 )
+            self._set_pair(pair)
+            return
 
-            return self._access_token
-
-    async def handle_401(self) -> None:
-        """Force token refresh on 401 response."""
-        async with self._lock:
-            logger.warning("Forcing token refresh due to 401")
-            if self._refresh_token:
-                await self._refresh()
+        try:
+            pair = await store.get()
+            if pair is not None and pair.fence > self._fence:
+                # Refreshed by another replica between our read and the lock
+                self._set_pair(pair)
+                return
+            await self._refresh()
+            if await store.save(self._current_pair(fence), fence):
+                self._fence = fence
             else:
-                await self._load_from_db()
-                if self._refresh_token:
-                    await self._refresh()
+                logger.error("Lost the AmoCRM token lock during refresh, pair not shared")
+        finally:
+            await store.release(fence)
+
+    def _set_pair(self, pair: TokenPair) -> None:
+        self._access_token = pair.access_token
+        self._refresh_token = pair.refresh_token
+        self._expires_at = pair.expires_at
+        self._fence = pair.fence
+
+    def _current_pair(self, fence: int) -> TokenPair:
+        return TokenPair(
+            self._access_token, self._refresh_token, self._expires_at, fence,
+        )
 
     async def _load_from_db(self) -> None:
-        """Load the latest token from the database."""
+        """Load the current token from the database."""
         from src.db.repositories.token import TokenRepository
 
         async with self._session_factory() as session:
@@ -98,21 +266,11 @@ class AmoCRMAuth:
             "redirect_uri": settings.AMOCRM_REDIRECT_URI,
         }
 
-        async with aiohttp.ClientSession() as http_session:
-            async with http_session.post(
-                f"{self.base_url}/oauth2/access_token",
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as resp:
-                if resp.status != 200:
-                    body = await resp.text()
-                    logger.error(
-                        "Token refresh failed: status=%d body=%s",
-                        resp.status, body,
-                    )
-                    raise RuntimeError(f"AmoCRM token refresh failed: {resp.status}")
-
-                data = await resp.json()
+        if self._http_session is not None:
+            data = await self._post_refresh(self._http_session, payload)
+        else:
+            async with aiohttp.ClientSession() as http_session:
+                data = await self._post_refresh(http_session, payload)
 
         self._access_token = data["access_token"]
         self._refresh_token = data["refresh_token"]
@@ -124,8 +282,26 @@ class AmoCRMAuth:
         await self._save_to_db()
         logger.info("AmoCRM token refreshed, expires at %s", self._expires_at)
 
+    async def _post_refresh(
+        self, http_session: aiohttp.ClientSession, payload: dict
+    ) -> dict:
+        async with http_session.post(
+            f"{self.base_url}/oauth2/access_token",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=10),
+        ) as resp:
+            if resp.status != 200:
+                body = await resp.text()
+                logger.error(
+                    "Token refresh failed: status=%d body=%s",
+                    resp.status, body,
+                )
+                raise RuntimeError(f"AmoCRM token refresh failed: {resp.status}")
+
+            return await resp.json()
+
     async def _save_to_db(self) -> None:
-        """Save the current token pair to database."""
+        """Save the current token pair to database, trimming old history rows."""
         from src.db.repositories.token import TokenRepository
 
         async with self._session_factory() as session:
@@ -136,4 +312,7 @@ class AmoCRMAuth:
                 expires_at=self._expires_at,
             )
             await repo.save(token)
+            pruned = await repo.prune_history(settings.AMOCRM_TOKEN_HISTORY_KEEP)
             await session.commit()
+        if pruned:
+            logger.info("Pruned %d old AmoCRM token rows", pruned)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from typing import Any
+
+from src.services.amocrm.client import AmoCRMDeadlineExceeded, AmoCRMError
+from src.services.amocrm.deadline import remaining_budget
+from src.utils.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+# AmoCRM accepts at most this many entities per array request
+AMOCRM_MAX_BATCH = 250
+
+BATCH_SIZE = histogram(
+    "amocrm_batch_size",
+    "Entities per batched AmoCRM request",
+    ["endpoint"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+BATCH_FLUSHES = counter(
+    "amocrm_batch_flushes_total",
+    "Batched AmoCRM requests by flush trigger",
+    ["endpoint", "reason"],
+)
+
+
+class BatchWriter:
+    """Coalesces single-entity POSTs to one AmoCRM endpoint into array requests.
+
+    Entities submitted within ``window`` seconds (or until ``max_size`` are
+    queued) go out as one request. Each caller gets back its own created
+    entity, matched by ``request_id``. If AmoCRM rejects the request as
+    invalid (4xx), the entities are sent again one by one, so only the
+    caller of the bad entity gets the error; any other failure goes to
+    every caller in the batch.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        path: str,
+        embedded_key: str,
+        window: float,
+        max_size: int,
+    ) -> None:
+        self._client = client
+        self._path = path
+        self._embedded_key = embedded_key
+        self._window = window
+        self._max_size = min(max(max_size, 1), AMOCRM_MAX_BATCH)
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._size = BATCH_SIZE.labels(path)
+        self._flushes = {
+            reason: BATCH_FLUSHES.labels(path, reason)
+            for reason in ("size", "window", "close", "split")
+        }
+
+    async def submit(self, entity: dict) -> dict:
+        """Queue ``entity`` for the next batch and wait for its created entity."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((entity, future))
+
+        if len(self._pending) >= self._max_size:
+            self._flush("size")
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush, "window")
+
+        budget = remaining_budget()
+        if budget is None:
+            return await future
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(budget, 0))
+        except asyncio.TimeoutError as exc:
+            raise AmoCRMDeadlineExceeded(
+                f"AmoCRM deadline exceeded waiting for batched POST {self._path}"
+            ) from exc
+
+    async def close(self) -> None:
+        """Send whatever is queued and wait for in-flight batches."""
+        if self._pending:
+            self._flush("close")
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush(self, reason: str) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self._flushes[reason].inc()
+        self._size.observe(len(batch))
+        # Run in a clean context: the batch must not inherit the priority
+        # or deadline of whichever caller happened to trigger the flush.
+        task = asyncio.get_running_loop().create_task(
+            self._send(batch), context=contextvars.Context(),
+        )
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        body = [
+            {**entity, "request_id": str(i)} for i, (entity, _) in enumerate(batch)
+        ]
+        try:
+            result = await self._client.post(self._path, json=body)
+            created = result["_embedded"][self._embedded_key]
+        except Exception as exc:
+            if len(batch) > 1 and _rejected_entity(exc):
+                logger.warning(
+                    "Batched POST %s of %d entities rejected (%s), sending one by one",
+                    self._path, len(batch), exc,
+                )
+                self._flushes["split"].inc()
+                await asyncio.gather(*(self._send([item]) for item in batch))
+                return
+            logger.warning(
+                "Batched POST %s of %d entities failed: %s", self._path, len(batch), exc,
+            )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        by_request_id = {str(item.get("request_id")): item for item in created}
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            item = by_request_id.get(str(i))
+            if item is None and i < len(created):
+                item = created[i]
+            if item is None:
+                future.set_exception(
+                    AmoCRMError(f"AmoCRM batch response missing entity {i} for {self._path}")
+                )
+            else:
+                future.set_result(item)
+        logger.debug("Batched POST %s: %d entities", self._path, len(batch))
+
+
+def _rejected_entity(exc: Exception) -> bool:
+    """A 4xx that may be down to one entity of the batch (not auth or rate limits)."""
+    return (
+        isinstance(exc, AmoCRMError)
+        and 400 <= exc.status < 500
+        and exc.status not in (401, 403, 429)
+    )
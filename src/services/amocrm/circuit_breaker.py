@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Callable
+
+from src.config import settings
+from src.utils.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+MAX_TRANSITIONS_KEPT = 20
+
+STATE = gauge(
+    "amocrm_circuit_breaker_state",
+    "Circuit breaker state: 0=closed, 1=half_open, 2=open",
+    ["breaker"],
+)
+TRANSITIONS = counter(
+    "amocrm_circuit_breaker_transitions_total",
+    "Circuit breaker state transitions",
+    ["breaker", "state"],
+)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+_STATE_VALUES = {
+    BreakerState.CLOSED: 0,
+    BreakerState.HALF_OPEN: 1,
+    BreakerState.OPEN: 2,
+}
+
+TransitionListener = Callable[["CircuitBreaker", BreakerState, BreakerState], None]
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker for one upstream.
+
+    - Closed: calls pass; ``failure_threshold`` consecutive failures open it
+    - Open: calls are rejected until ``recovery_timeout`` seconds pass
+    - Half-open: a single probe call is let through; success closes the
+      breaker, failure opens it again
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: float | None = None
+        self._listeners: list[TransitionListener] = []
+        self.transitions: deque[dict] = deque(maxlen=MAX_TRANSITIONS_KEPT)
+        self._state_gauge = STATE.labels(name)
+        self._state_gauge.set(_STATE_VALUES[self._state])
+
+    @property
+    def state(self) -> BreakerState:
+        if (
+            self._state == BreakerState.OPEN
+            and self._clock() - self._opened_at >= self.recovery_timeout
+        ):
+            self._transition(BreakerState.HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected without a probe."""
+        return self.state == BreakerState.OPEN
+
+    def add_listener(self, listener: TransitionListener) -> None:
+        self._listeners.append(listener)
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go out now."""
+        state = self.state
+        if state == BreakerState.CLOSED:
+            return True
+        if state == BreakerState.OPEN:
+            return False
+
+        # Half-open: one probe at a time. A probe that never reported back
+        # (e.g. cancelled) is replaced after another recovery timeout.
+        now = self._clock()
+        if (
+            self._probe_started_at is None
+            or now - self._probe_started_at >= self.recovery_timeout
+        ):
+            self._probe_started_at = now
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """A call let through ended without telling anything about the upstream.
+
+        Frees the half-open probe slot without changing the state.
+        """
+        self._probe_started_at = None
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_started_at = None
+        if self._state != BreakerState.CLOSED:
+            self._transition(BreakerState.CLOSED)
+
+    def record_failure(self) -> None:
+        self._probe_started_at = None
+        self._failures += 1
+        if self._state == BreakerState.HALF_OPEN or (
+            self._state == BreakerState.CLOSED
+            and self._failures >= self.failure_threshold
+        ):
+            self._opened_at = self._clock()
+            self._transition(BreakerState.OPEN)
+
+    def snapshot(self) -> dict:
+        """JSON-serializable view for the health server."""
+        state = self.state
+        retry_in = None
+        if state == BreakerState.OPEN:
+            retry_in = round(
+                self.recovery_timeout - (self._clock() - self._opened_at), 1
+            )
+        return {
+            "name": self.name,
+            "state": state.value,
+            "consecutive_failures": self._failures,
+            "retry_in_seconds": retry_in,
+            "transitions": list(self.transitions),
+        }
+
+    def _transition(self, new_state: BreakerState) -> None:
+        old_state = self._state
+        self._state = new_state
+        self._state_gauge.set(_STATE_VALUES[new_state])
+        TRANSITIONS.labels(self.name, new_state.value).inc()
+        self.transitions.append({
+            "at": datetime.now(timezone.utc).isoformat(),
+            "from": old_state.value,
+            "to": new_state.value,
+        })
+        log = logger.warning if new_state == BreakerState.OPEN else logger.info
+        log("Circuit breaker %s: %s -> %s", self.name, old_state.value, new_state.value)
+
+        for listener in self._listeners:
+            try:
+                listener(self, old_state, new_state)
+            except Exception:
+                logger.exception("Circuit breaker listener failed")
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(key: str) -> CircuitBreaker:
+    """Return the process-wide breaker for ``key`` (the AmoCRM base URL)."""
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            key,
+            failure_threshold=settings.AMOCRM_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.AMOCRM_BREAKER_RECOVERY_SECONDS,
+        )
+        _breakers[key] = breaker
+    return breaker
+
+
+def all_breakers() -> list[CircuitBreaker]:
+    return list(_breakers.values())
+
+
+def reset_breakers() -> None:
+    """Forget all breakers (used by tests)."""
+    _breakers.clear()
+    STATE.clear()
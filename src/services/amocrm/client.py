@@ -1,15 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from json import dumps as json_dumps
+from typing import Any, AsyncIterator, Awaitable, TypeVar
 
 import aiohttp
 
 from src.services.amocrm.auth import AmoCRMAuth
+from src.services.amocrm.circuit_breaker import CircuitBreaker, get_breaker
+from src.services.amocrm.deadline import remaining_budget
+from src.services.amocrm.instrumentation import EndpointMetrics, endpoint_metrics
+from src.services.amocrm.rate_limiter import PriorityRateLimiter
 
 logger = logging.getLogger(__name__)
 
 REQUEST_TIMEOUT = 10
+MAX_RETRY_AFTER = 60
+
+T = TypeVar("T")
 
 
 class AmoCRMError(Exception):
@@ -20,11 +33,76 @@ class AmoCRMError(Exception):
         self.status = status
 
 
+class AmoCRMDeadlineExceeded(AmoCRMError):
+    """The ``crm_deadline`` budget ran out before the call could succeed."""
+
+
+class AmoCRMCircuitOpen(AmoCRMError):
+    """AmoCRM is considered down; the call was rejected without sending."""
+
+
+def _retry_delay(retry_after: str | None, attempt: int) -> float:
+    """Backoff before the next attempt: Retry-After if given, else 2^(n-1)s."""
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                when = None
+            if when is not None:
+                if when.tzinfo is None:
+                    when = when.replace(tzinfo=timezone.utc)
+                delay = (when - datetime.now(timezone.utc)).total_seconds()
+            else:
+                delay = 2 ** (attempt - 1)
+        return min(max(delay, 0.0), MAX_RETRY_AFTER)
+    return 2 ** (attempt - 1)
+
+
 class AmoCRMClient:
-    """HTTP client for AmoCRM API v4."""
+    """HTTP client for AmoCRM API v4.
 
-    def __init__(self, auth: AmoCRMAuth) -> None:
+    Uses the shared ``http_session`` (see ``create_http_session``) when
+    given, so connections are reused across requests. Without one, each
+    attempt opens a throwaway session.
+
+    Every attempt first takes a token from the shared ``rate_limiter``;
+    the priority comes from the ``crm_priority`` context.
+
+    Attempts go through the circuit breaker of the AmoCRM base URL: 5xx
+    responses, timeouts and connection errors count as failures, and while
+    the breaker is open calls fail immediately with AmoCRMCircuitOpen.
+    """
+
+    def __init__(
+        self,
+        auth: AmoCRMAuth,
+        http_session: aiohttp.ClientSession | None = None,
+        rate_limiter: PriorityRateLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
         self._auth = auth
+        self._http_session = http_session
+        self._rate_limiter = rate_limiter or PriorityRateLimiter.from_settings()
+        self._breaker = breaker or get_breaker(auth.base_url)
+
+    @property
+    def auth(self) -> AmoCRMAuth:
+        return self._auth
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        if self._http_session is not None:
+            yield self._http_session
+        else:
+            async with aiohttp.ClientSession() as session:
+                yield session
 
     async def _request(
         self,
@@ -35,79 +113,175 @@ class AmoCRMClient:
     ) -> dict:
         """Make an authenticated request to AmoCRM API with retry logic.
 
-        Retries on 429, 5xx. On 401, refreshes token and retries once.
+        Retries on 429, 5xx and connection errors, honoring Retry-After.
+        On 401, refreshes token and retries once. Inside a ``crm_deadline``
+        block, timeouts, rate limiter waits and backoff sleeps are clipped
+        to the remaining budget; once it runs out AmoCRMDeadlineExceeded
+        is raised instead of retrying.
+
+        Latency, status, attempts and bytes are recorded per method and
+        path template (see ``instrumentation``).
         """
-        max_attempts = 3
-        last_error: Exception | None = None
+        endpoint = endpoint_metrics(method, path)
+        data = None if json is None else json_dumps(json).encode()
+        attempts = 0
+        started = time.monotonic()
+        try:
+            max_attempts = 3
+            last_error: Exception | None = None
 
-        for attempt in range(1, max_attempts + 1):
-            token = await self._auth.get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
+            for attempt in range(1, max_attempts + 1):
+                if self._breaker.is_open:
+                    raise AmoCRMCircuitOpen(
+                        f"AmoCRM circuit open, {method} {path} not sent"
+                    )
+                await self._within_deadline(self._rate_limiter.acquire(), method, path)
+                token = await self._within_deadline(
+                    self._auth.get_access_token(), method, path,
+                )
+                headers = {"Authorization": f"Bearer {token}"}
+                if data is not None:
+                    headers["Content-Type"] = "application/json"
+                timeout = self._attempt_timeout(method, path)
+                if not self._breaker.allow_request():
+                    raise AmoCRMCircuitOpen(
+                        f"AmoCRM circuit {self._breaker.state.value}, {method} {path} not sent"
+                    )
 
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.request(
-                        method,
-                        f"{self._auth.base_url}{path}",
-                        json=json,
-                        params=params,
-                        headers=headers,
-                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
-                    ) as resp:
-                        if resp.status in (200, 201, 204):
-                            if resp.status == 204:
-                                return {}
-                            return await resp.json()
-
-                        body = await resp.text()
-
-                        if resp.status == 401 and attempt < max_attempts:
-                            logger.warning(
-                                "AmoCRM 401 on %s %s, refreshing token (attempt %d)",
-                                method, path, attempt,
-                            )
-                            await self._auth.handle_401()
-                            continue
+                attempts = attempt
+                if data is not None:
+                    endpoint.sent_bytes.inc(len(data))
+                sent_at = time.monotonic()
+                try:
+                    async with self._session() as session:
+                        async with session.request(
+                            method,
+                            f"{self._auth.base_url}{path}",
+                            data=data,
+                            params=params,
+                            headers=headers,
+                            timeout=aiohttp.ClientTimeout(total=timeout),
+                        ) as resp:
+                            if resp.status >= 500:
+                                self._breaker.record_failure()
+                            else:
+                                self._breaker.record_success()
 
-                        if resp.status == 429 and attempt < max_attempts:
-                            logger.warning(
-                                "AmoCRM 429 on %s %s, retrying (attempt %d)",
-                                method, path, attempt,
-                            )
-                            import asyncio
-                            await asyncio.sleep(2 ** (attempt - 1))
-                            continue
-
-                        if resp.status >= 500 and attempt < max_attempts:
-                            logger.warning(
-                                "AmoCRM %d on %s %s, retrying (attempt %d)",
-                                resp.status, method, path, attempt,
+                            if resp.status in (200, 201, 204):
+                                result = {} if resp.status == 204 else await resp.json()
+                                self._record_response(endpoint, resp, sent_at)
+                                return result
+
+                            body = await resp.text()
+                            self._record_response(endpoint, resp, sent_at)
+
+                            if resp.status == 401 and attempt < max_attempts:
+                                logger.warning(
+                                    "AmoCRM 401 on %s %s, refreshing token (attempt %d)",
+                                    method, path, attempt,
+                                )
+                                await self._within_deadline(
+                                    self._auth.handle_401(token), method, path,
+                                )
+                                continue
+
+                            if (
+                                (resp.status == 429 or resp.status >= 500)
+                                and attempt < max_attempts
+                                and not self._breaker.is_open
+                            ):
+                                delay = _retry_delay(resp.headers.get("Retry-After"), attempt)
+                                logger.warning(
+                                    "AmoCRM %d on %s %s, retrying in %.1fs (attempt %d)",
+                                    resp.status, method, path, delay, attempt,
+                                )
+                                await self._backoff(delay, method, path)
+                                continue
+
+                            last_error = AmoCRMError(
+                                f"AmoCRM API error: {resp.status} {body}",
+                                status=resp.status,
                             )
-                            import asyncio
-                            await asyncio.sleep(2 ** (attempt - 1))
-                            continue
+                            raise last_error
 
-                        last_error = AmoCRMError(
-                            f"AmoCRM API error: {resp.status} {body}",
-                            status=resp.status,
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    endpoint.duration.observe(time.monotonic() - sent_at)
+                    endpoint.error()
+                    if isinstance(exc, asyncio.TimeoutError) and timeout < REQUEST_TIMEOUT:
+                        # Cut short by our own deadline budget, not AmoCRM's fault
+                        self._breaker.release_probe()
+                    else:
+                        self._breaker.record_failure()
+                    last_error = exc
+                    budget = remaining_budget()
+                    if budget is not None and budget <= 0:
+                        raise AmoCRMDeadlineExceeded(
+                            f"AmoCRM deadline exceeded on {method} {path}"
+                        ) from exc
+                    if attempt < max_attempts and not self._breaker.is_open:
+                        delay = _retry_delay(None, attempt)
+                        logger.warning(
+                            "AmoCRM connection error on %s %s: %r (attempt %d)",
+                            method, path, exc, attempt,
                         )
-                        raise last_error
-
-            except aiohttp.ClientError as exc:
-                last_error = exc
-                if attempt < max_attempts:
-                    logger.warning(
-                        "AmoCRM connection error on %s %s: %s (attempt %d)",
-                        method, path, exc, attempt,
-                    )
-                    import asyncio
-                    await asyncio.sleep(2 ** (attempt - 1))
-                    continue
-                raise AmoCRMError(f"AmoCRM connection error: {exc}") from exc
-
-        if last_error:
-            raise last_error
-        raise AmoCRMError("Unexpected error in AmoCRM client")
+                        await self._backoff(delay, method, path)
+                        continue
+                    raise AmoCRMError(f"AmoCRM connection error: {exc!r}") from exc
+
+            if last_error:
+                raise last_error
+            raise AmoCRMError("Unexpected error in AmoCRM client")
+        finally:
+            endpoint.call_duration.observe(time.monotonic() - started)
+            if attempts:
+                endpoint.attempts.observe(attempts)
+
+    @staticmethod
+    def _record_response(
+        endpoint: EndpointMetrics, resp: aiohttp.ClientResponse, sent_at: float
+    ) -> None:
+        endpoint.duration.observe(time.monotonic() - sent_at)
+        endpoint.response(resp.status)
+        endpoint.received_bytes.inc(resp.content.total_bytes)
+
+    def _attempt_timeout(self, method: str, path: str) -> float:
+        """Per-attempt timeout, clipped to the remaining deadline budget."""
+        budget = remaining_budget()
+        if budget is None:
+            return REQUEST_TIMEOUT
+        if budget <= 0:
+            raise AmoCRMDeadlineExceeded(
+                f"AmoCRM deadline exceeded before {method} {path}"
+            )
+        return min(REQUEST_TIMEOUT, budget)
+
+    async def _within_deadline(self, awaitable: Awaitable[T], method: str, path: str) -> T:
+        """Await ``awaitable`` but give up when the deadline budget runs out."""
+        budget = remaining_budget()
+        if budget is None:
+            return await awaitable
+        if budget <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise AmoCRMDeadlineExceeded(
+                f"AmoCRM deadline exceeded before {method} {path}"
+            )
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except asyncio.TimeoutError as exc:
+            raise AmoCRMDeadlineExceeded(
+                f"AmoCRM deadline exceeded on {method} {path}"
+            ) from exc
+
+    async def _backoff(self, delay: float, method: str, path: str) -> None:
+        """Sleep before the next attempt unless it would overrun the deadline."""
+        budget = remaining_budget()
+        if budget is not None and delay >= budget:
+            raise AmoCRMDeadlineExceeded(
+                f"AmoCRM deadline exceeded: {method} {path} needs {delay:.1f}s "
+                f"backoff, {max(budget, 0):.1f}s left"
+            )
+        await asyncio.sleep(delay)
 
     async def get(self, path: str, params: dict | None = None) -> dict:
         return await self._request("GET", path, params=params)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from src.config import settings
+from src.db.repositories.user import UserRepository
+from src.utils.metrics import counter
+from src.utils.phone import validate_phone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "amocrm:contact:"
+
+LOOKUPS = counter(
+    "amocrm_contact_index_lookups_total",
+    "Phone -> AmoCRM contact lookups by the layer that answered",
+    ["source"],
+)
+INVALIDATIONS = counter(
+    "amocrm_contact_index_invalidations_total",
+    "Cached contact IDs dropped after AmoCRM reported them missing",
+)
+
+
+@dataclass
+class CachedContact:
+    contact_id: int
+    repeat_tagged: bool = False
+    source: str = ""
+
+
+def normalize_phone(phone: str) -> str:
+    return validate_phone(phone) or phone.strip()
+
+
+class ContactIndex:
+    """Local phone -> AmoCRM contact lookup in front of ``find_by_phone``.
+
+    Checks ``users.amo_contact_id`` by phone first, then a Redis entry with
+    TTL; only a miss in both needs the AmoCRM contacts query. Redis also
+    remembers whether the contact already carries the ``telegram_repeat``
+    tag so the tagging PATCH is sent once per contact.
+    """
+
+    def __init__(self, redis: Any = None, ttl: int | None = None) -> None:
+        self._redis = redis
+        self._ttl = ttl if ttl is not None else settings.AMOCRM_CONTACT_CACHE_TTL
+        self._hits = {
+            source: LOOKUPS.labels(source) for source in ("db", "redis", "miss")
+        }
+
+    async def lookup(self, session: Any, phone: str) -> CachedContact | None:
+        phone = normalize_phone(phone)
+        cached = await self._redis_get(phone)
+
+        if session is not None:
+            contact_id = await UserRepository(session).get_contact_id_by_phone(phone)
+            if contact_id is not None:
+                self._hits["db"].inc()
+                tagged = bool(
+                    cached and cached.contact_id == contact_id and cached.repeat_tagged
+                )
+                return CachedContact(contact_id, tagged, source="db")
+
+        if cached is not None:
+            self._hits["redis"].inc()
+            return cached
+
+        self._hits["miss"].inc()
+        return None
+
+    async def remember(
+        self, phone: str, contact_id: int, repeat_tagged: bool = False
+    ) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(
+                KEY_PREFIX + normalize_phone(phone),
+                f"{contact_id}:{int(repeat_tagged)}",
+                ex=self._ttl,
+            )
+        except Exception:
+            logger.warning("Failed to cache AmoCRM contact for %s", phone, exc_info=True)
+
+    async def invalidate(self, session: Any, phone: str, contact_id: int) -> None:
+        """Drop a contact ID that AmoCRM no longer knows (404)."""
+        INVALIDATIONS.inc()
+        logger.warning("AmoCRM contact %d for %s is gone, dropping cached ID", contact_id, phone)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(KEY_PREFIX + normalize_phone(phone))
+            except Exception:
+                logger.warning("Failed to drop cached contact for %s", phone, exc_info=True)
+        if session is not None:
+            await UserRepository(session).clear_contact_id(contact_id)
+
+    async def _redis_get(self, phone: str) -> CachedContact | None:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(KEY_PREFIX + phone)
+        except Exception:
+            logger.warning("Contact cache read failed for %s", phone, exc_info=True)
+            return None
+        if not raw:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        contact_id, _, tagged = raw.partition(":")
+        return CachedContact(int(contact_id), tagged == "1", source="redis")
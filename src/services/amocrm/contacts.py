@@ -3,17 +3,64 @@ from __future__ import annotations
 import logging
 
 from src.config import settings
+from src.services.amocrm.batcher import BatchWriter
 from src.services.amocrm.client import AmoCRMClient
 from src.services.amocrm.models import CustomFieldValue
 
 logger = logging.getLogger(__name__)
 
+NEW_TAG = "telegram_new"
+REPEAT_TAG = "telegram_repeat"
+
+
+def build_contact_payload(
+    name: str,
+    phone: str,
+    telegram_id: int,
+    telegram_username: str | None = None,
+) -> dict:
+    """Build a new-contact entity for /contacts or /leads/complex."""
+    custom_fields = [
+        CustomFieldValue(
+            field_id=settings.AMOCRM_FIELD_TELEGRAM_ID,
+            values=[{"value": str(telegram_id)}],
+        ),
+    ]
+    if telegram_username and settings.AMOCRM_FIELD_TELEGRAM_USERNAME:
+        custom_fields.append(
+            CustomFieldValue(
+                field_id=settings.AMOCRM_FIELD_TELEGRAM_USERNAME,
+                values=[{"value": telegram_username}],
+            )
+        )
+
+    return {
+        "name": name,
+        "custom_fields_values": [
+            {"field_id": cf.field_id, "values": cf.values}
+            for cf in custom_fields
+        ] + [
+            {
+                "field_code": "PHONE",
+                "values": [{"value": phone, "enum_code": "MOB"}],
+            }
+        ],
+        "tags_to_add": [{"name": NEW_TAG}],
+    }
+
 
 class ContactsService:
-    """AmoCRM contacts operations."""
+    """AmoCRM contacts operations.
 
-    def __init__(self, client: AmoCRMClient) -> None:
+    With a ``batcher``, contact creation is coalesced with concurrent
+    submissions into array requests.
+    """
+
+    def __init__(
+        self, client: AmoCRMClient, batcher: BatchWriter | None = None
+    ) -> None:
         self._client = client
+        self._batcher = batcher
 
     async def find_by_phone(self, phone: str) -> dict | None:
         """Search for a contact by phone number. Returns first match or None."""
@@ -34,38 +81,13 @@ class ContactsService:
         telegram_username: str | None = None,
     ) -> int:
         """Create a new contact. Returns the contact ID."""
-        custom_fields = [
-            CustomFieldValue(
-                field_id=settings.AMOCRM_FIELD_TELEGRAM_ID,
-                values=[{"value": str(telegram_id)}],
-            ),
-        ]
-        if telegram_username and settings.AMOCRM_FIELD_TELEGRAM_USERNAME:
-            custom_fields.append(
-                CustomFieldValue(
-                    field_id=settings.AMOCRM_FIELD_TELEGRAM_USERNAME,
-                    values=[{"value": telegram_username}],
-                )
-            )
-
-        body = [
-            {
-                "name": name,
-                "custom_fields_values": [
-                    {"field_id": cf.field_id, "values": cf.values}
-                    for cf in custom_fields
-                ] + [
-                    {
-                        "field_code": "PHONE",
-                        "values": [{"value": phone, "enum_code": "MOB"}],
-                    }
-                ],
-                "tags_to_add": [{"name": "telegram_new"}],
-            }
-        ]
+        contact = build_contact_payload(name, phone, telegram_id, telegram_username)
 
-        data = await self._client.post("/api/v4/contacts", json=body)
-        contact_id = data["_embedded"]["contacts"][0]["id"]
+        if self._batcher is not None:
+            contact_id = (await self._batcher.submit(contact))["id"]
+        else:
+            data = await self._client.post("/api/v4/contacts", json=[contact])
+            contact_id = data["_embedded"]["contacts"][0]["id"]
         logger.info("Created AmoCRM contact %d for phone %s", contact_id, phone)
         return contact_id
 
@@ -74,7 +96,7 @@ class ContactsService:
         body = [
             {
                 "id": contact_id,
-                "tags_to_add": [{"name": "telegram_repeat"}],
+                "tags_to_add": [{"name": REPEAT_TAG}],
             }
         ]
         await self._client.patch("/api/v4/contacts", json=body)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_deadline: ContextVar[float | None] = ContextVar("amocrm_deadline", default=None)
+
+
+@contextmanager
+def crm_deadline(seconds: float | None) -> Iterator[None]:
+    """Give all AmoCRM calls inside the block a shared time budget.
+
+    The budget covers every request, retry, backoff sleep and rate limiter
+    wait. A nested block can only shorten the outer deadline. ``None`` or
+    a non-positive value leaves the current deadline untouched.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> float | None:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
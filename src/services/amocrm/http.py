@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import aiohttp
+
+from src.config import settings
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Create the long-lived HTTP session shared by AmoCRM client and auth.
+
+    One session per process keeps TCP/TLS connections alive between
+    requests, caches DNS lookups and caps concurrent connections per host.
+    Must be created inside a running event loop and closed on shutdown.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=settings.AMOCRM_HTTP_POOL_SIZE,
+        limit_per_host=settings.AMOCRM_HTTP_POOL_PER_HOST,
+        ttl_dns_cache=settings.AMOCRM_HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=settings.AMOCRM_HTTP_KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector)
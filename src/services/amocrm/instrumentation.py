@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import re
+import sys
+from functools import lru_cache
+
+from src.utils.metrics import counter, histogram
+
+REQUEST_DURATION = histogram(
+    "amocrm_request_duration_seconds",
+    "Latency of single AmoCRM HTTP attempts",
+    ["method", "path"],
+)
+CALL_DURATION = histogram(
+    "amocrm_call_duration_seconds",
+    "Latency of AmoCRM calls including retries and backoff",
+    ["method", "path"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+CALL_ATTEMPTS = histogram(
+    "amocrm_call_attempts",
+    "HTTP attempts per AmoCRM call",
+    ["method", "path"],
+    buckets=(1, 2, 3),
+)
+RESPONSES = counter(
+    "amocrm_responses_total",
+    "AmoCRM HTTP attempts by status (error = timeout or connection error)",
+    ["method", "path", "status"],
+)
+SENT_BYTES = counter(
+    "amocrm_request_bytes_total",
+    "Request body bytes sent to AmoCRM",
+    ["method", "path"],
+)
+RECEIVED_BYTES = counter(
+    "amocrm_response_bytes_total",
+    "Response body bytes received from AmoCRM",
+    ["method", "path"],
+)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+_ERROR = "error"
+
+
+@lru_cache(maxsize=1024)
+def path_template(path: str) -> str:
+    """``/api/v4/leads/123/notes`` -> ``/api/v4/leads/{id}/notes`` (interned).
+
+    Cached on the raw path: nearly all AmoCRM paths used here are
+    constant, only notes carry a lead ID (and those age out of the LRU).
+    """
+    return sys.intern(_ID_SEGMENT.sub("/{id}", path))
+
+
+class EndpointMetrics:
+    """Metric children of one (method, path template), created once.
+
+    ``AmoCRMClient`` looks this up per call; recording is then attribute
+    access and arithmetic only, without building label strings.
+    """
+
+    __slots__ = (
+        "method", "path", "duration", "call_duration", "attempts",
+        "sent_bytes", "received_bytes", "_responses",
+    )
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.duration = REQUEST_DURATION.labels(method, path)
+        self.call_duration = CALL_DURATION.labels(method, path)
+        self.attempts = CALL_ATTEMPTS.labels(method, path)
+        self.sent_bytes = SENT_BYTES.labels(method, path)
+        self.received_bytes = RECEIVED_BYTES.labels(method, path)
+        self._responses: dict[int | str, object] = {}
+
+    def response(self, status: int | str) -> None:
+        """Count one attempt that ended with ``status`` (or "error")."""
+        child = self._responses.get(status)
+        if child is None:
+            child = RESPONSES.labels(self.method, self.path, str(status))
+            self._responses[status] = child
+        child.inc()
+
+    def error(self) -> None:
+        self.response(_ERROR)
+
+
+# method -> path template -> metrics; nested so lookups build no tuple keys
+_endpoints: dict[str, dict[str, EndpointMetrics]] = {}
+
+
+def endpoint_metrics(method: str, path: str) -> EndpointMetrics:
+    template = path_template(path)
+    by_template = _endpoints.get(method)
+    if by_template is None:
+        by_template = _endpoints[method] = {}
+    metrics = by_template.get(template)
+    if metrics is None:
+        metrics = by_template[template] = EndpointMetrics(method, template)
+    return metrics
@@ -1,33 +1,49 @@
 from __future__ import annotations
 
 import logging
+from typing import Any
 
 from src.config import settings
+from src.services.amocrm.batcher import BatchWriter
 from src.services.amocrm.client import AmoCRMClient
+from src.services.amocrm.metadata import (
+    CompiledField,
+    LeadFieldMap,
+    SKIPPED_VALUES,
+    MetadataCache,
+    compile_field_mapping,
+)
 from src.services.amocrm.models import CustomFieldValue
 from src.utils.formatters import SERVICE_TYPE_LABELS
 
 logger = logging.getLogger(__name__)
 
-# Mapping of data keys to AmoCRM custom field settings attribute names
-FIELD_MAPPING = {
-    "car_brand": "AMOCRM_FIELD_CAR_BRAND",
-    "year": "AMOCRM_FIELD_CAR_YEAR",
-    "budget": "AMOCRM_FIELD_BUDGET",
-    "mileage": "AMOCRM_FIELD_MILEAGE",
-    "transmission": "AMOCRM_FIELD_TRANSMISSION",
-    "drive": "AMOCRM_FIELD_DRIVE_TYPE",
-    "body_type": "AMOCRM_FIELD_BODY_TYPE",
-    "vin": "AMOCRM_FIELD_VIN_NUMBER",
-    "check_type": "AMOCRM_FIELD_CHECK_TYPE",
-}
-
 
 class LeadsService:
-    """AmoCRM leads operations."""
+    """AmoCRM leads operations.
+
+    With a ``batcher``, lead creation is coalesced with concurrent
+    submissions into array requests. Custom fields follow the compiled
+    mapping of ``metadata`` (validated against the account) or, without
+    it, a mapping compiled from settings once.
+    """
 
-    def __init__(self, client: AmoCRMClient) -> None:
+    def __init__(
+        self,
+        client: AmoCRMClient,
+        batcher: BatchWriter | None = None,
+        metadata: MetadataCache | None = None,
+    ) -> None:
         self._client = client
+        self._batcher = batcher
+        self._metadata = metadata
+        self._static_field_map = compile_field_mapping() if metadata is None else None
+
+    @property
+    def field_map(self) -> LeadFieldMap:
+        if self._metadata is not None:
+            return self._metadata.field_map
+        return self._static_field_map
 
     async def create(
         self,
@@ -37,63 +53,83 @@ class LeadsService:
         data: dict,
     ) -> int:
         """Create a lead linked to a contact. Returns the lead ID."""
-        custom_fields = self._build_custom_fields(service_type, data)
+        lead = self._build_lead(title, service_type, data)
+        lead["_embedded"] = {"contacts": [{"id": contact_id}]}
 
-        body = [
-            {
-                "name": title,
-                "pipeline_id": settings.AMOCRM_PIPELINE_ID,
-                "status_id": settings.AMOCRM_STATUS_ID,
-                "responsible_user_id": settings.AMOCRM_RESPONSIBLE_USER_ID,
-                "custom_fields_values": [
-                    {"field_id": cf.field_id, "values": cf.values}
-                    for cf in custom_fields
-                ],
-                "_embedded": {
-                    "contacts": [{"id": contact_id}],
-                },
-            }
-        ]
-
-        result = await self._client.post("/api/v4/leads", json=body)
-        lead_id = result["_embedded"]["leads"][0]["id"]
+        if self._batcher is not None:
+            lead_id = (await self._batcher.submit(lead))["id"]
+        else:
+            result = await self._client.post("/api/v4/leads", json=[lead])
+            lead_id = result["_embedded"]["leads"][0]["id"]
         logger.info("Created AmoCRM lead %d: %s", lead_id, title)
         return lead_id
 
+    async def create_complex(
+        self,
+        title: str,
+        contact: dict,
+        service_type: str,
+        data: dict,
+    ) -> tuple[int, int]:
+        """Create a lead together with a new embedded contact in one request.
+
+        ``contact`` is a new-contact entity (see ``build_contact_payload``).
+        Returns (lead_id, contact_id).
+        """
+        lead = self._build_lead(title, service_type, data)
+        lead["_embedded"] = {"contacts": [contact]}
+
+        result = await self._client.post("/api/v4/leads/complex", json=[lead])
+        lead_id = result[0]["id"]
+        contact_id = result[0]["contact_id"]
+        logger.info(
+            "Created AmoCRM lead %d with contact %d: %s", lead_id, contact_id, title,
+        )
+        return lead_id, contact_id
+
+    def _build_lead(self, title: str, service_type: str, data: dict) -> dict:
+        custom_fields = self._build_custom_fields(service_type, data)
+        return {
+            "name": title,
+            "pipeline_id": settings.AMOCRM_PIPELINE_ID,
+            "status_id": settings.AMOCRM_STATUS_ID,
+            "responsible_user_id": settings.AMOCRM_RESPONSIBLE_USER_ID,
+            "custom_fields_values": [
+                {"field_id": cf.field_id, "values": cf.values}
+                for cf in custom_fields
+            ],
+        }
+
     def _build_custom_fields(
         self, service_type: str, data: dict
     ) -> list[CustomFieldValue]:
+        field_map = self.field_map
         fields = []
 
-        # Service type
-        if settings.AMOCRM_FIELD_SERVICE_TYPE:
+        if field_map.service_type is not None:
             label = SERVICE_TYPE_LABELS.get(service_type, service_type)
-            fields.append(
-                CustomFieldValue(
-                    field_id=settings.AMOCRM_FIELD_SERVICE_TYPE,
-                    values=[{"value": label}],
-                )
-            )
-
-        # Source
-        if settings.AMOCRM_FIELD_SOURCE:
-            fields.append(
-                CustomFieldValue(
-                    field_id=settings.AMOCRM_FIELD_SOURCE,
-                    values=[{"value": "Telegram Bot"}],
-                )
-            )
-
-        # Data fields
-        for data_key, settings_attr in FIELD_MAPPING.items():
-            value = data.get(data_key)
-            field_id = getattr(settings, settings_attr, 0)
-            if value and field_id:
-                fields.append(
-                    CustomFieldValue(
-                        field_id=field_id,
-                        values=[{"value": str(value)}],
-                    )
-                )
+            _append(fields, field_map.service_type, label)
+
+        if field_map.source is not None:
+            _append(fields, field_map.source, "Telegram Bot")
+
+        for compiled in field_map.data:
+            value = data.get(compiled.data_key)
+            if value:
+                _append(fields, compiled, value)
 
         return fields
+
+
+def _append(
+    fields: list[CustomFieldValue], compiled: CompiledField, value: Any
+) -> None:
+    encoded = compiled.encode(value)
+    if encoded is None:
+        logger.warning(
+            "AmoCRM mapping: value %r of %s doesn't fit %s field %d, skipped",
+            value, compiled.data_key, compiled.value_type, compiled.field_id,
+        )
+        SKIPPED_VALUES.labels(compiled.data_key).inc()
+        return
+    fields.append(CustomFieldValue(field_id=compiled.field_id, values=[encoded]))
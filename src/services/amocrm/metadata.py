@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.config import settings
+from src.utils.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+# Mapping of data keys to AmoCRM custom field settings attribute names
+FIELD_MAPPING = {
+    "car_brand": "AMOCRM_FIELD_CAR_BRAND",
+    "year": "AMOCRM_FIELD_CAR_YEAR",
+    "budget": "AMOCRM_FIELD_BUDGET",
+    "mileage": "AMOCRM_FIELD_MILEAGE",
+    "transmission": "AMOCRM_FIELD_TRANSMISSION",
+    "drive": "AMOCRM_FIELD_DRIVE_TYPE",
+    "body_type": "AMOCRM_FIELD_BODY_TYPE",
+    "vin": "AMOCRM_FIELD_VIN_NUMBER",
+    "check_type": "AMOCRM_FIELD_CHECK_TYPE",
+}
+
+CONTACT_FIELDS = ("AMOCRM_FIELD_TELEGRAM_ID", "AMOCRM_FIELD_TELEGRAM_USERNAME")
+
+NUMERIC_TYPES = frozenset({"numeric", "price"})
+ENUM_TYPES = frozenset({"select", "radiobutton", "multiselect"})
+
+PAGE_LIMIT = 250
+
+PROBLEMS = gauge(
+    "amocrm_metadata_problems",
+    "Configured AmoCRM IDs missing from the account metadata",
+)
+REFRESHES = counter(
+    "amocrm_metadata_refreshes_total",
+    "AmoCRM metadata loads by result",
+    ["result"],
+)
+SKIPPED_VALUES = counter(
+    "amocrm_field_values_skipped_total",
+    "Lead values that didn't fit their AmoCRM field (not a number, unknown enum)",
+    ["field"],
+)
+
+# A number, with thousands optionally grouped by spaces: "1 500 000", "2,5"
+_NUMBER = re.compile(r"\d{1,3}(?:[ \u00a0]\d{3})+(?![\d.,])|\d+(?:[.,]\d+)?")
+# What may surround it: "до 1 500 000 руб.", "от 3 000 000", "120000 км"
+_NUMBER_WORDS = re.compile(r"^(?:до|от|руб\.?|р\.?|₽|км|\.)?$")
+_RANGE = re.compile(r"^\s*[-–—]\s*$")
+
+
+def parse_number(value: Any) -> str | None:
+    """The single number in ``value``, or a range's upper bound.
+
+    ``"до 1 500 000 руб."`` -> ``"1500000"``, ``"500 000 - 1 000 000"``
+    -> ``"1000000"``. Anything else around the number (other words, units
+    like "млн", several numbers) -> None, rather than guess.
+    """
+    text = str(value).strip().casefold()
+    matches = list(_NUMBER.finditer(text))
+    if not matches or len(matches) > 2:
+        return None
+    if len(matches) == 2 and not _RANGE.match(
+        text[matches[0].end():matches[1].start()]
+    ):
+        return None
+    rest = text[:matches[0].start()] + " " + text[matches[-1].end():]
+    if not all(_NUMBER_WORDS.match(word) for word in rest.split()):
+        return None
+    return re.sub(r"\s", "", matches[-1].group()).replace(",", ".")
+
+
+@dataclass(frozen=True)
+class CompiledField:
+    """One custom field value source: where it comes from and how to encode it."""
+
+    data_key: str
+    field_id: int
+    value_type: str = "text"
+    enums: dict[str, int] = field(default_factory=dict)
+
+    def encode(self, value: Any) -> dict | None:
+        """AmoCRM value entry for ``value``, or None if the field can't take it."""
+        if self.value_type in NUMERIC_TYPES:
+            number = parse_number(value)
+            return {"value": number} if number is not None else None
+        if self.value_type in ENUM_TYPES:
+            enum_id = self.enums.get(str(value).strip().casefold())
+            return {"enum_id": enum_id} if enum_id else None
+        if self.value_type == "checkbox":
+            return {"value": bool(value)}
+        return {"value": str(value)}
+
+
+@dataclass(frozen=True)
+class LeadFieldMap:
+    """``FIELD_MAPPING`` and the fixed lead fields resolved to field IDs."""
+
+    service_type: CompiledField | None = None
+    source: CompiledField | None = None
+    data: tuple[CompiledField, ...] = ()
+    problems: tuple[str, ...] = ()
+
+
+@dataclass
+class AccountMetadata:
+    """Custom fields (by ID) and pipeline -> status IDs of the AmoCRM account."""
+
+    lead_fields: dict[int, dict] = field(default_factory=dict)
+    contact_fields: dict[int, dict] = field(default_factory=dict)
+    pipelines: dict[int, set[int]] = field(default_factory=dict)
+
+
+def compile_field_mapping(metadata: AccountMetadata | None = None) -> LeadFieldMap:
+    """Resolve configured field IDs once instead of per lead.
+
+    Without ``metadata`` every configured (non-zero) ID is used as a text
+    field. With it, IDs the account doesn't have are dropped and reported
+    in ``problems``, value types come from the account, and an unknown
+    pipeline/status or contact field is reported as well.
+    """
+    problems: list[str] = []
+
+    def compile_one(data_key: str, settings_attr: str) -> CompiledField | None:
+        field_id = getattr(settings, settings_attr, 0)
+        if not field_id:
+            return None
+        if metadata is None:
+            return CompiledField(data_key, field_id)
+        info = metadata.lead_fields.get(field_id)
+        if info is None:
+            problems.append(f"{settings_attr}={field_id}: no such lead field")
+            return None
+        enums = {
+            str(enum["value"]).strip().casefold(): enum["id"]
+            for enum in info.get("enums") or []
+        }
+        return CompiledField(data_key, field_id, info.get("type") or "text", enums)
+
+    service_type = compile_one("service_type", "AMOCRM_FIELD_SERVICE_TYPE")
+    source = compile_one("source", "AMOCRM_FIELD_SOURCE")
+    data = tuple(
+        compiled
+        for data_key, settings_attr in FIELD_MAPPING.items()
+        if (compiled := compile_one(data_key, settings_attr)) is not None
+    )
+
+    if metadata is not None:
+        for settings_attr in CONTACT_FIELDS:
+            field_id = getattr(settings, settings_attr, 0)
+            if field_id and field_id not in metadata.contact_fields:
+                problems.append(f"{settings_attr}={field_id}: no such contact field")
+
+        pipeline_id = settings.AMOCRM_PIPELINE_ID
+        if pipeline_id:
+            statuses = metadata.pipelines.get(pipeline_id)
+            if statuses is None:
+                problems.append(f"AMOCRM_PIPELINE_ID={pipeline_id}: no such pipeline")
+            elif settings.AMOCRM_STATUS_ID and settings.AMOCRM_STATUS_ID not in statuses:
+                problems.append(
+                    f"AMOCRM_STATUS_ID={settings.AMOCRM_STATUS_ID}: "
+                    f"not a status of pipeline {pipeline_id}"
+                )
+
+    return LeadFieldMap(service_type, source, data, tuple(problems))
+
+
+class MetadataCache:
+    """Account metadata loaded at startup and refreshed periodically.
+
+    Holds the compiled ``field_map`` used by ``LeadsService``. Until the
+    first successful load (or if AmoCRM is unreachable) the mapping is
+    compiled from settings alone, as before.
+    """
+
+    def __init__(self, client: Any, refresh_interval: float | None = None) -> None:
+        self._client = client
+        self._refresh_interval = (
+            refresh_interval
+            if refresh_interval is not None
+            else settings.AMOCRM_METADATA_REFRESH_SECONDS
+        )
+        self.metadata: AccountMetadata | None = None
+        self.field_map = compile_field_mapping()
+
+    async def load(self) -> list[str]:
+        """Fetch metadata and recompile the mapping. Returns found problems."""
+        try:
+            metadata = AccountMetadata(
+                lead_fields=await self._fetch_fields("/api/v4/leads/custom_fields"),
+                contact_fields=await self._fetch_fields("/api/v4/contacts/custom_fields"),
+                pipelines=await self._fetch_pipelines(),
+            )
+        except Exception:
+            REFRESHES.labels("error").inc()
+            raise
+
+        field_map = compile_field_mapping(metadata)
+        self.metadata, self.field_map = metadata, field_map
+        REFRESHES.labels("ok").inc()
+        PROBLEMS.set(len(field_map.problems))
+        for problem in field_map.problems:
+            logger.error("AmoCRM config: %s", problem)
+        logger.info(
+            "AmoCRM metadata loaded: %d lead fields, %d contact fields, %d pipelines",
+            len(metadata.lead_fields), len(metadata.contact_fields), len(metadata.pipelines),
+        )
+        return list(field_map.problems)
+
+    async def run(self) -> None:
+        """Background task: reload metadata every refresh interval."""
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("AmoCRM metadata refresh failed, keeping previous")
+
+    async def _fetch_fields(self, path: str) -> dict[int, dict]:
+        fields: dict[int, dict] = {}
+        page = 1
+        while True:
+            result = await self._client.get(path, params={"limit": PAGE_LIMIT, "page": page})
+            for item in (result or {}).get("_embedded", {}).get("custom_fields", []):
+                fields[item["id"]] = item
+            if not (result or {}).get("_links", {}).get("next"):
+                return fields
+            page += 1
+
+    async def _fetch_pipelines(self) -> dict[int, set[int]]:
+        result = await self._client.get("/api/v4/leads/pipelines")
+        return {
+            pipeline["id"]: {
+                status["id"]
+                for status in pipeline.get("_embedded", {}).get("statuses", [])
+            }
+            for pipeline in (result or {}).get("_embedded", {}).get("pipelines", [])
+        }
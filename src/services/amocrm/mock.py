@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Any
 
+from src.config import settings
+from src.services.amocrm.metadata import CONTACT_FIELDS, FIELD_MAPPING
+
 logger = logging.getLogger(__name__)
 
 _NEXT_ID = 1000
@@ -18,54 +22,150 @@ class MockAmoCRMClient:
     """Mock AmoCRM client for development without real API access.
 
     Logs all calls and returns fake but structurally valid responses.
+    Contacts created through the mock are found again by phone. ``latency``
+    adds a delay per call so concurrent callers overlap like against the
+    real API.
+
+    Account metadata (custom fields, pipelines) is served for the IDs
+    configured in settings, or from ``lead_fields`` / ``contact_fields`` /
+    ``pipelines`` in AmoCRM's response format when given.
     """
 
+    def __init__(
+        self,
+        latency: float = 0.0,
+        lead_fields: list[dict] | None = None,
+        contact_fields: list[dict] | None = None,
+        pipelines: list[dict] | None = None,
+    ) -> None:
+        self._latency = latency
+        self._contacts_by_phone: dict[str, dict] = {}
+        self._lead_fields = (
+            lead_fields if lead_fields is not None
+            else _configured_fields(
+                ["AMOCRM_FIELD_SERVICE_TYPE", "AMOCRM_FIELD_SOURCE", *FIELD_MAPPING.values()]
+            )
+        )
+        self._contact_fields = (
+            contact_fields if contact_fields is not None
+            else _configured_fields(CONTACT_FIELDS)
+        )
+        self._pipelines = pipelines if pipelines is not None else _configured_pipelines()
+
     async def get(self, path: str, params: dict | None = None) -> dict:
         logger.info("[MOCK] GET %s params=%s", path, params)
+        await self._delay()
+
+        if path.endswith("/custom_fields"):
+            fields = self._lead_fields if "/leads/" in path else self._contact_fields
+            return {"_embedded": {"custom_fields": fields}}
+
+        if path.endswith("/leads/pipelines"):
+            return {"_embedded": {"pipelines": self._pipelines}}
 
         if "/contacts" in path and params and "query" in params:
-            # Simulate contact not found
-            return {"_embedded": {"contacts": []}}
+            contact = self._contacts_by_phone.get(params["query"])
+            return {"_embedded": {"contacts": [contact] if contact else []}}
 
         return {}
 
-    async def post(self, path: str, json: Any = None) -> dict:
+    async def post(self, path: str, json: Any = None) -> dict | list:
         logger.info("[MOCK] POST %s body=%s", path, json)
+        await self._delay()
+
+        items = json if isinstance(json, list) and json else [{}]
 
         if "/contacts" in path:
-            contact_id = _next_id()
-            logger.info("[MOCK] Created contact %d", contact_id)
-            return {
-                "_embedded": {
-                    "contacts": [{"id": contact_id, "request_id": "0"}]
-                }
-            }
+            contacts = []
+            for i, item in enumerate(items):
+                contact_id = _next_id()
+                logger.info("[MOCK] Created contact %d", contact_id)
+                phone = _phone_of(item)
+                if phone:
+                    self._contacts_by_phone[phone] = {"id": contact_id}
+                contacts.append(
+                    {"id": contact_id, "request_id": item.get("request_id", str(i))}
+                )
+            return {"_embedded": {"contacts": contacts}}
+
+        if path.endswith("/leads/complex"):
+            result = []
+            for item in items:
+                lead_id, contact_id = _next_id(), _next_id()
+                logger.info("[MOCK] Created lead %d with contact %d", lead_id, contact_id)
+                for contact in item.get("_embedded", {}).get("contacts", []):
+                    phone = _phone_of(contact)
+                    if phone:
+                        self._contacts_by_phone[phone] = {"id": contact_id}
+                result.append({
+                    "id": lead_id,
+                    "contact_id": contact_id,
+                    "company_id": None,
+                    "request_id": ["0"],
+                    "merged": False,
+                })
+            return result
 
         if "/notes" in path:
-            note_id = _next_id()
-            # Extract lead_id from path like /api/v4/leads/123/notes
+            # Per-lead path /api/v4/leads/123/notes, or batch path
+            # /api/v4/leads/notes with entity_id in each note
             parts = path.split("/")
-            lead_id = int(parts[-2]) if len(parts) >= 3 else 0
-            logger.info("[MOCK] Created note %d for lead %d", note_id, lead_id)
-            return {
-                "_embedded": {
-                    "notes": [
-                        {"id": note_id, "entity_id": lead_id, "request_id": "0"}
-                    ]
-                }
-            }
+            path_lead_id = int(parts[-2]) if parts[-2].isdigit() else 0
+            notes = []
+            for i, item in enumerate(items):
+                note_id = _next_id()
+                lead_id = item.get("entity_id", path_lead_id)
+                logger.info("[MOCK] Created note %d for lead %d", note_id, lead_id)
+                notes.append({
+                    "id": note_id,
+                    "entity_id": lead_id,
+                    "request_id": item.get("request_id", str(i)),
+                })
+            return {"_embedded": {"notes": notes}}
 
         if "/leads" in path:
-            lead_id = _next_id()
-            logger.info("[MOCK] Created lead %d", lead_id)
-            return {
-                "_embedded": {
-                    "leads": [{"id": lead_id, "request_id": "0"}]
-                }
-            }
+            leads = []
+            for i, item in enumerate(items):
+                lead_id = _next_id()
+                logger.info("[MOCK] Created lead %d", lead_id)
+                leads.append(
+                    {"id": lead_id, "request_id": item.get("request_id", str(i))}
+                )
+            return {"_embedded": {"leads": leads}}
 
         return {}
 
     async def patch(self, path: str, json: Any = None) -> dict:
         logger.info("[MOCK] PATCH %s body=%s", path, json)
+        await self._delay()
         return {}
+
+    async def _delay(self) -> None:
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+
+def _configured_fields(settings_attrs) -> list[dict]:
+    return [
+        {"id": field_id, "name": attr, "type": "text", "enums": None}
+        for attr in settings_attrs
+        if (field_id := getattr(settings, attr, 0))
+    ]
+
+
+def _configured_pipelines() -> list[dict]:
+    if not settings.AMOCRM_PIPELINE_ID:
+        return []
+    statuses = [{"id": settings.AMOCRM_STATUS_ID}] if settings.AMOCRM_STATUS_ID else []
+    return [{
+        "id": settings.AMOCRM_PIPELINE_ID,
+        "name": "Mock pipeline",
+        "_embedded": {"statuses": statuses},
+    }]
+
+
+def _phone_of(contact: dict) -> str | None:
+    for field in contact.get("custom_fields_values") or []:
+        if field.get("field_code") == "PHONE" and field.get("values"):
+            return field["values"][0].get("value")
+    return None
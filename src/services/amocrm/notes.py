@@ -2,29 +2,38 @@ from __future__ import annotations
 
 import logging
 
+from src.services.amocrm.batcher import BatchWriter
 from src.services.amocrm.client import AmoCRMClient
 
 logger = logging.getLogger(__name__)
 
 
 class NotesService:
-    """AmoCRM notes operations."""
+    """AmoCRM notes operations.
 
-    def __init__(self, client: AmoCRMClient) -> None:
+    With a ``batcher`` (bound to /api/v4/leads/notes), notes for different
+    leads are coalesced into array requests.
+    """
+
+    def __init__(
+        self, client: AmoCRMClient, batcher: BatchWriter | None = None
+    ) -> None:
         self._client = client
+        self._batcher = batcher
 
     async def add_to_lead(self, lead_id: int, text: str) -> int:
         """Add a text note to a lead. Returns the note ID."""
-        body = [
-            {
-                "note_type": "common",
-                "params": {"text": text},
-            }
-        ]
-
-        result = await self._client.post(
-            f"/api/v4/leads/{lead_id}/notes", json=body
-        )
-        note_id = result["_embedded"]["notes"][0]["id"]
+        note = {
+            "note_type": "common",
+            "params": {"text": text},
+        }
+
+        if self._batcher is not None:
+            note_id = (await self._batcher.submit({"entity_id": lead_id, **note}))["id"]
+        else:
+            result = await self._client.post(
+                f"/api/v4/leads/{lead_id}/notes", json=[note]
+            )
+            note_id = result["_embedded"]["notes"][0]["id"]
         logger.info("Added note %d to AmoCRM lead %d", note_id, lead_id)
         return note_id
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Callable, Iterator
+
+from src.config import settings
+from src.utils.metrics import gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Scheduling class of an AmoCRM call. Lower value is served first."""
+
+    INTERACTIVE = 0  # live user waiting on confirm:send
+    BACKGROUND = 1  # retry sweep and other housekeeping
+
+
+_current_priority: ContextVar[Priority] = ContextVar(
+    "amocrm_priority", default=Priority.INTERACTIVE
+)
+
+QUEUE_DEPTH = gauge(
+    "amocrm_rate_limiter_queue_depth",
+    "AmoCRM calls waiting for a rate limiter token",
+    ["priority"],
+)
+WAIT_SECONDS = histogram(
+    "amocrm_rate_limiter_wait_seconds",
+    "Time AmoCRM calls spent waiting for a rate limiter token",
+    ["priority"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+@contextmanager
+def crm_priority(priority: Priority) -> Iterator[None]:
+    """Run AmoCRM calls made inside the block with the given priority."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class PriorityRateLimiter:
+    """Token bucket shared by all AmoCRM traffic of the process.
+
+    Callers that find the bucket empty are queued and served strictly by
+    priority, then FIFO, so interactive calls overtake any retry backlog.
+    A ``rate`` of 0 disables limiting.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._rate = rate
+        self._capacity = float(max(burst, 1))
+        self._tokens = self._capacity
+        self._clock = clock
+        self._updated = clock()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self._depth = {p: QUEUE_DEPTH.labels(p.name.lower()) for p in Priority}
+        self._wait = {p: WAIT_SECONDS.labels(p.name.lower()) for p in Priority}
+
+    @classmethod
+    def from_settings(cls) -> PriorityRateLimiter:
+        return cls(
+            rate=settings.AMOCRM_RATE_LIMIT_PER_SECOND,
+            burst=settings.AMOCRM_RATE_LIMIT_BURST,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+
+    async def acquire(self, priority: Priority | None = None) -> float:
+        """Wait for a token. Returns the time spent waiting in seconds."""
+        if self._rate <= 0:
+            return 0.0
+        if priority is None:
+            priority = current_priority()
+
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._wait[priority].observe(0.0)
+            return 0.0
+
+        start = self._clock()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._depth[priority].inc()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Token was granted but the caller gave up: return it
+                self._tokens = min(self._capacity, self._tokens + 1)
+            raise
+        finally:
+            self._depth[priority].dec()
+
+        waited = self._clock() - start
+        self._wait[priority].observe(waited)
+        if waited > 1:
+            logger.info(
+                "AmoCRM rate limiter: %s call waited %.2fs (queue=%d)",
+                priority.name.lower(), waited, len(self._waiters),
+            )
+        return waited
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # caller was cancelled while queued
+            self._tokens -= 1
+            future.set_result(None)
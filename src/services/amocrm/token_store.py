@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "amocrm:token"
+# Must outlast one refresh: OAuth request (10s timeout) plus the DB write
+LOCK_TTL_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.1
+
+# Write the pair only while holding the lock with this fence, and only if
+# no newer fence has written already (a holder whose lock expired mid-
+# refresh must not overwrite the pair of the replica that took over).
+_SAVE_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then return 0 end
+local current = tonumber(redis.call('hget', KEYS[2], 'fence') or '0')
+if current >= tonumber(ARGV[1]) then return 0 end
+redis.call('hset', KEYS[2],
+    'access_token', ARGV[2], 'refresh_token', ARGV[3],
+    'expires_at', ARGV[4], 'fence', ARGV[1])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class TokenPair:
+    access_token: str
+    refresh_token: str
+    expires_at: datetime
+    fence: int = 0
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class RedisTokenStore:
+    """Current AmoCRM token pair shared by all replicas through Redis.
+
+    Refreshes are serialized by a lock whose value is a fencing token from
+    a monotonic counter; ``save`` only accepts the pair from the current
+    lock holder. Postgres stays the durable record (``AmoCRMAuth`` still
+    writes every pair there); Redis is what replicas read.
+    """
+
+    def __init__(self, redis: Any, prefix: str = KEY_PREFIX) -> None:
+        self._redis = redis
+        self._pair_key = prefix
+        self._lock_key = f"{prefix}:lock"
+        self._fence_key = f"{prefix}:fence"
+        self._save = redis.register_script(_SAVE_SCRIPT)
+        self._release = redis.register_script(_RELEASE_SCRIPT)
+
+    async def get(self) -> TokenPair | None:
+        raw = await self._redis.hgetall(self._pair_key)
+        if not raw:
+            return None
+        data = {_text(k): _text(v) for k, v in raw.items()}
+        return TokenPair(
+            access_token=data["access_token"],
+            refresh_token=data["refresh_token"],
+            expires_at=datetime.fromtimestamp(float(data["expires_at"]), timezone.utc),
+            fence=int(data.get("fence", 0)),
+        )
+
+    async def acquire(self, ttl: float = LOCK_TTL_SECONDS) -> int | None:
+        """Take the refresh lock. Returns its fencing token, or None if held."""
+        fence = await self._redis.incr(self._fence_key)
+        acquired = await self._redis.set(
+            self._lock_key, fence, nx=True, px=int(ttl * 1000),
+        )
+        return fence if acquired else None
+
+    async def release(self, fence: int) -> None:
+        await self._release(keys=[self._lock_key], args=[fence])
+
+    async def save(self, pair: TokenPair, fence: int) -> bool:
+        """Store ``pair`` if ``fence`` still holds the lock. Returns success."""
+        saved = await self._save(
+            keys=[self._lock_key, self._pair_key],
+            args=[
+                fence,
+                pair.access_token,
+                pair.refresh_token,
+                pair.expires_at.timestamp(),
+            ],
+        )
+        return bool(saved)
+
+    async def wait_for_newer(
+        self, seen_fence: int, timeout: float = LOCK_TTL_SECONDS
+    ) -> TokenPair | None:
+        """Wait for a pair newer than ``seen_fence`` (another replica's refresh)."""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + timeout
+        while loop.time() < until:
+            pair = await self.get()
+            if pair is not None and pair.fence > seen_fence:
+                return pair
+            if not await self._redis.exists(self._lock_key):
+                # The holder gave up without writing
+                return await self.get()
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        return None
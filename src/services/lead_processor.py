@@ -1,21 +1,50 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
 
 from aiogram import Bot
 
 from src.config import settings
 from src.db.repositories.lead import LeadRepository
+from src.db.repositories.outbox import OutboxRepository
 from src.db.repositories.user import UserRepository
-from src.services.amocrm.contacts import ContactsService
+from src.services.amocrm.circuit_breaker import all_breakers
+from src.services.amocrm.client import AmoCRMCircuitOpen, AmoCRMDeadlineExceeded, AmoCRMError
+from src.services.amocrm.contact_index import CachedContact, ContactIndex, normalize_phone
+from src.services.amocrm.contacts import REPEAT_TAG, ContactsService, build_contact_payload
+from src.services.amocrm.deadline import crm_deadline, remaining_budget
 from src.services.amocrm.leads import LeadsService
 from src.services.amocrm.notes import NotesService
-from src.utils.admin import notify_admin
+from src.services.amocrm.rate_limiter import Priority, crm_priority
+from src.services.retry_wakeup import LEAD_FAILED
+from src.utils.admin import AlertDigest, notify_admin
 from src.utils.formatters import format_lead_note, format_lead_title
+from src.utils.metrics import counter
+from src.utils.retry import backoff_delay
+from src.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+DEAD_LETTERS = counter(
+    "leads_dead_lettered_total",
+    "Leads given up on after exhausting their retries",
+)
+
+# Don't let the retry scheduler spin while leads stay due (e.g. circuit open)
+MIN_RETRY_SLEEP_SECONDS = 1.0
+
+# Shared by every processor in the process, so a retry sweep and a live
+# submission for the same phone resolve the contact once.
+_contact_flights = SingleFlight("amocrm_contact")
+
+# Leads whose delivery is running in this process, and those whose
+# delivery was cancelled midway (see release_unfinished)
+_in_flight: set[int] = set()
+_interrupted: set[int] = set()
+
 
 class LeadProcessor:
     """Orchestrates the full lead pipeline:
@@ -28,11 +57,17 @@ class LeadProcessor:
         leads_service: LeadsService,
         notes: NotesService,
         bot: Bot,
+        contact_index: ContactIndex | None = None,
+        contact_flights: SingleFlight | None = None,
+        alerts: AlertDigest | None = None,
     ) -> None:
         self._contacts = contacts
         self._leads = leads_service
         self._notes = notes
         self._bot = bot
+        self._contact_index = contact_index
+        self._contact_flights = contact_flights or _contact_flights
+        self._alerts = alerts
 
     async def process(
         self,
@@ -51,62 +86,164 @@ class LeadProcessor:
 
         Returns:
             True if lead was sent to CRM successfully, False otherwise.
+
+        All CRM calls share the AMOCRM_CONFIRM_DEADLINE_SECONDS budget; when
+        it runs out the lead is saved with status=error for the retry sweep.
+        The same happens immediately while the AmoCRM circuit is open, but
+        without counting a retry.
         """
+        db_user, db_lead = await self._save_lead(
+            session, telegram_user, service_type, data,
+        )
+        await session.commit()
+        return await self._deliver(
+            session, db_user, db_lead, telegram_user, service_type, data,
+        )
+
+    async def enqueue(
+        self,
+        session: Any,
+        telegram_user: dict,
+        service_type: str,
+        data: dict,
+        chat_id: int | None = None,
+        message_id: int | None = None,
+    ) -> int:
+        """Save the lead and its outbox entry in one transaction.
+
+        Delivery to AmoCRM happens later in ``deliver`` (called by the
+        outbox workers); ``chat_id``/``message_id`` identify the message to
+        update once it is done. Returns the DB lead ID.
+        """
+        _, db_lead = await self._save_lead(session, telegram_user, service_type, data)
+        await OutboxRepository(session).add(db_lead.id, chat_id, message_id)
+        await session.commit()
+        return db_lead.id
+
+    async def deliver(
+        self,
+        session: Any,
+        lead_id: int,
+        *,
+        deadline: float | None = None,
+        alert: bool = True,
+    ) -> bool | None:
+        """Send a saved lead to AmoCRM.
+
+        Safe to call again for the same lead: an already sent lead is not
+        sent twice. Returns None if the lead no longer exists. ``deadline``
+        overrides the confirm:send CRM budget (0 = none); ``alert=False``
+        leaves failures to the caller instead of notifying the admin.
+        """
+        db_lead = await LeadRepository(session).get_with_user(lead_id)
+        if db_lead is None:
+            return None
+        if db_lead.status == "sent":
+            return True
+
+        user = db_lead.user
+        telegram_user = {
+            "id": user.telegram_id if user else 0,
+            "username": user.username if user else None,
+            "first_name": user.first_name if user else None,
+        }
+        return await self._deliver(
+            session, user, db_lead, telegram_user, db_lead.service_type, db_lead.data,
+            deadline=deadline, alert=alert,
+        )
+
+    async def _save_lead(
+        self,
+        session: Any,
+        telegram_user: dict,
+        service_type: str,
+        data: dict,
+    ) -> tuple[Any, Any]:
+        """Save/update the user and create the lead with status=pending."""
         user_repo = UserRepository(session)
         lead_repo = LeadRepository(session)
 
-        telegram_id = telegram_user["id"]
-        username = telegram_user.get("username")
-        first_name = telegram_user.get("first_name")
-        phone = data.get("phone")
-        name = data.get("name", first_name or "")
-
-        # 1. Save/update user in DB
         db_user = await user_repo.create_or_update(
-            telegram_id=telegram_id,
-            username=username,
-            first_name=first_name,
-            phone=phone,
+            telegram_id=telegram_user["id"],
+            username=telegram_user.get("username"),
+            first_name=telegram_user.get("first_name"),
+            phone=data.get("phone"),
         )
-
-        # 2. Create lead in DB with status=pending
         db_lead = await lead_repo.create(
             user_id=db_user.id,
             service_type=service_type,
             data=data,
             status="pending",
         )
-        await session.commit()
+        return db_user, db_lead
 
-        try:
-            # 3. Find or create contact in AmoCRM
-            contact_id = await self._find_or_create_contact(
-                phone=phone,
-                name=name,
-                telegram_id=telegram_id,
-                telegram_username=username,
-            )
+    async def _deliver(
+        self,
+        session: Any,
+        db_user: Any,
+        db_lead: Any,
+        telegram_user: dict,
+        service_type: str,
+        data: dict,
+        deadline: float | None = None,
+        alert: bool = True,
+    ) -> bool:
+        """Run the CRM part of the pipeline for a saved lead.
 
-            # Update user with amo_contact_id
-            db_user.amo_contact_id = contact_id
-            await session.commit()
+        Each stage (contact resolved, CRM lead created, note attached) is
+        committed on the lead row as soon as it is done, and stages already
+        recorded there are skipped, so a retry after a partial failure only
+        runs what is missing.
+        """
+        lead_repo = LeadRepository(session)
+        lead_id = db_lead.id
+        retry_count = db_lead.retry_count or 0
+        # Claimed by the retry sweep, which has counted this attempt
+        claimed = db_lead.status == "retrying"
 
-            # 4. Create lead in AmoCRM
-            title = format_lead_title(service_type, data)
-            amo_lead_id = await self._leads.create(
-                title=title,
-                contact_id=contact_id,
-                service_type=service_type,
-                data=data,
-            )
+        telegram_id = telegram_user["id"]
+        username = telegram_user.get("username")
+        phone = data.get("phone")
+        name = data.get("name", telegram_user.get("first_name") or "")
 
-            # 5. Add note to lead
-            note_text = format_lead_note(service_type, data, telegram_user)
-            await self._notes.add_to_lead(amo_lead_id, note_text)
+        async def contact_resolved(contact_id: int) -> None:
+            db_lead.amo_contact_id = contact_id
+            if db_user is not None:
+                db_user.amo_contact_id = contact_id
+            await session.commit()
 
-            # 6. Update DB lead status to sent
+        _in_flight.add(lead_id)
+        try:
+            if deadline is None:
+                deadline = settings.AMOCRM_CONFIRM_DEADLINE_SECONDS
+            with crm_deadline(deadline):
+                if db_lead.amo_lead_id is None:
+                    # Find or create contact and create lead in AmoCRM
+                    contact_id, amo_lead_id = await self._create_crm_lead(
+                        phone=phone,
+                        name=name,
+                        telegram_id=telegram_id,
+                        telegram_username=username,
+                        service_type=service_type,
+                        data=data,
+                        session=session,
+                        contact_id=db_lead.amo_contact_id,
+                        on_contact=contact_resolved,
+                    )
+                    db_lead.amo_lead_id = amo_lead_id
+                    await contact_resolved(contact_id)
+
+                if db_lead.amo_note_id is None:
+                    note_text = format_lead_note(service_type, data, telegram_user)
+                    db_lead.amo_note_id = await self._notes.add_to_lead(
+                        db_lead.amo_lead_id, note_text,
+                    )
+                    await session.commit()
+
+            amo_lead_id = db_lead.amo_lead_id
+            # Update DB lead status to sent
             await lead_repo.update_status(
-                lead_id=db_lead.id,
+                lead_id=lead_id,
                 status="sent",
                 amo_lead_id=amo_lead_id,
             )
@@ -114,48 +251,217 @@ class LeadProcessor:
 
             logger.info(
                 "Lead %d sent to AmoCRM (amo_lead_id=%d) for user %d",
-                db_lead.id, amo_lead_id, telegram_id,
+                lead_id, amo_lead_id, telegram_id,
             )
             return True
 
+        except asyncio.CancelledError:
+            _interrupted.add(lead_id)
+            raise
+        except AmoCRMCircuitOpen as exc:
+            # Never sent to AmoCRM: not an attempt, the lead can't go dead
+            # for it. Leads are made due again once the circuit recovers.
+            logger.warning("AmoCRM circuit open, lead %d saved for later delivery", lead_id)
+            await session.rollback()
+            if claimed:
+                await lead_repo.unclaim([lead_id])
+            await lead_repo.update_status(
+                lead_id=lead_id,
+                status="error",
+                error_message=str(exc),
+                next_retry_at=_backoff_at(retry_count - 1 if claimed else retry_count),
+            )
+            await session.commit()
+            return False
         except Exception as exc:
-            logger.exception("Failed to send lead %d to AmoCRM", db_lead.id)
+            logger.exception("Failed to send lead %d to AmoCRM", lead_id)
 
             await session.rollback()
+            retry_at = next_retry_at(retry_count)
             await lead_repo.update_status(
-                lead_id=db_lead.id,
-                status="error",
+                lead_id=lead_id,
+                status="error" if retry_at is not None else "dead",
                 error_message=str(exc),
+                next_retry_at=retry_at,
             )
+            if retry_at is not None:
+                await lead_repo.notify_retry(LEAD_FAILED)
             await session.commit()
 
-            await notify_admin(
-                self._bot,
-                f"Ошибка отправки лида #{db_lead.id} в AmoCRM:\n{exc}",
+            if retry_at is None:
+                DEAD_LETTERS.inc()
+                logger.error("Lead %d gave up after %d retries", lead_id, retry_count)
+                await self._alert(
+                    f"Требуют ручной обработки ({error_class(exc)})",
+                    f"Лид #{lead_id} не отправлен в AmoCRM после {retry_count} "
+                    f"повторных попыток и требует ручной обработки:\n{exc}",
+                )
+                return False
+            if not alert:
+                return False
+            await self._alert(
+                f"Не отправлены в AmoCRM ({error_class(exc)})",
+                f"Ошибка отправки лида #{lead_id} в AmoCRM:\n{exc}",
             )
             return False
+        finally:
+            _in_flight.discard(lead_id)
+
+    async def _alert(self, key: str, text: str) -> None:
+        """Admin alert: coalesced by ``key`` into the digest if there is one."""
+        if self._alerts is not None:
+            await self._alerts.record(key, text)
+        else:
+            await notify_admin(self._bot, text)
 
-    async def _find_or_create_contact(
+    async def _create_crm_lead(
         self,
         phone: str | None,
         name: str,
         telegram_id: int,
         telegram_username: str | None,
-    ) -> int:
-        """Find existing contact by phone or create a new one."""
-        if phone:
-            existing = await self._contacts.find_by_phone(phone)
-            if existing:
-                contact_id = existing["id"]
+        service_type: str,
+        data: dict,
+        session: Any = None,
+        contact_id: int | None = None,
+        on_contact: Callable[[int], Awaitable[None]] | None = None,
+    ) -> tuple[int, int]:
+        """Resolve the contact and create the CRM lead.
+
+        ``contact_id`` is a contact resolved by an earlier attempt; it is
+        used without a lookup. ``on_contact`` is awaited with the resolved
+        contact before the separate lead create request, so the caller can
+        checkpoint it.
+
+        In ``complex`` pipeline mode a customer without an existing contact
+        gets contact and lead in one /leads/complex request instead of two.
+        A contact ID from the local index that AmoCRM reports as missing
+        (404) is dropped and the contact is resolved again.
+
+        Concurrent calls for the same phone share one contact lookup/create;
+        only the caller that actually ran it can have its lead created in
+        the same /leads/complex request, the others attach to its contact.
+        Returns (contact_id, amo_lead_id).
+        """
+        title = format_lead_title(service_type, data)
+        complex_lead_id: int | None = None
+
+        async def resolve_contact() -> CachedContact:
+            nonlocal complex_lead_id
+            contact = await self._find_contact(phone, session)
+            if contact is not None:
+                return contact
+
+            if settings.AMOCRM_PIPELINE_MODE == "complex":
+                payload = build_contact_payload(
+                    name=name,
+                    phone=phone or "",
+                    telegram_id=telegram_id,
+                    telegram_username=telegram_username,
+                )
+                complex_lead_id, contact_id = await self._leads.create_complex(
+                    title=title,
+                    contact=payload,
+                    service_type=service_type,
+                    data=data,
+                )
+                await self._remember_contact(phone, contact_id)
+            else:
+                contact_id = await self._create_contact(
+                    phone, name, telegram_id, telegram_username,
+                )
+            return CachedContact(contact_id, source="created")
+
+        if contact_id is not None:
+            contact = CachedContact(contact_id, repeat_tagged=True, source="checkpoint")
+        elif phone:
+            contact = await self._contact_flights.do(
+                normalize_phone(phone), resolve_contact, wait=remaining_budget(),
+            )
+        else:
+            contact = await resolve_contact()
+        if complex_lead_id is not None:
+            return contact.contact_id, complex_lead_id
+        if on_contact is not None and contact.source != "checkpoint":
+            await on_contact(contact.contact_id)
+
+        try:
+            amo_lead_id = await self._leads.create(
+                title=title,
+                contact_id=contact.contact_id,
+                service_type=service_type,
+                data=data,
+            )
+        except AmoCRMError as exc:
+            if exc.status != 404 or contact.source not in ("db", "redis", "checkpoint"):
+                raise
+            if self._contact_index is not None:
+                await self._contact_index.invalidate(session, phone, contact.contact_id)
+            return await self._create_crm_lead(
+                phone, name, telegram_id, telegram_username, service_type, data,
+                session=session, on_contact=on_contact,
+            )
+        return contact.contact_id, amo_lead_id
+
+    async def _find_contact(
+        self, phone: str | None, session: Any = None
+    ) -> CachedContact | None:
+        """Find an existing contact by phone and make sure it is tagged as repeat.
+
+        The local index (users table, then Redis) is consulted before the
+        AmoCRM contacts query.
+        """
+        if not phone:
+            return None
+
+        if self._contact_index is not None:
+            cached = await self._contact_index.lookup(session, phone)
+            if session is not None:
+                # End the read so the connection isn't held during CRM calls
+                await session.commit()
+            if cached is not None:
+                if cached.repeat_tagged:
+                    return cached
+                try:
+                    await self._contacts.update(cached.contact_id)
+                except AmoCRMError as exc:
+                    if exc.status != 404:
+                        raise
+                    await self._contact_index.invalidate(session, phone, cached.contact_id)
+                else:
+                    await self._remember_contact(phone, cached.contact_id, repeat_tagged=True)
+                    return cached
+
+        existing = await self._contacts.find_by_phone(phone)
+        if existing:
+            contact_id = existing["id"]
+            tags = existing.get("_embedded", {}).get("tags", [])
+            if not any(tag.get("name") == REPEAT_TAG for tag in tags):
                 await self._contacts.update(contact_id)
-                return contact_id
+            await self._remember_contact(phone, contact_id, repeat_tagged=True)
+            return CachedContact(contact_id, repeat_tagged=True, source="crm")
+        return None
+
+    async def _remember_contact(
+        self, phone: str | None, contact_id: int, repeat_tagged: bool = False
+    ) -> None:
+        if self._contact_index is not None and phone:
+            await self._contact_index.remember(phone, contact_id, repeat_tagged)
 
+    async def _create_contact(
+        self,
+        phone: str | None,
+        name: str,
+        telegram_id: int,
+        telegram_username: str | None,
+    ) -> int:
         contact_id = await self._contacts.create(
             name=name,
             phone=phone or "",
             telegram_id=telegram_id,
             telegram_username=telegram_username,
         )
+        await self._remember_contact(phone, contact_id)
         return contact_id
 
 
@@ -165,66 +471,157 @@ async def retry_failed_leads(
     leads_service: LeadsService,
     notes: NotesService,
     bot: Bot,
+    contact_index: ContactIndex | None = None,
+    contact_flights: SingleFlight | None = None,
+    alerts: AlertDigest | None = None,
+    stop: asyncio.Event | None = None,
 ) -> int:
-    """Retry sending failed leads. Returns count of successfully retried leads."""
-    processor = LeadProcessor(contacts, leads_service, notes, bot)
+    """Retry sending failed leads. Returns count of successfully retried leads.
+
+    CRM calls run at background priority so live submissions go first.
+    Once ``stop`` is set no further batch is claimed.
+    """
+    processor = LeadProcessor(
+        contacts, leads_service, notes, bot, contact_index, contact_flights, alerts,
+    )
+    with crm_priority(Priority.BACKGROUND):
+        return await _retry_failed_leads(session_factory, processor, stop=stop)
+
+
+async def _retry_failed_leads(
+    session_factory,
+    processor: LeadProcessor,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+    stop: asyncio.Event | None = None,
+) -> int:
+    """Claim failed leads batch by batch and retry each batch concurrently.
+
+    Claims commit right away, so no row lock or connection is held while
+    the CRM calls run; each retry uses its own short-lived session. Leads
+    left ``pending`` by a process that died mid-delivery are rescued into
+    the retry schedule first. Claimed leads not attempted because the
+    circuit opened meanwhile are given back without losing a retry.
+    """
+    batch_size = batch_size or settings.RETRY_BATCH_SIZE
+    semaphore = asyncio.Semaphore(concurrency or settings.RETRY_CONCURRENCY)
+    sweep_started = datetime.now(timezone.utc)
     retried = 0
 
-    async with session_factory() as session:
-        lead_repo = LeadRepository(session)
-        failed_leads = await lead_repo.get_failed_leads()
+    async def retry(lead_id: int, skipped: list[int]) -> bool:
+        async with semaphore:
+            if _circuit_open():
+                skipped.append(lead_id)
+                return False
+            try:
+                async with session_factory() as session:
+                    sent = await processor.deliver(session, lead_id, deadline=0, alert=False)
+            except Exception:
+                logger.exception("Retry failed for lead %d", lead_id)
+                return False
+            if sent:
+                logger.info("Retried lead %d successfully", lead_id)
+            return bool(sent)
 
-        for lead in failed_leads:
-            await lead_repo.increment_retry(lead.id)
+    async with session_factory() as session:
+        rescued = await LeadRepository(session).rescue_stale_pending(
+            settings.LEAD_PENDING_STALE_SECONDS,
+        )
+        await session.commit()
+    if rescued:
+        logger.warning("Rescued %d leads left pending by an interrupted delivery", rescued)
+
+    while not _circuit_open():
+        if stop is not None and stop.is_set():
+            return retried
+        async with session_factory() as session:
+            lead_ids = await LeadRepository(session).claim_failed_leads(
+                batch_size,
+                settings.RETRY_LEASE_SECONDS,
+                due_before=sweep_started,
+            )
             await session.commit()
+        if not lead_ids:
+            return retried
+
+        skipped: list[int] = []
+        results = await asyncio.gather(*(retry(lead_id, skipped) for lead_id in lead_ids))
+        retried += sum(results)
+        if skipped:
+            async with session_factory() as session:
+                await LeadRepository(session).unclaim(skipped)
+                await session.commit()
+        if len(lead_ids) < batch_size:
+            return retried
 
-            telegram_user = {
-                "id": lead.user.telegram_id if lead.user else 0,
-                "username": lead.user.username if lead.user else None,
-                "first_name": lead.user.first_name if lead.user else None,
-            }
+    logger.info("AmoCRM circuit open, postponing retry sweep")
+    return retried
 
-            try:
-                phone = lead.data.get("phone")
-                name = lead.data.get("name", "")
 
-                contact_id = await processor._find_or_create_contact(
-                    phone=phone,
-                    name=name,
-                    telegram_id=telegram_user["id"],
-                    telegram_username=telegram_user.get("username"),
-                )
+async def release_unfinished(session_factory) -> int:
+    """Make leads whose delivery was cut short (shutdown) retryable right away.
 
-                title = format_lead_title(lead.service_type, lead.data)
-                amo_lead_id = await leads_service.create(
-                    title=title,
-                    contact_id=contact_id,
-                    service_type=lead.service_type,
-                    data=lead.data,
-                )
+    Call once the tasks delivering them are done or cancelled. Leads owned
+    by the outbox get their outbox lease released instead, so the outbox
+    picks them up again without waiting for it to expire. Returns the
+    number of leads handed to the retry sweep.
+    """
+    lead_ids = sorted(_in_flight | _interrupted)
+    if not lead_ids:
+        return 0
+    async with session_factory() as session:
+        await OutboxRepository(session).release(lead_ids)
+        count = await LeadRepository(session).release_unfinished(lead_ids)
+        await session.commit()
+    _interrupted.difference_update(lead_ids)
+    logger.warning(
+        "Shutdown interrupted delivery of %d leads, %d queued for retry",
+        len(lead_ids), count,
+    )
+    return count
 
-                note_text = format_lead_note(
-                    lead.service_type, lead.data, telegram_user
-                )
-                await notes.add_to_lead(amo_lead_id, note_text)
 
-                await lead_repo.update_status(
-                    lead_id=lead.id,
-                    status="sent",
-                    amo_lead_id=amo_lead_id,
-                )
-                await session.commit()
-                retried += 1
-                logger.info("Retried lead %d successfully", lead.id)
-
-            except Exception as exc:
-                logger.exception("Retry failed for lead %d", lead.id)
-                await session.rollback()
-                await lead_repo.update_status(
-                    lead_id=lead.id,
-                    status="error",
-                    error_message=str(exc),
-                )
-                await session.commit()
+def _circuit_open() -> bool:
+    return any(breaker.is_open for breaker in all_breakers())
 
-    return retried
+
+def error_class(exc: Exception) -> str:
+    """Short error class alerts are coalesced by, e.g. ``AmoCRM 503``."""
+    if isinstance(exc, AmoCRMDeadlineExceeded):
+        return "AmoCRM timeout"
+    if isinstance(exc, AmoCRMError):
+        return f"AmoCRM {exc.status}" if exc.status else "AmoCRM"
+    return type(exc).__name__
+
+
+def next_retry_at(retry_count: int) -> datetime | None:
+    """When to retry a lead that has failed after ``retry_count`` retries.
+
+    None once the retries are used up: the lead goes to the dead letters.
+    """
+    if retry_count >= settings.RETRY_MAX_ATTEMPTS:
+        return None
+    return _backoff_at(retry_count)
+
+
+def _backoff_at(retry_count: int) -> datetime:
+    delay = backoff_delay(
+        retry_count,
+        settings.RETRY_BACKOFF_INITIAL_SECONDS,
+        settings.RETRY_BACKOFF_BASE,
+        settings.RETRY_BACKOFF_MAX_SECONDS,
+    )
+    return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+
+async def seconds_until_next_retry(session_factory, ceiling: float) -> float:
+    """How long the retry scheduler can sleep: until the earliest due lead.
+
+    Capped at ``ceiling`` so leads failing in the meantime aren't missed.
+    """
+    async with session_factory() as session:
+        due = await LeadRepository(session).next_retry_due()
+    if due is None:
+        return ceiling
+    delay = (due - datetime.now(timezone.utc)).total_seconds()
+    return min(max(delay, MIN_RETRY_SLEEP_SECONDS), ceiling)
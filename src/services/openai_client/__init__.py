@@ -1,4 +1,6 @@
+from src.services.openai_client.cache import ClassificationCache
 from src.services.openai_client.client import OpenAIClient
 from src.services.openai_client.models import AIResponse
+from src.services.openai_client.rules import RuleClassifier
 
-__all__ = ["OpenAIClient", "AIResponse"]
+__all__ = ["OpenAIClient", "AIResponse", "ClassificationCache", "RuleClassifier"]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any
+
+from src.config import settings
+from src.services.openai_client.models import AIResponse
+from src.services.openai_client.prompts import SYSTEM_PROMPT
+from src.utils.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ai_classify:"
+# Prefix of AIResponse.model_used (and so AiLog.model_used) on a cache hit
+HIT_TAG = "cache:"
+
+LOOKUPS = counter(
+    "ai_classify_cache_lookups_total",
+    "Classification cache lookups by the tier that answered (memory, redis, miss)",
+    ["tier"],
+)
+HIT_RATIO = gauge(
+    "ai_classify_cache_hit_ratio",
+    "Share of classifications answered from the cache since start",
+)
+SAVED_SECONDS = counter(
+    "ai_classify_cache_saved_seconds_total",
+    "OpenAI latency avoided by cache hits (latency of the cached call)",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_message(text: str, bucket_digits: bool = False) -> str:
+    """Cache key form of a message: case-folded, whitespace collapsed.
+
+    With ``bucket_digits`` every number becomes ``#<length>``, so messages
+    that only differ in a number share an entry (and its entities).
+    """
+    text = _WHITESPACE.sub(" ", text.casefold()).strip()
+    if bucket_digits:
+        text = _DIGITS.sub(lambda match: f"#{len(match.group())}", text)
+    return text
+
+
+def _prompt_version() -> str:
+    """Changes with the prompt or models, so stale answers are not reused."""
+    source = "\n".join(
+        (SYSTEM_PROMPT, settings.OPENAI_MODEL, settings.OPENAI_FALLBACK_MODEL)
+    )
+    return hashlib.sha256(source.encode()).hexdigest()[:8]
+
+
+class ClassificationCache:
+    """Parsed ``classify`` results for messages seen before.
+
+    An in-process LRU in front of Redis entries with TTL (shared by the
+    replicas). Keyed on the normalized message; only real classifications
+    are stored, not errors or unparseable replies. A hit comes back with
+    ``model_used`` tagged ``cache:<model>`` (the model that answered
+    originally) and ``used_fallback`` False.
+    """
+
+    def __init__(
+        self,
+        redis: Any = None,
+        max_entries: int | None = None,
+        ttl: int | None = None,
+        bucket_digits: bool | None = None,
+    ) -> None:
+        self._redis = redis
+        self._max_entries = (
+            max_entries if max_entries is not None else settings.AI_CLASSIFY_CACHE_SIZE
+        )
+        self._ttl = ttl if ttl is not None else settings.AI_CLASSIFY_CACHE_TTL_SECONDS
+        self._bucket_digits = (
+            bucket_digits if bucket_digits is not None
+            else settings.AI_CLASSIFY_CACHE_BUCKET_DIGITS
+        )
+        self._prefix = f"{KEY_PREFIX}{_prompt_version()}:"
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lookups = {tier: LOOKUPS.labels(tier) for tier in ("memory", "redis", "miss")}
+        self._hits = 0
+        self._total = 0
+
+    async def get(self, message: str) -> AIResponse | None:
+        key = self._key(message)
+        raw = self._entries.get(key)
+        tier = "memory"
+        if raw is not None:
+            self._entries.move_to_end(key)
+        else:
+            raw = await self._redis_get(key)
+            tier = "redis"
+            if raw is not None:
+                self._remember(key, raw)
+
+        self._total += 1
+        if raw is None:
+            self._lookups["miss"].inc()
+            HIT_RATIO.set(self._hits / self._total)
+            return None
+        self._hits += 1
+        self._lookups[tier].inc()
+        HIT_RATIO.set(self._hits / self._total)
+
+        entry = json.loads(raw)
+        SAVED_SECONDS.inc(entry.pop("latency_ms", 0) / 1000)
+        response = AIResponse(**entry)
+        # No model was called for this one
+        response.model_used = HIT_TAG + response.model_used
+        response.used_fallback = False
+        return response
+
+    async def set(self, message: str, response: AIResponse, latency_ms: int) -> None:
+        if not response.intent or response.confidence <= 0:
+            return
+        key = self._key(message)
+        raw = json.dumps({**asdict(response), "latency_ms": latency_ms}, ensure_ascii=False)
+        self._remember(key, raw)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(self._prefix + key, raw, ex=self._ttl)
+        except Exception:
+            logger.warning("Failed to cache classification", exc_info=True)
+
+    def _key(self, message: str) -> str:
+        normalized = normalize_message(message, self._bucket_digits)
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def _remember(self, key: str, raw: str) -> None:
+        self._entries[key] = raw
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def _redis_get(self, key: str) -> str | None:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._prefix + key)
+        except Exception:
+            logger.warning("Classification cache read failed", exc_info=True)
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        return raw
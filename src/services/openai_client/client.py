@@ -1,48 +1,135 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import time
 from typing import Any
 
-from openai import AsyncOpenAI
+from openai import APITimeoutError, AsyncOpenAI
 
 from src.config import settings
+from src.services.openai_client.cache import ClassificationCache
+from src.services.openai_client.hedging import HedgeBudget, LatencyWindow
 from src.services.openai_client.models import AIResponse
 from src.services.openai_client.prompts import SYSTEM_PROMPT
+from src.services.openai_client.rules import RuleClassifier
+from src.utils.metrics import counter, gauge
 
 logger = logging.getLogger(__name__)
 
 MAX_MESSAGE_LENGTH = 500
+# Until enough latencies are observed, and the cap of adaptive timeouts
 REQUEST_TIMEOUT = 10
 
+RULES = counter(
+    "ai_rules_classifications_total",
+    "Rule-based pre-classification outcomes (answered, deferred, degraded)",
+    ["result"],
+)
+HEDGES = counter(
+    "ai_hedged_requests_total",
+    "Hedged classifications by outcome (primary_won, fallback_won, both_weak, "
+    "budget_exhausted)",
+    ["result"],
+)
+TIMEOUT = gauge(
+    "ai_request_timeout_seconds",
+    "Current adaptive request timeout per model",
+    ["model"],
+)
+
 
 class OpenAIClient:
     """OpenAI API client with smart fallback (mini -> full model)."""
 
-    def __init__(self, client: AsyncOpenAI | None = None) -> None:
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        cache: ClassificationCache | None = None,
+        rules: RuleClassifier | None = None,
+    ) -> None:
         self._client = client or AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY,
             base_url=settings.OPENAI_BASE_URL,
         )
+        self._cache = cache
+        self._rules = rules
+        self._rule_results = {
+            result: RULES.labels(result) for result in ("answered", "deferred", "degraded")
+        }
+        self._latency: dict[str, LatencyWindow] = {}
+        self._budget = HedgeBudget(
+            settings.AI_HEDGE_BUDGET_RATIO, settings.AI_HEDGE_BUDGET_BURST,
+        )
+        self._hedges = {
+            result: HEDGES.labels(result)
+            for result in ("primary_won", "fallback_won", "both_weak", "budget_exhausted")
+        }
+
+    async def close(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        await self._client.close()
 
     async def classify(self, user_message: str) -> AIResponse:
         """Classify user message: detect intent and extract entities.
 
         Uses gpt-4o-mini first. If confidence is low, JSON is invalid,
-        or intent is empty, retries with gpt-4o (smart fallback).
+        or intent is empty, retries with gpt-4o (smart fallback). If the
+        primary is slower than usual, gpt-4o is asked in parallel instead
+        (hedging, see ``_classify``). With
+        rules, an obvious message (confidence at AI_RULES_CONFIDENCE) is
+        answered without a call, and the rules answer instead of the API
+        when it fails. With a cache, a message seen before is answered
+        from it.
         """
         truncated = user_message[:MAX_MESSAGE_LENGTH]
+        ruled = None
+        if self._rules is not None:
+            ruled = self._rules.classify(truncated)
+            if ruled.confidence >= settings.AI_RULES_CONFIDENCE:
+                self._rule_results["answered"].inc()
+                return ruled
+            self._rule_results["deferred"].inc()
+
+        if self._cache is None:
+            response = await self._classify(truncated)
+        else:
+            cached = await self._cache.get(truncated)
+            if cached is not None:
+                return cached
+            start = time.monotonic()
+            response = await self._classify(truncated)
+            await self._cache.set(truncated, response, int((time.monotonic() - start) * 1000))
+
+        if response.failed and ruled is not None and ruled.confidence > 0:
+            logger.warning("OpenAI unavailable, answering from rules: intent=%s", ruled.intent)
+            self._rule_results["degraded"].inc()
+            return ruled
+        return response
 
-        # 1. Try primary model
-        response = await self._call_model(truncated, model=settings.OPENAI_MODEL)
+    async def _classify(self, truncated: str) -> AIResponse:
+        # 1. Try primary model, hedged with the fallback once it runs late
+        delay = self._hedge_delay()
+        primary = asyncio.create_task(
+            self._call_model(truncated, model=settings.OPENAI_MODEL, at_least=delay or 0.0),
+        )
+        try:
+            if delay is not None:
+                self._budget.earn()
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    if self._budget.spend():
+                        return await self._hedge(truncated, primary)
+                    self._hedges["budget_exhausted"].inc()
+            response = await primary
+        finally:
+            if not primary.done():
+                primary.cancel()
 
         # 2. Check if fallback is needed
         if self._needs_fallback(response):
-            logger.info(
-                "Smart fallback triggered: intent=%s confidence=%.2f model=%s",
-                response.intent, response.confidence, response.model_used,
-            )
+            self._log_fallback(response)
             fallback = await self._call_model(
                 truncated, model=settings.OPENAI_FALLBACK_MODEL,
             )
@@ -51,9 +138,84 @@ class OpenAIClient:
 
         return response
 
-    async def _call_model(self, message: str, model: str) -> AIResponse:
-        """Make a single API call and parse the response."""
+    async def _hedge(self, truncated: str, primary: asyncio.Task) -> AIResponse:
+        """Race the fallback model against the late primary call.
+
+        The first acceptable answer wins and the other call is cancelled;
+        a weak primary answer waits for the fallback as usual. If neither
+        is acceptable the fallback's answer is returned, as without hedging.
+        """
+        logger.info(
+            "Hedging slow %s call with %s",
+            settings.OPENAI_MODEL, settings.OPENAI_FALLBACK_MODEL,
+        )
+        fallback = asyncio.create_task(
+            self._call_model(truncated, model=settings.OPENAI_FALLBACK_MODEL),
+        )
+        pending = {primary, fallback}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Both at once: the primary's answer is as good and cheaper
+                for task in sorted(done, key=lambda task: task is fallback):
+                    response = task.result()
+                    if task is fallback:
+                        response.used_fallback = True
+                    if not self._needs_fallback(response):
+                        self._hedges["fallback_won" if task is fallback else "primary_won"].inc()
+                        return response
+                    if task is primary:
+                        self._log_fallback(response)
+            self._hedges["both_weak"].inc()
+            return fallback.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _hedge_delay(self) -> float | None:
+        """How long the primary model gets before hedging; None to not hedge."""
+        if not settings.AI_HEDGE_ENABLED:
+            return None
+        return self._window(settings.OPENAI_MODEL).percentile(settings.AI_HEDGE_PERCENTILE)
+
+    def _timeout(self, model: str) -> float:
+        """Request timeout adapted to the model's observed latency."""
+        observed = self._window(model).percentile(settings.AI_TIMEOUT_PERCENTILE)
+        if observed is None:
+            return REQUEST_TIMEOUT
+        timeout = min(
+            max(observed * settings.AI_TIMEOUT_MULTIPLIER, settings.AI_TIMEOUT_MIN_SECONDS),
+            REQUEST_TIMEOUT,
+        )
+        TIMEOUT.labels(model).set(timeout)
+        return timeout
+
+    def _window(self, model: str) -> LatencyWindow:
+        window = self._latency.get(model)
+        if window is None:
+            window = self._latency[model] = LatencyWindow(
+                settings.AI_LATENCY_WINDOW, settings.AI_LATENCY_MIN_SAMPLES,
+            )
+        return window
+
+    @staticmethod
+    def _log_fallback(response: AIResponse) -> None:
+        logger.info(
+            "Smart fallback triggered: intent=%s confidence=%.2f model=%s",
+            response.intent, response.confidence, response.model_used,
+        )
+
+    async def _call_model(
+        self, message: str, model: str, at_least: float = 0.0
+    ) -> AIResponse:
+        """Make a single API call and parse the response.
+
+        A call cancelled midway (it lost a hedge) is recorded as taking at
+        least ``at_least`` seconds, its hedge delay.
+        """
         start = time.monotonic()
+        timeout = self._timeout(model)
         try:
             completion = await self._client.chat.completions.create(
                 model=model,
@@ -63,21 +225,34 @@ class OpenAIClient:
                 ],
                 max_tokens=settings.OPENAI_MAX_TOKENS,
                 temperature=settings.OPENAI_TEMPERATURE,
-                timeout=REQUEST_TIMEOUT,
+                timeout=timeout,
             )
-            elapsed_ms = int((time.monotonic() - start) * 1000)
+            elapsed = time.monotonic() - start
+            self._window(model).observe(elapsed)
+            elapsed_ms = int(elapsed * 1000)
             raw = completion.choices[0].message.content or ""
             logger.debug("OpenAI response (model=%s, %dms): %s", model, elapsed_ms, raw)
             return self._parse_response(raw, model)
 
+        except asyncio.CancelledError:
+            # Censored, but leaving it out would keep only the fast calls and
+            # let the hedge delay and timeout drift down
+            self._window(model).observe(max(time.monotonic() - start, at_least))
+            raise
         except Exception as exc:
-            elapsed_ms = int((time.monotonic() - start) * 1000)
+            elapsed = time.monotonic() - start
+            if isinstance(exc, (APITimeoutError, TimeoutError)):
+                # At least the timeout: if the model got slower for good, the
+                # timeout grows with it instead of every call timing out
+                self._window(model).observe(max(elapsed, timeout))
+            elapsed_ms = int(elapsed * 1000)
             logger.exception("OpenAI API error (model=%s, %dms)", model, elapsed_ms)
             return AIResponse(
                 intent="unknown",
                 confidence=0.0,
                 reply="",
                 model_used=model,
+                failed=True,
             )
 
     def _parse_response(self, raw: str, model: str) -> AIResponse:
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+
+
+class LatencyWindow:
+    """The last ``size`` successful call latencies of one model, in seconds.
+
+    ``percentile`` is None until ``min_samples`` calls have been seen, so a
+    cold client keeps its fixed timeout and doesn't hedge on guesses.
+    """
+
+    def __init__(self, size: int, min_samples: int) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Nearest-rank percentile, ``q`` in (0, 1]."""
+        if len(self._samples) < self._min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+class HedgeBudget:
+    """Caps hedged calls at ``ratio`` of requests.
+
+    A token bucket: every request earns ``ratio`` of a hedge, up to
+    ``burst`` saved; a hedge spends a whole one. When the primary model
+    slows down for everyone, hedging stops after the burst instead of
+    doubling the token spend.
+    """
+
+    def __init__(self, ratio: float, burst: float) -> None:
+        self._ratio = ratio
+        self._burst = burst
+        self._tokens = burst
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def earn(self) -> None:
+        self._tokens = min(self._burst, self._tokens + self._ratio)
+
+    def spend(self) -> bool:
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
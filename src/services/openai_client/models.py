@@ -13,6 +13,8 @@ class AIResponse:
     reply: str = ""
     model_used: str = ""
     used_fallback: bool = False
+    # The API call failed (no answer from the model at all)
+    failed: bool = False
 
     @property
     def has_intent(self) -> bool:
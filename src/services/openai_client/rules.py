@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import re
+
+from src.services.openai_client.models import AIResponse
+from src.services.openai_client.prompts import INTENT_TO_SERVICE
+
+# AIResponse.model_used (and so AiLog.model_used) of a rule-based answer
+MODEL_TAG = "rules"
+
+# Per intent: (pattern, weight). A weight is the share of messages matching
+# the pattern alone that really have that intent, tuned on
+# scripts/data/intent_samples.tsv (check them against the held-out set with
+# scripts/bench_rule_classifier.py); several matches of one intent combine
+# as independent evidence. A match right after a negation ("не продам",
+# "не хочу продавать") doesn't count.
+INTENT_RULES: dict[str, list[tuple[str, float]]] = {
+    "sell": [
+        (r"\bпрода(м|ю|ть|ём|ем|жа|жу)\b", 0.9),
+        (r"\bвыкуп", 0.85),
+        (r"\b(сдать|оценить|оценка)\b.{0,20}\b(авто|машин|тачк)", 0.6),
+        (r"\bкто (купит|возьм[её]т)\b", 0.8),
+    ],
+    "buy": [
+        (r"\bкуп(лю|ить|ил бы|аю)\b", 0.85),
+        (r"\bпокупк", 0.7),
+        # Not "хочу продать машину"
+        (r"\b(ищу|нужн[аоы]?|хочу)\b(?!.{0,20}\bпрода).{0,15}\b(авто|машин|тачк)", 0.55),
+        (r"\bв наличии\b", 0.6),
+    ],
+    "find": [
+        (r"\bподб(ор|ерите|рать)", 0.92),
+        (r"\bподобрать\b", 0.92),
+        (r"\bпомоги(те)? (выбрать|найти)\b", 0.85),
+        (r"\bчто (лучше )?(взять|выбрать)\b", 0.7),
+        (r"\bпосоветуйте\b", 0.6),
+    ],
+    "check": [
+        (r"\bпровер(ка|ку|ки|ить|ьте|ите)\b", 0.9),
+        (r"\bдиагностик", 0.85),
+        (r"\bосмотр(еть)?\b", 0.75),
+        (r"\bтолщиномер", 0.9),
+        (r"\b(vin|вин)\b", 0.6),
+        (r"\bперекуп", 0.4),
+    ],
+    "legal": [
+        (r"\bюрист", 0.95),
+        (r"\bюридич", 0.95),
+        (r"\bадвокат", 0.9),
+        (r"\b(договор|дкп)\b", 0.75),
+        (r"\b(суд|претензи|иск)", 0.8),
+        (r"\b(арест|залог|запрет на регистрац)", 0.8),
+        (r"\bвернуть деньги\b", 0.7),
+    ],
+}
+
+# (canonical brand, patterns); a model alias implies its brand
+BRANDS: list[tuple[str, str]] = [
+    ("Toyota", r"toyota|тойот"),
+    ("Lexus", r"lexus|лексус"),
+    ("BMW", r"bmw|бэ?мв"),
+    ("Mercedes-Benz", r"mercedes|мерседес|мерс\b"),
+    ("Audi", r"audi|ауди"),
+    ("Volkswagen", r"volkswagen|vw|фольксваген"),
+    ("Skoda", r"skoda|шкод"),
+    ("Kia", r"kia|киа"),
+    ("Hyundai", r"hyundai|хендай|хёндай|хундай|хюндай"),
+    ("Lada", r"lada|лада|ваз"),
+    ("Nissan", r"nissan|ниссан"),
+    ("Renault", r"renault|рено"),
+    ("Mazda", r"mazda|мазд"),
+    ("Honda", r"honda|хонд"),
+    ("Mitsubishi", r"mitsubishi|мицубиси|митсубиси"),
+    ("Ford", r"ford|форд"),
+    ("Haval", r"haval|хавал|хавейл"),
+    ("Chery", r"chery|чери"),
+    ("Geely", r"geely|джили"),
+]
+MODELS: list[tuple[str, str, str]] = [
+    ("Toyota", "Camry", r"camry|камр"),
+    ("Toyota", "Corolla", r"corolla|королл"),
+    ("Toyota", "RAV4", r"rav\s?4|рав\s?4"),
+    ("Toyota", "Land Cruiser", r"land cruiser|ленд ?крузер|крузак"),
+    ("Kia", "Rio", r"rio\b|рио\b"),
+    ("Kia", "Sportage", r"sportage|спортейдж"),
+    ("Hyundai", "Solaris", r"solaris|солярис"),
+    ("Hyundai", "Creta", r"creta|крет[аыуе]\b"),
+    ("Lada", "Vesta", r"vesta|вест[аыуе]\b"),
+    ("Lada", "Granta", r"granta|грант[аыуе]\b"),
+    ("Volkswagen", "Polo", r"polo\b|поло\b"),
+    ("Volkswagen", "Tiguan", r"tiguan|тигуан"),
+    ("Skoda", "Octavia", r"octavia|октави"),
+    ("Skoda", "Rapid", r"rapid\b|рапид"),
+    ("Renault", "Logan", r"logan|логан"),
+    ("Renault", "Duster", r"duster|дастер"),
+    ("Nissan", "Qashqai", r"qashqai|кашка"),
+    ("Mazda", "CX-5", r"cx-?5|сх-?5"),
+    ("Ford", "Focus", r"focus|фокус"),
+]
+
+REPLIES = {
+    "sell": "Поможем продать ваш автомобиль.",
+    "buy": "Поможем купить автомобиль.",
+    "find": "Подберём автомобиль под ваши требования.",
+    "check": "Проверим автомобиль перед покупкой.",
+    "legal": "Юрист поможет с вашим вопросом.",
+}
+
+_NEGATION = re.compile(
+    r"\b(не|ни|нет)\s+((хочу|хотим|буду|будем|могу|можем|собираюсь|планирую)\s+)?$"
+)
+_YEAR = re.compile(r"\b(19[89]\d|20[0-4]\d)\b")
+_AMOUNT = re.compile(r"(\d+(?:[.,]\d+)?)\s*(млн|миллион\w*|м\b|тыс\w*|т\.?р\.?|к\b)?")
+_BUDGET_CONTEXT = re.compile(r"(бюджет|до|за|цен[аы]|стоимост\w*|около)\s*$")
+_MILEAGE_CONTEXT = re.compile(r"(пробег\w*|прошла|прош[её]л)\s*$")
+_KM = re.compile(r"^\s*км")
+
+
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE)
+
+
+class RuleClassifier:
+    """Keyword and regex classification of obvious messages, without a network call.
+
+    Patterns for each intent of ``INTENT_TO_SERVICE`` are compiled once.
+    The confidence of an intent combines the weights of its matching
+    patterns (1 - prod(1 - w)) and is discounted by the strongest
+    competing intent, so ambiguous messages score low. Brand, model,
+    year, budget and mileage are extracted the same way as the model is
+    asked to (numbers without spaces).
+    """
+
+    def __init__(self, rules: dict[str, list[tuple[str, float]]] | None = None) -> None:
+        rules = rules if rules is not None else INTENT_RULES
+        self._rules = {
+            intent: [(_compile(pattern), weight) for pattern, weight in patterns]
+            for intent, patterns in rules.items()
+            if intent in INTENT_TO_SERVICE
+        }
+        self._brands = [(brand, _compile(rf"\b(?:{pattern})")) for brand, pattern in BRANDS]
+        self._models = [
+            (brand, model, _compile(rf"\b(?:{pattern})")) for brand, model, pattern in MODELS
+        ]
+
+    def classify(self, message: str) -> AIResponse:
+        """Best intent with its confidence; ``unknown`` at 0.0 if nothing matched."""
+        text = message.casefold()
+        scores = {}
+        for intent, patterns in self._rules.items():
+            miss = 1.0
+            for pattern, weight in patterns:
+                if _affirmed(pattern, text):
+                    miss *= 1.0 - weight
+            if miss < 1.0:
+                scores[intent] = 1.0 - miss
+
+        if not scores:
+            return AIResponse(intent="unknown", confidence=0.0, model_used=MODEL_TAG)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        intent, confidence = ranked[0]
+        if len(ranked) > 1:
+            confidence *= 1.0 - ranked[1][1]
+        return AIResponse(
+            intent=intent,
+            confidence=round(confidence, 3),
+            entities=self.extract_entities(text),
+            reply=REPLIES.get(intent, ""),
+            model_used=MODEL_TAG,
+        )
+
+    def extract_entities(self, text: str) -> dict[str, str | None]:
+        text = text.casefold()
+        entities: dict[str, str | None] = {
+            "brand": None, "model": None, "year": None, "budget": None, "mileage": None,
+        }
+        for brand, model, pattern in self._models:
+            if pattern.search(text):
+                entities["brand"], entities["model"] = brand, model
+                break
+        for brand, pattern in self._brands:
+            if pattern.search(text):
+                entities["brand"] = brand
+                break
+
+        if year := _YEAR.search(text):
+            entities["year"] = year.group(1)
+        for match in _AMOUNT.finditer(text):
+            if year and match.start() == year.start():
+                continue
+            before = text[:match.start()]
+            value = _amount(match.group(1), match.group(2))
+            if value is None:
+                continue
+            if _MILEAGE_CONTEXT.search(before) or _KM.match(text[match.end():]):
+                entities["mileage"] = entities["mileage"] or value
+            elif _BUDGET_CONTEXT.search(before) or match.group(2):
+                entities["budget"] = entities["budget"] or value
+        return entities
+
+
+def _affirmed(pattern: re.Pattern, text: str) -> bool:
+    """``pattern`` occurs in ``text`` other than right after a negation."""
+    return any(
+        not _NEGATION.search(text, 0, match.start()) for match in pattern.finditer(text)
+    )
+
+
+def _amount(number: str, unit: str | None) -> str | None:
+    """``3,5`` + ``млн`` -> ``3500000``; bare numbers only count with context."""
+    value = float(number.replace(",", "."))
+    if unit:
+        if unit.startswith(("млн", "миллион", "м")):
+            value *= 1_000_000
+        else:
+            value *= 1_000
+    return str(int(value)) if value >= 1 else None
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from aiogram import Bot
+
+from src.config import settings
+from src.db.repositories.lead import LeadRepository
+from src.db.repositories.outbox import OutboxRepository
+from src.services.lead_processor import LeadProcessor
+from src.utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+DEPTH = gauge(
+    "lead_outbox_depth",
+    "Leads waiting in the outbox for delivery to AmoCRM",
+)
+LAG = gauge(
+    "lead_outbox_lag_seconds",
+    "Age of the oldest lead waiting in the outbox",
+)
+BUSY = gauge(
+    "lead_outbox_workers_busy",
+    "Outbox workers currently delivering a lead",
+)
+DELIVERIES = counter(
+    "lead_outbox_deliveries_total",
+    "Outbox deliveries by result (sent, failed, retry, dropped, lease_lost)",
+    ["result"],
+)
+DELIVERY_LATENCY = histogram(
+    "lead_outbox_delivery_seconds",
+    "Time from confirm:send to the end of the delivery attempt",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+class LeadOutbox:
+    """Background delivery of leads saved by ``LeadProcessor.enqueue``.
+
+    ``workers`` tasks claim batches of outbox rows (``FOR UPDATE SKIP
+    LOCKED`` with a lease, so several processes can drain the same table),
+    deliver each lead and delete its row, then update the user's
+    confirmation message. The batch is delivered one row at a time, and
+    each row's lease is renewed right before its delivery; a row whose
+    lease ran out and was claimed by another worker meanwhile is skipped.
+    A worker that dies mid-delivery leaves its rows to be claimed again
+    when the lease expires: delivery is at least once, and
+    ``LeadProcessor.deliver`` skips leads that are already sent.
+
+    A lead whose delivery fails is marked ``error`` by the processor and
+    leaves the outbox; the periodic retry sweep picks it up from there.
+    """
+
+    def __init__(
+        self,
+        session_factory: Any,
+        processor: LeadProcessor,
+        bot: Bot,
+        success_text: str,
+        saved_text: str,
+        workers: int | None = None,
+        batch_size: int | None = None,
+        poll_interval: float | None = None,
+        lease_seconds: float | None = None,
+        max_attempts: int | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._processor = processor
+        self._bot = bot
+        self._success_text = success_text
+        self._saved_text = saved_text
+        self._workers = workers if workers is not None else settings.LEAD_OUTBOX_WORKERS
+        self._batch_size = (
+            batch_size if batch_size is not None else settings.LEAD_OUTBOX_BATCH_SIZE
+        )
+        self._poll_interval = (
+            poll_interval if poll_interval is not None else settings.LEAD_OUTBOX_POLL_SECONDS
+        )
+        self._lease_seconds = (
+            lease_seconds if lease_seconds is not None else settings.LEAD_OUTBOX_LEASE_SECONDS
+        )
+        self._max_attempts = (
+            max_attempts if max_attempts is not None else settings.LEAD_OUTBOX_MAX_ATTEMPTS
+        )
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+        self._monitor_task: asyncio.Task | None = None
+        self._results = {
+            result: DELIVERIES.labels(result)
+            for result in ("sent", "failed", "retry", "dropped", "lease_lost")
+        }
+
+    def start(self) -> None:
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"lead-outbox-{n}")
+            for n in range(self._workers)
+        ]
+        self._monitor_task = asyncio.create_task(self._monitor(), name="lead-outbox-monitor")
+        logger.info(
+            "Lead outbox started (workers=%d, batch_size=%d)",
+            self._workers, self._batch_size,
+        )
+
+    def notify(self) -> None:
+        """Wake idle workers: a new lead was just enqueued."""
+        self._wakeup.set()
+
+    async def stop(self, grace: float = 0.0) -> None:
+        """Stop the workers.
+
+        With ``grace`` they first finish the delivery in hand (claimed rows
+        not started yet are released); whatever still runs after ``grace``
+        seconds is cancelled.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if grace > 0 and self._tasks:
+            await asyncio.wait(self._tasks, timeout=grace)
+        tasks = self._tasks + ([self._monitor_task] if self._monitor_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._monitor_task = None
+
+    async def run_once(self) -> int:
+        """Claim one batch and deliver it. Returns the number of rows claimed."""
+        async with self._session_factory() as session:
+            items = await OutboxRepository(session).claim(
+                self._batch_size, self._lease_seconds,
+            )
+            await session.commit()
+
+        for index, item in enumerate(items):
+            if self._stopping:
+                await self._release(items[index:])
+                break
+            BUSY.inc()
+            try:
+                await self._process(item)
+            except Exception:
+                # The lease expires and the row is claimed again
+                self._results["retry"].inc()
+                logger.exception("Outbox delivery of lead %d crashed", item.lead_id)
+            finally:
+                BUSY.dec()
+        return len(items)
+
+    async def _release(self, items: list) -> None:
+        try:
+            async with self._session_factory() as session:
+                await OutboxRepository(session).release([item.lead_id for item in items])
+                await session.commit()
+        except Exception:
+            # The leases expire on their own
+            logger.warning("Failed to release %d outbox rows", len(items), exc_info=True)
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lead outbox claim failed")
+                claimed = 0
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _process(self, item: Any) -> None:
+        async with self._session_factory() as session:
+            outbox = OutboxRepository(session)
+            # The batch's lease may have run out while earlier rows were sent
+            locked_until = await outbox.renew(item.id, item.locked_until, self._lease_seconds)
+            await session.commit()
+            if locked_until is None:
+                logger.warning(
+                    "Outbox lease on lead %d ran out before its delivery, left to its new owner",
+                    item.lead_id,
+                )
+                self._results["lease_lost"].inc()
+                return
+            item.locked_until = locked_until
+
+            if item.attempts > self._max_attempts:
+                logger.error(
+                    "Lead %d left the outbox after %d attempts",
+                    item.lead_id, item.attempts - 1,
+                )
+                await LeadRepository(session).update_status(
+                    lead_id=item.lead_id,
+                    status="error",
+                    error_message="outbox delivery attempts exhausted",
+                )
+                await outbox.delete(item.id)
+                await session.commit()
+                self._results["dropped"].inc()
+                return
+
+            sent = await self._processor.deliver(session, item.lead_id)
+            await outbox.delete(item.id)
+            await session.commit()
+
+        DELIVERY_LATENCY.observe(self._age(item.created_at))
+        self._results["sent" if sent else "failed"].inc()
+        if sent is not None:
+            await self._reply(item, self._success_text if sent else self._saved_text)
+
+    async def _reply(self, item: Any, text: str) -> None:
+        if item.chat_id is None:
+            return
+        if item.message_id is not None:
+            try:
+                await self._bot.edit_message_text(
+                    text, chat_id=item.chat_id, message_id=item.message_id,
+                )
+                return
+            except Exception:
+                logger.debug("Could not edit confirmation for lead %d", item.lead_id, exc_info=True)
+        try:
+            await self._bot.send_message(item.chat_id, text)
+        except Exception:
+            logger.warning("Failed to notify user about lead %d", item.lead_id, exc_info=True)
+
+    async def _monitor(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as session:
+                    depth, oldest = await OutboxRepository(session).stats()
+                DEPTH.set(depth)
+                LAG.set(self._age(oldest) if oldest is not None else 0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Failed to read lead outbox stats", exc_info=True)
+            await asyncio.sleep(self._poll_interval)
+
+    @staticmethod
+    def _age(created_at: datetime | None) -> float:
+        if created_at is None:
+            return 0.0
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return max((datetime.now(timezone.utc) - created_at).total_seconds(), 0.0)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from src.config import settings
+from src.db.repositories.lead import RETRY_CHANNEL, LeadRepository
+from src.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# Reasons published on RETRY_CHANNEL
+LEAD_FAILED = "lead_failed"
+CRM_RECOVERED = "crm_recovered"
+
+# An idle LISTEN connection can die silently; ping it this often
+PING_INTERVAL_SECONDS = 30.0
+RECONNECT_MAX_SECONDS = 60.0
+
+WAKEUPS = counter(
+    "lead_retry_wakeups_total",
+    "Retry scheduler wakeups by reason",
+    ["reason"],
+)
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """``postgresql+asyncpg://...`` (SQLAlchemy) -> ``postgresql://...`` (asyncpg)."""
+    return make_url(database_url).set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+
+
+async def announce_crm_recovered(session_factory: Any) -> None:
+    """Make leads that failed during the outage due now and wake the schedulers."""
+    async with session_factory() as session:
+        repo = LeadRepository(session)
+        count = await repo.make_due_now()
+        await repo.notify_retry(CRM_RECOVERED)
+        await session.commit()
+    logger.info("AmoCRM recovered, %d failed leads rescheduled for now", count)
+
+
+class RetryWakeup:
+    """Wakes the retry scheduler on ``NOTIFY lead_retry``.
+
+    Holds one dedicated asyncpg connection (outside the SQLAlchemy pool)
+    that LISTENs on the channel, reconnecting with backoff if it drops.
+    ``wait`` is a sleep that ends early when a notification arrives; after
+    a reconnect it also ends, since notifications may have been missed.
+    """
+
+    def __init__(self, dsn: str | None = None) -> None:
+        self._dsn = dsn or asyncpg_dsn(settings.DATABASE_URL)
+        self._event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="lead-retry-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def wait(self, timeout: float) -> bool:
+        """Sleep up to ``timeout`` seconds. True if woken by a notification."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+    def wake(self, reason: str) -> None:
+        WAKEUPS.labels(reason).inc()
+        self._event.set()
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        self.wake(payload or "notify")
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                conn = await asyncpg.connect(self._dsn)
+            except Exception:
+                logger.warning(
+                    "LISTEN %s: connect failed, retrying in %.0fs",
+                    RETRY_CHANNEL, delay, exc_info=True,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+
+            delay = 1.0
+            try:
+                await conn.add_listener(RETRY_CHANNEL, self._on_notify)
+                logger.info("Listening for retry wakeups on %s", RETRY_CHANNEL)
+                self.wake("reconnect")
+                while True:
+                    await asyncio.sleep(PING_INTERVAL_SECONDS)
+                    await conn.execute("SELECT 1", timeout=PING_INTERVAL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("LISTEN %s connection lost, reconnecting", RETRY_CHANNEL, exc_info=True)
+            finally:
+                if not conn.is_closed():
+                    await conn.close(timeout=5)
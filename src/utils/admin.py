@@ -1,11 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import html
+import json
 import logging
+import time
+from datetime import datetime
+from typing import Any
 
 from aiogram import Bot
 
 from src.config import settings
+from src.utils.metrics import counter
 
 logger = logging.getLogger(__name__)
 
+KEY_PREFIX = "admin_alerts"
+# Telegram's limit is 4096 characters per message
+MAX_MESSAGE_LENGTH = 4000
+MAX_DETAIL_LENGTH = 300
+# A digest Telegram keeps rejecting is dropped after this many sends
+MAX_FLUSH_FAILURES = 3
+
+ALERTS = counter(
+    "admin_alerts_total",
+    "Admin alerts by result (recorded, digest, rate_limited, direct, dropped)",
+    ["result"],
+)
+
+# Count the alert under its key, keep the latest text, return the pending total
+_RECORD_SCRIPT = """
+redis.call('hincrby', KEYS[1], ARGV[1], 1)
+redis.call('hset', KEYS[2], ARGV[1], ARGV[2])
+local total = 0
+for _, count in ipairs(redis.call('hvals', KEYS[1])) do
+    total = total + tonumber(count)
+end
+return total
+"""
+
+# Take everything pending at once, so two replicas never send the same counts
+_TAKE_SCRIPT = """
+local counts = redis.call('hgetall', KEYS[1])
+local last = redis.call('hgetall', KEYS[2])
+redis.call('del', KEYS[1], KEYS[2])
+return {counts, last}
+"""
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
 
 async def notify_admin(bot: Bot, text: str) -> None:
     """Send a notification message to the admin chat."""
@@ -17,3 +62,169 @@ async def notify_admin(bot: Bot, text: str) -> None:
         await bot.send_message(chat_id=settings.ADMIN_CHAT_ID, text=text)
     except Exception:
         logger.exception("Failed to send admin notification")
+
+
+class AlertDigest:
+    """Admin alerts coalesced into periodic digests.
+
+    ``record`` counts an alert under its key (the error class) in Redis,
+    so pending counts survive restarts and are shared by replicas. A
+    background task sends one message summing up every key each flush
+    interval, or sooner once ``flush_count`` alerts are pending, and at
+    most ``max_per_minute`` messages a minute; what can't be sent stays
+    pending for the next flush, up to ``MAX_FLUSH_FAILURES`` times. If
+    Redis is unavailable the alert is sent directly.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        redis: Any,
+        flush_interval: float | None = None,
+        flush_count: int | None = None,
+        max_per_minute: int | None = None,
+        prefix: str = KEY_PREFIX,
+    ) -> None:
+        self._bot = bot
+        self._redis = redis
+        self._flush_interval = (
+            flush_interval if flush_interval is not None
+            else settings.ADMIN_ALERT_FLUSH_SECONDS
+        )
+        self._flush_count = (
+            flush_count if flush_count is not None else settings.ADMIN_ALERT_FLUSH_COUNT
+        )
+        self._max_per_minute = (
+            max_per_minute if max_per_minute is not None
+            else settings.ADMIN_ALERT_MAX_PER_MINUTE
+        )
+        self._counts_key = f"{prefix}:counts"
+        self._last_key = f"{prefix}:last"
+        self._sent_prefix = f"{prefix}:sent:"
+        self._record = redis.register_script(_RECORD_SCRIPT)
+        self._take = redis.register_script(_TAKE_SCRIPT)
+        self._due = asyncio.Event()
+        self._limited_until = 0.0
+        self._failures = 0
+        self._task: asyncio.Task | None = None
+        self._results = {
+            result: ALERTS.labels(result)
+            for result in ("recorded", "digest", "rate_limited", "direct", "dropped")
+        }
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="admin-alert-digest")
+
+    async def stop(self) -> None:
+        """Stop flushing. Pending alerts stay in Redis for the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def record(self, key: str, detail: str) -> None:
+        """Count one alert of class ``key``; ``detail`` is kept if it's the latest."""
+        payload = json.dumps({"at": time.time(), "detail": detail[:MAX_DETAIL_LENGTH]})
+        try:
+            pending = await self._record(
+                keys=[self._counts_key, self._last_key], args=[key, payload],
+            )
+        except Exception:
+            logger.warning("Failed to record admin alert, sending it directly", exc_info=True)
+            self._results["direct"].inc()
+            await notify_admin(self._bot, html.escape(f"{key}\n{detail}"))
+            return
+        self._results["recorded"].inc()
+        if int(pending) >= self._flush_count:
+            self._due.set()
+
+    async def flush(self) -> bool:
+        """Send one digest of everything pending. True if a message was sent."""
+        if not settings.ADMIN_CHAT_ID:
+            logger.warning("ADMIN_CHAT_ID not set, skipping admin alert digest")
+            return False
+        if not await self._redis.exists(self._counts_key):
+            return False
+        if not await self._within_rate():
+            self._results["rate_limited"].inc()
+            return False
+        raw_counts, raw_last = await self._take(keys=[self._counts_key, self._last_key])
+        counts = _pairs(raw_counts)
+        if not counts:
+            return False
+        last = _pairs(raw_last)
+
+        lines = []
+        for key, count in sorted(counts.items(), key=lambda item: -int(item[1])):
+            entry = json.loads(last.get(key) or "{}")
+            at = datetime.fromtimestamp(entry.get("at", time.time())).strftime("%H:%M")
+            lines.append(f"{key}: {count} шт., последняя в {at}\n{entry.get('detail', '')}")
+        text = "\n\n".join(lines)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+        try:
+            # Plain text: details are raw error texts, e.g. "502 <html>…"
+            await self._bot.send_message(
+                chat_id=settings.ADMIN_CHAT_ID, text=text, parse_mode=None,
+            )
+        except Exception:
+            self._failures += 1
+            if self._failures >= MAX_FLUSH_FAILURES:
+                logger.exception("Failed to send admin alert digest, dropping it:\n%s", text)
+                self._failures = 0
+                self._results["dropped"].inc()
+                return False
+            logger.exception("Failed to send admin alert digest, keeping it pending")
+            await self._restore(counts, last)
+            return False
+        self._failures = 0
+        self._results["digest"].inc()
+        return True
+
+    async def _within_rate(self) -> bool:
+        """Take one of this minute's sends, shared by all replicas."""
+        minute = int(time.time() // 60)
+        key = f"{self._sent_prefix}{minute}"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 120)
+            sent, _ = await pipe.execute()
+        if int(sent) <= self._max_per_minute:
+            return True
+        self._limited_until = (minute + 1) * 60
+        return False
+
+    async def _restore(self, counts: dict[str, str], last: dict[str, str]) -> None:
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                for key, count in counts.items():
+                    pipe.hincrby(self._counts_key, key, int(count))
+                    if key in last:
+                        # Don't overwrite a newer alert recorded meanwhile
+                        pipe.hsetnx(self._last_key, key, last[key])
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to put back %d admin alerts", sum(map(int, counts.values())))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._due.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._due.clear()
+            # Over the cap: hold everything until the next minute
+            if (limited := self._limited_until - time.time()) > 0:
+                await asyncio.sleep(limited)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Admin alert digest flush failed")
+
+
+def _pairs(flat: list) -> dict[str, str]:
+    """Redis HGETALL reply returned from Lua (flat list) -> dict."""
+    items = [_text(value) for value in flat or []]
+    return dict(zip(items[::2], items[1::2]))
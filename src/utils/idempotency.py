@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from src.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+CHECKS = counter(
+    "idempotency_checks_total",
+    "Idempotency key checks by result (first, duplicate, unavailable)",
+    ["name", "result"],
+)
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class IdempotencyGuard:
+    """At-most-once execution per key across handlers and replicas.
+
+    ``begin`` claims the key with an atomic ``SET NX``; only the caller
+    that claimed it does the work and then records the outcome with
+    ``finish``. Everyone else gets the recorded outcome (``PENDING`` while
+    the first caller is still working) instead of running it again. If
+    Redis is unavailable the guard lets the call through.
+    """
+
+    def __init__(self, redis: Any, name: str, ttl: int) -> None:
+        self._redis = redis
+        self._prefix = f"idempotency:{name}:"
+        self._ttl = ttl
+        self._results = {
+            result: CHECKS.labels(name, result)
+            for result in ("first", "duplicate", "unavailable")
+        }
+
+    async def begin(self, key: str) -> str | None:
+        """Claim ``key``. None if claimed, else the outcome of the first call."""
+        try:
+            if await self._redis.set(self._prefix + key, PENDING, nx=True, ex=self._ttl):
+                self._results["first"].inc()
+                return None
+            outcome = await self._redis.get(self._prefix + key)
+        except Exception:
+            self._results["unavailable"].inc()
+            logger.warning("Idempotency check for %s failed, proceeding", key, exc_info=True)
+            return None
+        self._results["duplicate"].inc()
+        # Expired between SET and GET: treat as still in progress
+        return _text(outcome) if outcome is not None else PENDING
+
+    async def finish(self, key: str, outcome: str) -> None:
+        try:
+            await self._redis.set(self._prefix + key, outcome, xx=True, ex=self._ttl)
+        except Exception:
+            logger.warning("Failed to record outcome for %s", key, exc_info=True)
+
+    async def abort(self, key: str) -> None:
+        """Release ``key`` after a failure so the call can be made again."""
+        try:
+            await self._redis.delete(self._prefix + key)
+        except Exception:
+            logger.warning("Failed to release idempotency key %s", key, exc_info=True)
@@ -1,11 +1,29 @@
 import asyncio
 import logging
+import random
 from functools import wraps
 from typing import Any, Callable, Type
 
 logger = logging.getLogger(__name__)
 
 
+def backoff_delay(
+    attempt: int,
+    initial: float,
+    factor: float = 2,
+    cap: float = 3600,
+    jitter: float = 0.5,
+) -> float:
+    """Jittered exponential backoff delay (seconds) before retry ``attempt`` (0-based).
+
+    Grows as ``initial * factor ** attempt`` up to ``cap``; a random share
+    of up to ``jitter`` is taken off so failures that happened together
+    don't retry together.
+    """
+    delay = min(cap, initial * factor ** attempt)
+    return delay * (1 - jitter * random.random())
+
+
 def async_retry(
     max_attempts: int = 3,
     backoff_base: int = 2,
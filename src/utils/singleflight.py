@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, TypeVar
+
+from src.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CALLS = counter(
+    "singleflight_calls_total",
+    "Single-flight calls by outcome (executed or shared)",
+    ["name", "outcome"],
+)
+
+
+class _LeaderCancelled(Exception):
+    """The caller running the function was cancelled; a follower takes over."""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight await the same result (or exception). With ``redis``, the
+    execution is additionally serialized across processes by a Redis lock,
+    so a second replica runs only after the first has finished and can pick
+    up its outcome (e.g. from a cache) instead of repeating the work. If
+    the running caller is cancelled, a waiting caller runs the function
+    instead of seeing the cancellation.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        redis: Any = None,
+        lock_timeout: float = 10.0,
+    ) -> None:
+        self.name = name
+        self._redis = redis
+        self._lock_timeout = lock_timeout
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._executed = CALLS.labels(name, "executed")
+        self._shared = CALLS.labels(name, "shared")
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        wait: float | None = None,
+    ) -> T:
+        """Run ``fn`` for ``key`` or join the call already in flight.
+
+        ``wait`` caps how long to block on the Redis lock (defaults to the
+        lock timeout); when it runs out, ``fn`` runs without the lock.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self._shared.inc()
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                return await self.do(key, fn, wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._executed.inc()
+        try:
+            result = await self._run(key, fn, wait)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # followers are optional; don't warn if none
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _run(
+        self, key: str, fn: Callable[[], Awaitable[T]], wait: float | None
+    ) -> T:
+        if self._redis is None:
+            return await fn()
+
+        if wait is None:
+            wait = self._lock_timeout
+        lock = self._redis.lock(
+            f"singleflight:{self.name}:{key}",
+            timeout=self._lock_timeout,
+            blocking_timeout=max(min(wait, self._lock_timeout), 0),
+        )
+        try:
+            acquired = await lock.acquire()
+        except Exception:
+            logger.warning("Single-flight lock for %s unavailable", key, exc_info=True)
+            acquired = False
+        if not acquired:
+            # Better a rare duplicate than blocking the caller forever
+            return await fn()
+
+        try:
+            return await fn()
+        finally:
+            try:
+                await lock.release()
+            except Exception:
+                logger.warning("Failed to release single-flight lock for %s", key, exc_info=True)
@@ -2,6 +2,8 @@ import pytest
 from aiogram import Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from src.services.amocrm.circuit_breaker import reset_breakers
+
 
 @pytest.fixture
 def storage():
@@ -11,3 +13,11 @@ def storage():
 @pytest.fixture
 def dp(storage):
     return Dispatcher(storage=storage)
+
+
+@pytest.fixture(autouse=True)
+def _reset_circuit_breakers():
+    """Breakers are process-wide; keep failures from leaking across tests."""
+    reset_breakers()
+    yield
+    reset_breakers()
@@ -12,6 +12,7 @@ from src.bot.handlers.base_dialog import (
     BaseDialogHandler,
     StepConfig,
     StepType,
+    QUEUED_TEXT,
     SUCCESS_TEXT,
 )
 from src.bot.keyboards.main_menu import WELCOME_TEXT
@@ -532,6 +533,94 @@ async def test_confirm_send_clears_state_and_shows_success():
     cb.message.edit_text.assert_called_once_with(SUCCESS_TEXT)
 
 
+@pytest.mark.asyncio
+async def test_confirm_send_with_outbox_enqueues_and_replies_immediately():
+    storage = MemoryStorage()
+    state = await make_state(
+        storage,
+        state_value=SampleStates.comment.state,
+        data={"car_brand": "Toyota", "__confirming__": True},
+    )
+    cb = make_callback("confirm:send")
+    cb.message.chat = MagicMock(id=555)
+    cb.message.message_id = 77
+    lead_processor = MagicMock()
+    lead_processor.enqueue = AsyncMock(return_value=10)
+    lead_processor.process = AsyncMock()
+    lead_outbox = MagicMock()
+    session = AsyncMock()
+
+    await test_handler._on_confirm_send(
+        cb, state, session=session, lead_processor=lead_processor, lead_outbox=lead_outbox,
+    )
+
+    assert await state.get_state() is None
+    kwargs = lead_processor.enqueue.call_args.kwargs
+    assert kwargs["data"] == {"car_brand": "Toyota"}
+    assert (kwargs["chat_id"], kwargs["message_id"]) == (555, 77)
+    lead_processor.process.assert_not_called()
+    cb.message.edit_text.assert_called_once_with(QUEUED_TEXT)
+    lead_outbox.notify.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_confirm_send_does_not_overwrite_worker_outcome():
+    """A worker that delivers right after the commit keeps its edit."""
+    storage = MemoryStorage()
+    state = await make_state(
+        storage,
+        state_value=SampleStates.comment.state,
+        data={"car_brand": "Toyota", "__confirming__": True},
+    )
+    cb = make_callback("confirm:send")
+    cb.message.chat = MagicMock(id=555)
+    cb.message.message_id = 77
+
+    async def enqueue_and_deliver(**kwargs):
+        # The worker picks the committed lead up before the handler resumes
+        await cb.message.edit_text(SUCCESS_TEXT)
+        return 10
+
+    lead_processor = MagicMock()
+    lead_processor.enqueue = AsyncMock(side_effect=enqueue_and_deliver)
+    lead_outbox = MagicMock()
+
+    await test_handler._on_confirm_send(
+        cb, state, session=AsyncMock(), lead_processor=lead_processor, lead_outbox=lead_outbox,
+    )
+
+    texts = [c.args[0] for c in cb.message.edit_text.call_args_list]
+    assert texts == [QUEUED_TEXT, SUCCESS_TEXT]
+    lead_outbox.notify.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_confirm_send_restores_confirmation_when_enqueue_fails():
+    storage = MemoryStorage()
+    state = await make_state(
+        storage,
+        state_value=SampleStates.comment.state,
+        data={"car_brand": "Toyota", "__confirming__": True},
+    )
+    cb = make_callback("confirm:send")
+    cb.message.chat = MagicMock(id=555)
+    cb.message.message_id = 77
+    lead_processor = MagicMock()
+    lead_processor.enqueue = AsyncMock(side_effect=RuntimeError("db down"))
+    lead_outbox = MagicMock()
+
+    with pytest.raises(RuntimeError):
+        await test_handler._on_confirm_send(
+            cb, state, session=AsyncMock(), lead_processor=lead_processor, lead_outbox=lead_outbox,
+        )
+
+    assert await state.get_state() == SampleStates.comment.state
+    last = cb.message.edit_text.call_args
+    assert last.args[0] != QUEUED_TEXT
+    assert last.kwargs["reply_markup"] is not None
+    lead_outbox.notify.assert_not_called()
+
+
 # ---------------------------------------------------------------
 # Tests: Photo upload
 # ---------------------------------------------------------------
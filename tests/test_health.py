@@ -15,3 +15,65 @@ async def test_health_check_returns_200():
         assert resp.status == 200
         text = await resp.text()
         assert text == "ok"
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_returns_prometheus_text():
+    from src.main import metrics
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.get("/metrics")
+        assert resp.status == 200
+        text = await resp.text()
+        assert "# TYPE amocrm_rate_limiter_queue_depth gauge" in text
+
+
+@pytest.mark.asyncio
+async def test_amocrm_health_reports_breaker_state():
+    from src.main import amocrm_health
+    from src.services.amocrm.circuit_breaker import get_breaker
+
+    breaker = get_breaker("https://health.amocrm.ru")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    app = web.Application()
+    app.router.add_get("/health/amocrm", amocrm_health)
+
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.get("/health/amocrm")
+        assert resp.status == 200
+        body = await resp.json()
+
+    [snapshot] = body["breakers"]
+    assert snapshot["name"] == "https://health.amocrm.ru"
+    assert snapshot["state"] == "open"
+    assert snapshot["transitions"][-1]["to"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_breaker_alert_task_is_held_until_done():
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    from src import main
+    from src.services.amocrm.circuit_breaker import BreakerState
+
+    sent = asyncio.Event()
+
+    async def notify(bot, text):
+        await sent.wait()
+
+    with patch("src.main.notify_admin", AsyncMock(side_effect=notify)):
+        listener = main._breaker_alert(MagicMock())
+        listener(MagicMock(name="amocrm"), BreakerState.CLOSED, BreakerState.OPEN)
+        assert len(main._background_tasks) == 1
+        task = next(iter(main._background_tasks))
+
+        sent.set()
+        await task
+
+    assert not main._background_tasks
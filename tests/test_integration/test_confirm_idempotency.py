@@ -0,0 +1,158 @@
+"""Concurrent confirm:send callbacks for one dialog run the pipeline once."""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import EditMessageText
+from aiogram.types import Update
+
+from src.bot.handlers.base_dialog import (
+    BaseDialogHandler,
+    QUEUED_TEXT,
+    StepConfig,
+    StepType,
+    SUCCESS_TEXT,
+)
+from src.utils.idempotency import IdempotencyGuard
+
+USER_ID = 123456
+BOT_ID = 42
+
+
+class IdemStates(StatesGroup):
+    comment = State()
+
+
+class IdemDialogHandler(BaseDialogHandler):
+    service_type = "idem_test"
+    states_group = IdemStates
+    steps = [
+        StepConfig(
+            key="comment",
+            state=IdemStates.comment,
+            prompt_text="Комментарий:",
+            step_type=StepType.TEXT_INPUT,
+        ),
+    ]
+
+
+class RecordingSession(BaseSession):
+    """Bot session answering every API call with True."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def confirm_update(update_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Ivan"},
+            "chat_instance": "ci",
+            "data": "confirm:send",
+            "message": {
+                "message_id": 77,
+                "date": int(time.time()),
+                "chat": {"id": USER_ID, "type": "private"},
+                "text": "Проверьте данные",
+            },
+        },
+    })
+
+
+async def fire(n: int, **dispatcher_kwargs):
+    storage = MemoryStorage()
+    key = StorageKey(bot_id=BOT_ID, chat_id=USER_ID, user_id=USER_ID)
+    await storage.set_state(key, IdemStates.comment.state)
+    await storage.set_data(key, {"comment": "hi", "__dialog_id__": "d1"})
+
+    dp = Dispatcher(
+        storage=storage,
+        confirm_guard=IdempotencyGuard(fakeredis.FakeAsyncRedis(), "confirm_send", 60),
+        session=AsyncMock(),
+        **dispatcher_kwargs,
+    )
+    dp.include_router(IdemDialogHandler().router)
+    bot = Bot(f"{BOT_ID}:TEST", session=RecordingSession())
+
+    await asyncio.gather(*(dp.feed_update(bot, confirm_update(i)) for i in range(n)))
+    edits = [m.text for m in bot.session.requests if isinstance(m, EditMessageText)]
+    return edits, await storage.get_state(key)
+
+
+@pytest.mark.parametrize("n", [2, 10])
+async def test_concurrent_confirm_send_processes_lead_once(n):
+    processor = MagicMock()
+
+    async def process(**kwargs):
+        await asyncio.sleep(0.05)
+        return True
+
+    processor.process = AsyncMock(side_effect=process)
+
+    edits, state = await fire(n, lead_processor=processor)
+
+    processor.process.assert_called_once()
+    assert edits == [SUCCESS_TEXT]
+    assert state is None
+
+
+async def test_concurrent_confirm_send_enqueues_once():
+    processor = MagicMock()
+
+    async def enqueue(**kwargs):
+        await asyncio.sleep(0.05)
+        return 10
+
+    processor.enqueue = AsyncMock(side_effect=enqueue)
+    outbox = MagicMock()
+
+    edits, _ = await fire(10, lead_processor=processor, lead_outbox=outbox)
+
+    processor.enqueue.assert_called_once()
+    outbox.notify.assert_called_once()
+    assert edits == [QUEUED_TEXT]
+
+
+async def test_failed_submission_can_be_retried():
+    processor = MagicMock()
+    processor.process = AsyncMock(side_effect=[RuntimeError("db down"), True])
+    storage = MemoryStorage()
+    key = StorageKey(bot_id=BOT_ID, chat_id=USER_ID, user_id=USER_ID)
+    await storage.set_state(key, IdemStates.comment.state)
+    await storage.set_data(key, {"comment": "hi", "__dialog_id__": "d1"})
+    dp = Dispatcher(
+        storage=storage,
+        confirm_guard=IdempotencyGuard(fakeredis.FakeAsyncRedis(), "confirm_send", 60),
+        session=AsyncMock(),
+        lead_processor=processor,
+    )
+    dp.include_router(IdemDialogHandler().router)
+    bot = Bot(f"{BOT_ID}:TEST", session=RecordingSession())
+
+    with pytest.raises(RuntimeError):
+        await dp.feed_update(bot, confirm_update(1))
+    await dp.feed_update(bot, confirm_update(2))
+
+    assert processor.process.call_count == 2
+    assert await storage.get_state(key) is None
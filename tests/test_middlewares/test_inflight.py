@@ -0,0 +1,43 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from aiogram.types import TelegramObject
+
+from src.bot.middlewares.inflight import InFlightMiddleware
+
+
+async def test_drain_waits_for_handlers_in_flight():
+    mw = InFlightMiddleware()
+    done = []
+
+    async def handler(event, data):
+        await asyncio.sleep(0.02)
+        done.append(event)
+        return "ok"
+
+    task = asyncio.create_task(mw(handler, MagicMock(spec=TelegramObject), {}))
+    await asyncio.sleep(0)
+    assert mw.in_flight == 1
+
+    assert await mw.drain(timeout=1) == 0
+    assert len(done) == 1
+    assert await task == "ok"
+    assert mw.in_flight == 0
+
+
+async def test_drain_cancels_handlers_past_timeout():
+    mw = InFlightMiddleware()
+
+    async def handler(event, data):
+        await asyncio.sleep(3600)
+
+    task = asyncio.create_task(mw(handler, MagicMock(spec=TelegramObject), {}))
+    await asyncio.sleep(0)
+
+    assert await mw.drain(timeout=0.01) == 1
+    assert task.cancelled()
+    assert mw.in_flight == 0
+
+
+async def test_drain_without_updates_returns_immediately():
+    assert await InFlightMiddleware().drain(timeout=60) == 0
@@ -1,6 +1,9 @@
+from datetime import datetime, timedelta, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.repositories.lead import LeadRepository
+from src.db.repositories.outbox import OutboxRepository
 from src.db.repositories.user import UserRepository
 
 
@@ -86,3 +89,128 @@ async def test_get_failed_leads_respects_max_retries(db_session: AsyncSession):
 
     failed = await repo.get_failed_leads(max_retries=5)
     assert len(failed) == 0
+
+
+async def test_claim_failed_leads_leases_and_counts_attempt(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    failed = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    await repo.create(user_id=user_id, service_type="buy", data={}, status="sent")
+
+    claimed = await repo.claim_failed_leads(limit=10, lease_seconds=60)
+    await db_session.refresh(failed)
+
+    assert claimed == [failed.id]
+    assert failed.status == "retrying"
+    assert failed.retry_count == 1
+    assert failed.next_retry_at is not None
+    # Leased: a second sweep doesn't get it
+    assert await repo.claim_failed_leads(limit=10, lease_seconds=60) == []
+
+
+async def test_claim_failed_leads_respects_limit_and_schedule(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    for _ in range(3):
+        await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    later = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    await repo.update_status(
+        later.id, "error", next_retry_at=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+
+    assert len(await repo.claim_failed_leads(limit=2, lease_seconds=60)) == 2
+    assert len(await repo.claim_failed_leads(limit=10, lease_seconds=60)) == 1
+    assert await repo.claim_failed_leads(limit=10, lease_seconds=60) == []
+
+
+async def test_next_retry_due(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    assert await repo.next_retry_due() is None
+
+    due = datetime.now(timezone.utc) + timedelta(minutes=5)
+    lead = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    await repo.update_status(lead.id, "error", next_retry_at=due)
+    await repo.update_status(
+        (await repo.create(user_id=user_id, service_type="buy", data={}, status="error")).id,
+        "error", next_retry_at=due + timedelta(hours=1),
+    )
+
+    assert await repo.next_retry_due() == due
+
+
+async def test_make_due_now_skips_leads_in_flight(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    parked = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    await repo.update_status(parked.id, "error", next_retry_at=later)
+    in_flight = await repo.create(user_id=user_id, service_type="buy", data={}, status="error")
+    await repo.claim_failed_leads(limit=1, lease_seconds=3600)
+
+    assert await repo.make_due_now() == 1
+    await db_session.refresh(parked)
+    await db_session.refresh(in_flight)
+    assert parked.next_retry_at <= datetime.now(timezone.utc)
+    assert in_flight.status == "retrying"
+    assert in_flight.next_retry_at > datetime.now(timezone.utc)
+
+
+async def test_unclaim_gives_the_attempt_back(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    lead = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    await repo.claim_failed_leads(limit=1, lease_seconds=3600)
+
+    assert await repo.unclaim([lead.id]) == 1
+    await db_session.refresh(lead)
+    assert lead.status == "error"
+    assert lead.retry_count == 0
+    assert lead.next_retry_at <= datetime.now(timezone.utc)
+    # Only claimed leads are given back
+    assert await repo.unclaim([lead.id]) == 0
+
+
+async def test_release_unfinished_requeues_interrupted_leads(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    pending = await repo.create(user_id=user_id, service_type="sell", data={}, status="pending")
+    sent = await repo.create(user_id=user_id, service_type="sell", data={}, status="sent")
+    queued = await repo.create(user_id=user_id, service_type="buy", data={}, status="pending")
+    await OutboxRepository(db_session).add(queued.id)
+
+    assert await repo.release_unfinished([pending.id, sent.id, queued.id]) == 1
+    for lead in (pending, sent, queued):
+        await db_session.refresh(lead)
+    assert pending.status == "error"
+    assert pending.next_retry_at <= datetime.now(timezone.utc)
+    assert sent.status == "sent"
+    # The outbox still owns it
+    assert queued.status == "pending"
+
+
+async def test_rescue_stale_pending_only_takes_old_leads(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    fresh = await repo.create(user_id=user_id, service_type="sell", data={}, status="pending")
+    stale = await repo.create(user_id=user_id, service_type="sell", data={}, status="pending")
+    stale.created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    await db_session.flush()
+
+    assert await repo.rescue_stale_pending(600) == 1
+    await db_session.refresh(fresh)
+    await db_session.refresh(stale)
+    assert stale.status == "error"
+    assert fresh.status == "pending"
+
+
+async def test_get_with_user_loads_user(db_session: AsyncSession):
+    user_id = await _create_user(db_session)
+    repo = LeadRepository(db_session)
+    lead = await repo.create(user_id=user_id, service_type="sell", data={}, status="error")
+    db_session.expunge_all()
+
+    loaded = await repo.get_with_user(lead.id)
+
+    # Loaded with the lead: no lazy load (which would fail under asyncio)
+    assert loaded.user.telegram_id == 100
@@ -0,0 +1,79 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.repositories.lead import LeadRepository
+from src.db.repositories.outbox import OutboxRepository
+from src.db.repositories.user import UserRepository
+
+
+async def _create_lead(session: AsyncSession, telegram_id: int = 100) -> int:
+    user = await UserRepository(session).create_or_update(telegram_id=telegram_id)
+    lead = await LeadRepository(session).create(
+        user_id=user.id, service_type="sell", data={}, status="pending",
+    )
+    return lead.id
+
+
+async def test_claim_leases_rows_oldest_first(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    first = await repo.add(await _create_lead(db_session, 1), chat_id=1, message_id=10)
+    second = await repo.add(await _create_lead(db_session, 2))
+
+    claimed = await repo.claim(limit=10, lease_seconds=60)
+
+    assert [item.id for item in claimed] == [first.id, second.id]
+    assert all(item.attempts == 1 for item in claimed)
+    assert all(item.locked_until is not None for item in claimed)
+
+
+async def test_claim_skips_leased_rows(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    await repo.add(await _create_lead(db_session))
+
+    assert len(await repo.claim(limit=10, lease_seconds=60)) == 1
+    assert await repo.claim(limit=10, lease_seconds=60) == []
+
+
+async def test_claim_takes_back_expired_lease(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    await repo.add(await _create_lead(db_session))
+
+    await repo.claim(limit=10, lease_seconds=-1)
+    reclaimed = await repo.claim(limit=10, lease_seconds=60)
+
+    assert len(reclaimed) == 1
+    assert reclaimed[0].attempts == 2
+
+
+async def test_renew_only_extends_our_own_lease(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    await repo.add(await _create_lead(db_session))
+
+    claimed = await repo.claim(limit=10, lease_seconds=-1)
+    item_id, expired = claimed[0].id, claimed[0].locked_until
+    # Lease ran out and another worker claimed the row
+    await repo.claim(limit=10, lease_seconds=60)
+
+    assert await repo.renew(item_id, expired, 60) is None
+
+
+async def test_renew_extends_lease_still_held(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    await repo.add(await _create_lead(db_session))
+
+    claimed = await repo.claim(limit=10, lease_seconds=1)
+    renewed = await repo.renew(claimed[0].id, claimed[0].locked_until, 60)
+
+    assert renewed is not None
+    assert renewed > claimed[0].locked_until
+
+
+async def test_delete_and_stats(db_session: AsyncSession):
+    repo = OutboxRepository(db_session)
+    item = await repo.add(await _create_lead(db_session))
+
+    depth, oldest = await repo.stats()
+    assert depth == 1
+    assert oldest is not None
+
+    await repo.delete(item.id)
+    assert await repo.stats() == (0, None)
@@ -46,3 +46,41 @@ async def test_get_current_returns_latest(db_session: AsyncSession):
 async def test_get_current_empty(db_session: AsyncSession):
     repo = TokenRepository(db_session)
     assert await repo.get_current() is None
+
+
+async def test_save_keeps_single_current_row(db_session: AsyncSession):
+    from sqlalchemy import func, select
+
+    from src.db.models import AmoTokenCurrent
+
+    repo = TokenRepository(db_session)
+    for i in range(3):
+        await repo.save(AmoToken(
+            access_token=f"acc_{i}",
+            refresh_token=f"ref_{i}",
+            expires_at=datetime(2025, 12, 31, tzinfo=timezone.utc),
+        ))
+
+    rows = await db_session.scalar(select(func.count()).select_from(AmoTokenCurrent))
+    assert rows == 1
+    current = await repo.get_current()
+    assert (current.access_token, current.refresh_token) == ("acc_2", "ref_2")
+
+
+async def test_prune_history_keeps_newest_rows(db_session: AsyncSession):
+    from sqlalchemy import select
+
+    repo = TokenRepository(db_session)
+    for i in range(5):
+        await repo.save(AmoToken(
+            access_token=f"acc_{i}",
+            refresh_token=f"ref_{i}",
+            expires_at=datetime(2025, 12, 31, tzinfo=timezone.utc),
+        ))
+
+    deleted = await repo.prune_history(keep=2)
+
+    assert deleted == 3
+    left = (await db_session.scalars(select(AmoToken.access_token))).all()
+    assert sorted(left) == ["acc_3", "acc_4"]
+    assert (await repo.get_current()).access_token == "acc_4"
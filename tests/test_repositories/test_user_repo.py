@@ -44,3 +44,25 @@ async def test_update_phone(db_session: AsyncSession):
     await repo.create_or_update(telegram_id=444)
     user = await repo.create_or_update(telegram_id=444, phone="+79991234567")
     assert user.phone == "+79991234567"
+
+
+async def test_get_contact_id_by_phone(db_session: AsyncSession):
+    repo = UserRepository(db_session)
+    user = await repo.create_or_update(telegram_id=666, phone="+79991112233")
+    assert await repo.get_contact_id_by_phone("+79991112233") is None
+
+    user.amo_contact_id = 5001
+    await db_session.flush()
+
+    assert await repo.get_contact_id_by_phone("+79991112233") == 5001
+
+
+async def test_clear_contact_id(db_session: AsyncSession):
+    repo = UserRepository(db_session)
+    user = await repo.create_or_update(telegram_id=777, phone="+79994445566")
+    user.amo_contact_id = 5002
+    await db_session.flush()
+
+    await repo.clear_contact_id(5002)
+
+    assert await repo.get_contact_id_by_phone("+79994445566") is None
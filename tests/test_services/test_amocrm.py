@@ -1,11 +1,19 @@
 """Tests for AmoCRM client, auth, services, and mock."""
 
+import asyncio
+
 import pytest
 from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from src.services.amocrm.auth import AmoCRMAuth, REFRESH_MARGIN_SECONDS
-from src.services.amocrm.client import AmoCRMClient, AmoCRMError
+from src.services.amocrm.client import (
+    AmoCRMClient,
+    AmoCRMDeadlineExceeded,
+    AmoCRMError,
+    _retry_delay,
+)
+from src.services.amocrm.deadline import crm_deadline, remaining_budget
 from src.services.amocrm.contacts import ContactsService
 from src.services.amocrm.leads import LeadsService
 from src.services.amocrm.notes import NotesService
@@ -96,6 +104,106 @@ async def test_auth_raises_when_no_token():
             await auth.get_access_token()
 
 
+def _expiring_auth():
+    auth = AmoCRMAuth(session_factory=MagicMock())
+    auth._access_token = "old_token"
+    auth._refresh_token = "old_refresh"
+    auth._expires_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    return auth
+
+
+def _slow_refresh(auth, calls):
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        auth._access_token = f"new_token_{len(calls)}"
+        auth._expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+    return refresh
+
+
+@pytest.mark.asyncio
+async def test_auth_concurrent_callers_share_one_refresh():
+    auth = _expiring_auth()
+    calls = []
+
+    with patch.object(auth, "_refresh", side_effect=_slow_refresh(auth, calls)):
+        tokens = await asyncio.gather(*(auth.get_access_token() for _ in range(10)))
+
+    assert len(calls) == 1
+    assert set(tokens) == {"new_token_1"}
+
+
+@pytest.mark.asyncio
+async def test_auth_refresh_survives_cancelled_waiter():
+    auth = _expiring_auth()
+    calls = []
+
+    with patch.object(auth, "_refresh", side_effect=_slow_refresh(auth, calls)):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(auth.get_access_token(), timeout=0.001)
+        token = await auth.get_access_token()
+
+    assert len(calls) == 1
+    assert token == "new_token_1"
+
+
+@pytest.mark.asyncio
+async def test_auth_refresh_failure_reaches_all_waiters_and_is_counted():
+    from src.services.amocrm.auth import REFRESHES
+
+    auth = _expiring_auth()
+    failed = REFRESHES.labels("error").value
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("AmoCRM token refresh failed: 400")
+
+    with patch.object(auth, "_refresh", side_effect=broken) as mock_refresh:
+        results = await asyncio.gather(
+            *(auth.get_access_token() for _ in range(3)), return_exceptions=True,
+        )
+
+    assert mock_refresh.call_count == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert REFRESHES.labels("error").value == failed + 1
+
+
+@pytest.mark.asyncio
+async def test_auth_handle_401_skips_already_replaced_token():
+    auth = AmoCRMAuth(session_factory=MagicMock())
+    auth._access_token = "fresh_token"
+    auth._refresh_token = "some_refresh"
+
+    with patch.object(auth, "_refresh", new_callable=AsyncMock) as mock_refresh:
+        await auth.handle_401("stale_token")
+
+    mock_refresh.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_auth_background_refresher_refreshes_ahead_of_expiry():
+    auth = AmoCRMAuth(session_factory=MagicMock())
+    auth._access_token = "old_token"
+    auth._refresh_token = "old_refresh"
+    # Still valid for requests, but inside the background lead time
+    auth._expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=REFRESH_MARGIN_SECONDS + 10
+    )
+    calls = []
+
+    with patch.object(auth, "_refresh", side_effect=_slow_refresh(auth, calls)), \
+            patch("src.services.amocrm.auth.random.uniform", return_value=60):
+        task = asyncio.create_task(auth.run_refresher())
+        for _ in range(50):
+            if auth._access_token != "old_token":
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    assert len(calls) == 1
+    assert await auth.get_access_token() == "new_token_1"
+
+
 # ---------------------------------------------------------------
 # Client tests (using get/post/patch wrapper methods)
 # ---------------------------------------------------------------
@@ -149,6 +257,7 @@ async def test_client_request_retries_on_429():
         nonlocal call_count
         call_count += 1
         resp = MagicMock()
+        resp.content.total_bytes = 0
         if call_count == 1:
             resp.status = 429
             resp.text = AsyncMock(return_value="rate limited")
@@ -187,6 +296,7 @@ async def test_client_request_401_triggers_refresh():
         nonlocal call_count
         call_count += 1
         resp = MagicMock()
+        resp.content.total_bytes = 0
         if call_count == 1:
             resp.status = 401
             resp.text = AsyncMock(return_value="unauthorized")
@@ -218,6 +328,7 @@ async def test_client_request_raises_on_persistent_500():
 
     async def fake_request(method, url, **kwargs):
         resp = MagicMock()
+        resp.content.total_bytes = 0
         resp.status = 500
         resp.text = AsyncMock(return_value="server error")
         return resp
@@ -233,6 +344,147 @@ async def test_client_request_raises_on_persistent_500():
                 await client._request("GET", "/api/v4/leads")
 
 
+@pytest.mark.asyncio
+async def test_client_uses_shared_http_session():
+    """With an injected session, _request reuses it instead of opening new ones."""
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="test_token")
+    auth.base_url = "https://test.amocrm.ru"
+
+    async def fake_request(method, url, **kwargs):
+        resp = MagicMock()
+        resp.content.total_bytes = 0
+        resp.status = 200
+        resp.json = AsyncMock(return_value={"ok": True})
+        return resp
+
+    shared = MagicMock()
+    shared.request = MagicMock(side_effect=lambda *a, **kw: _acm(fake_request(*a, **kw)))
+    client = AmoCRMClient(auth, http_session=shared)
+
+    with patch("aiohttp.ClientSession") as mock_cls:
+        await client._request("GET", "/api/v4/leads")
+        await client._request("GET", "/api/v4/contacts")
+
+    mock_cls.assert_not_called()
+    assert shared.request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_create_http_session_configures_pool():
+    from src.services.amocrm.http import create_http_session
+
+    with patch("src.services.amocrm.http.settings") as mock_settings:
+        mock_settings.AMOCRM_HTTP_POOL_SIZE = 15
+        mock_settings.AMOCRM_HTTP_POOL_PER_HOST = 4
+        mock_settings.AMOCRM_HTTP_DNS_CACHE_TTL = 120
+        mock_settings.AMOCRM_HTTP_KEEPALIVE_TIMEOUT = 30.0
+        session = create_http_session()
+
+    try:
+        assert session.connector.limit == 15
+        assert session.connector.limit_per_host == 4
+        assert session.connector.use_dns_cache is True
+    finally:
+        await session.close()
+
+
+# ---------------------------------------------------------------
+# Deadline / Retry-After tests
+# ---------------------------------------------------------------
+
+def _client_with_responses(*responses):
+    """AmoCRMClient whose shared session replays (status, headers) tuples."""
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="test_token")
+    auth.handle_401 = AsyncMock()
+    auth.base_url = "https://test.amocrm.ru"
+    calls = iter(responses)
+
+    async def fake_request(method, url, **kwargs):
+        status, headers = next(calls)
+        resp = MagicMock()
+        resp.content.total_bytes = 0
+        resp.status = status
+        resp.headers = headers
+        resp.text = AsyncMock(return_value="error")
+        resp.json = AsyncMock(return_value={"ok": True})
+        return resp
+
+    session = MagicMock()
+    session.request = MagicMock(side_effect=lambda *a, **kw: _acm(fake_request(*a, **kw)))
+    return AmoCRMClient(auth, http_session=session), session
+
+
+def test_retry_delay_uses_retry_after_seconds():
+    assert _retry_delay("3", attempt=1) == 3.0
+    assert _retry_delay(None, attempt=3) == 4
+
+
+def test_retry_delay_parses_http_date_and_caps():
+    assert _retry_delay("Wed, 21 Oct 2015 07:28:00 GMT", attempt=1) == 0.0
+    assert _retry_delay("3600", attempt=1) == 60
+
+
+@pytest.mark.asyncio
+async def test_client_honors_retry_after_header():
+    client, _ = _client_with_responses(
+        (429, {"Retry-After": "3"}), (200, {}),
+    )
+
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        result = await client._request("GET", "/api/v4/leads")
+
+    assert result == {"ok": True}
+    mock_sleep.assert_called_once_with(3.0)
+
+
+@pytest.mark.asyncio
+async def test_client_does_not_sleep_past_deadline():
+    """Backoff longer than the remaining budget fails fast instead."""
+    client, session = _client_with_responses(
+        (503, {"Retry-After": "10"}), (200, {}),
+    )
+
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        with crm_deadline(5):
+            with pytest.raises(AmoCRMDeadlineExceeded):
+                await client._request("POST", "/api/v4/leads")
+
+    mock_sleep.assert_not_called()
+    assert session.request.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_client_clips_attempt_timeout_to_deadline():
+    client, session = _client_with_responses((200, {}))
+
+    with crm_deadline(2):
+        await client._request("GET", "/api/v4/contacts")
+
+    timeout = session.request.call_args.kwargs["timeout"]
+    assert timeout.total <= 2
+
+
+@pytest.mark.asyncio
+async def test_client_raises_when_deadline_already_spent():
+    client, session = _client_with_responses((200, {}))
+
+    with patch("src.services.amocrm.client.remaining_budget", return_value=-0.1):
+        with pytest.raises(AmoCRMDeadlineExceeded):
+            await client._request("GET", "/api/v4/contacts")
+
+    session.request.assert_not_called()
+
+
+def test_nested_deadline_cannot_extend_outer():
+    assert remaining_budget() is None
+    with crm_deadline(1):
+        with crm_deadline(60):
+            assert remaining_budget() <= 1
+    assert remaining_budget() is None
+
+
 class _acm:
     """Helper to wrap a coroutine as an async context manager."""
 
@@ -325,3 +577,35 @@ async def test_notes_service_add():
     service = NotesService(mock)
     note_id = await service.add_to_lead(lead_id=100, text="Test note")
     assert isinstance(note_id, int)
+
+
+@pytest.mark.asyncio
+async def test_leads_service_create_complex():
+    from src.services.amocrm.contacts import build_contact_payload
+
+    mock = MockAmoCRMClient()
+    service = LeadsService(mock)
+    lead_id, contact_id = await service.create_complex(
+        title="Продажа - BMW - Иван",
+        contact=build_contact_payload("Иван", "+79991234567", telegram_id=123),
+        service_type="sell",
+        data={"car_brand": "BMW"},
+    )
+    assert isinstance(lead_id, int)
+    assert isinstance(contact_id, int)
+    assert lead_id != contact_id
+
+
+@pytest.mark.asyncio
+async def test_leads_service_create_complex_embeds_contact():
+    client = MagicMock()
+    client.post = AsyncMock(return_value=[{"id": 7, "contact_id": 8}])
+    service = LeadsService(client)
+    contact = {"name": "Иван", "custom_fields_values": []}
+
+    await service.create_complex("Title", contact, "buy", {})
+
+    path = client.post.call_args.args[0]
+    body = client.post.call_args.kwargs["json"]
+    assert path == "/api/v4/leads/complex"
+    assert body[0]["_embedded"]["contacts"] == [contact]
@@ -0,0 +1,133 @@
+"""Tests for the AmoCRM micro-batching writer."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.services.amocrm.batcher import BatchWriter
+from src.services.amocrm.client import AmoCRMDeadlineExceeded, AmoCRMError
+from src.services.amocrm.contacts import ContactsService
+from src.services.amocrm.deadline import crm_deadline
+from src.services.amocrm.leads import LeadsService
+from src.services.amocrm.mock import MockAmoCRMClient
+from src.services.amocrm.notes import NotesService
+
+
+def spy_client():
+    mock = MockAmoCRMClient()
+    mock.post = AsyncMock(side_effect=mock.post)
+    return mock
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_share_one_request():
+    client = spy_client()
+    batcher = BatchWriter(client, "/api/v4/leads", "leads", window=0.01, max_size=50)
+    service = LeadsService(client, batcher)
+
+    lead_ids = await asyncio.gather(*[
+        service.create(f"Lead {i}", contact_id=i, service_type="sell", data={})
+        for i in range(5)
+    ])
+
+    assert client.post.call_count == 1
+    body = client.post.call_args.kwargs["json"]
+    assert [item["name"] for item in body] == [f"Lead {i}" for i in range(5)]
+    assert len(set(lead_ids)) == 5
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_max_size_reached():
+    client = spy_client()
+    batcher = BatchWriter(client, "/api/v4/contacts", "contacts", window=60, max_size=2)
+    service = ContactsService(client, batcher)
+
+    await asyncio.wait_for(
+        asyncio.gather(*[
+            service.create("Test", f"+7999000000{i}", telegram_id=i) for i in range(4)
+        ]),
+        timeout=1,
+    )
+
+    assert client.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_results_matched_by_request_id():
+    client = MagicMock()
+    client.post = AsyncMock(return_value={
+        "_embedded": {"leads": [{"id": 20, "request_id": "1"}, {"id": 10, "request_id": "0"}]}
+    })
+    batcher = BatchWriter(client, "/api/v4/leads", "leads", window=0.01, max_size=50)
+
+    first, second = await asyncio.gather(
+        batcher.submit({"name": "a"}), batcher.submit({"name": "b"}),
+    )
+
+    assert first["id"] == 10
+    assert second["id"] == 20
+
+
+@pytest.mark.asyncio
+async def test_batch_failure_propagates_to_all_callers():
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=RuntimeError("CRM down"))
+    batcher = BatchWriter(client, "/api/v4/leads", "leads", window=0.01, max_size=50)
+
+    results = await asyncio.gather(
+        batcher.submit({"name": "a"}), batcher.submit({"name": "b"}),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_retried_one_by_one():
+    """One invalid entity fails only its own caller."""
+    async def post(path, json):
+        if any(entity["name"] == "bad" for entity in json):
+            raise AmoCRMError("AmoCRM API error: 400 validation", status=400)
+        return {"_embedded": {"leads": [{"id": 1, "request_id": "0"}]}}
+
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=post)
+    batcher = BatchWriter(client, "/api/v4/leads", "leads", window=0.01, max_size=50)
+
+    good, bad, other = await asyncio.gather(
+        batcher.submit({"name": "a"}), batcher.submit({"name": "bad"}),
+        batcher.submit({"name": "c"}), return_exceptions=True,
+    )
+
+    assert good == {"id": 1, "request_id": "0"}
+    assert other == {"id": 1, "request_id": "0"}
+    assert isinstance(bad, AmoCRMError) and bad.status == 400
+    assert client.post.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_notes_batch_carries_entity_id():
+    client = spy_client()
+    batcher = BatchWriter(client, "/api/v4/leads/notes", "notes", window=0.01, max_size=50)
+    service = NotesService(client, batcher)
+
+    await asyncio.gather(service.add_to_lead(101, "a"), service.add_to_lead(102, "b"))
+
+    path = client.post.call_args.args[0]
+    body = client.post.call_args.kwargs["json"]
+    assert path == "/api/v4/leads/notes"
+    assert [note["entity_id"] for note in body] == [101, 102]
+
+
+@pytest.mark.asyncio
+async def test_submit_respects_deadline():
+    client = spy_client()
+    batcher = BatchWriter(client, "/api/v4/leads", "leads", window=5, max_size=50)
+
+    with crm_deadline(0.01):
+        with pytest.raises(AmoCRMDeadlineExceeded):
+            await batcher.submit({"name": "slow"})
+
+    await batcher.close()
+    assert client.post.call_count == 1
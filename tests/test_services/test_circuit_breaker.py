@@ -0,0 +1,190 @@
+"""Tests for the AmoCRM circuit breaker."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.services.amocrm.circuit_breaker import (
+    BreakerState,
+    CircuitBreaker,
+    all_breakers,
+    get_breaker,
+)
+from src.services.amocrm.client import AmoCRMCircuitOpen, AmoCRMClient
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(threshold: int = 3, recovery: float = 30.0):
+    clock = FakeClock()
+    return CircuitBreaker("test", threshold, recovery, clock=clock), clock
+
+
+def test_opens_after_consecutive_failures():
+    breaker, _ = make_breaker(threshold=3)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.allow_request() is False
+
+
+def test_success_resets_failure_count():
+    breaker, _ = make_breaker(threshold=2)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == BreakerState.CLOSED
+
+
+def test_half_open_allows_single_probe():
+    breaker, clock = make_breaker(threshold=1, recovery=10)
+    breaker.record_failure()
+
+    clock.now = 10
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+
+
+def test_half_open_probe_success_closes():
+    breaker, clock = make_breaker(threshold=1, recovery=10)
+    breaker.record_failure()
+    clock.now = 10
+    breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == BreakerState.CLOSED
+    assert [t["to"] for t in breaker.transitions] == ["open", "half_open", "closed"]
+
+
+def test_half_open_probe_failure_reopens():
+    breaker, clock = make_breaker(threshold=1, recovery=10)
+    breaker.record_failure()
+    clock.now = 10
+    breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.snapshot()["retry_in_seconds"] == 10
+
+
+def test_listener_receives_transitions():
+    breaker, _ = make_breaker(threshold=1)
+    seen = []
+    breaker.add_listener(lambda b, old, new: seen.append((old, new)))
+
+    breaker.record_failure()
+
+    assert seen == [(BreakerState.CLOSED, BreakerState.OPEN)]
+
+
+def test_get_breaker_is_keyed_by_base_url():
+    first = get_breaker("https://a.amocrm.ru")
+
+    assert get_breaker("https://a.amocrm.ru") is first
+    assert get_breaker("https://b.amocrm.ru") is not first
+    assert len(all_breakers()) == 2
+
+
+@pytest.mark.asyncio
+async def test_client_fails_fast_while_open():
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="test_token")
+    auth.base_url = "https://test.amocrm.ru"
+    breaker, _ = make_breaker(threshold=1)
+    breaker.record_failure()
+    session = MagicMock()
+
+    client = AmoCRMClient(auth, http_session=session, breaker=breaker)
+
+    with pytest.raises(AmoCRMCircuitOpen):
+        await client._request("POST", "/api/v4/leads")
+
+    session.request.assert_not_called()
+    auth.get_access_token.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_client_server_errors_open_breaker_and_stop_retrying():
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="test_token")
+    auth.base_url = "https://test.amocrm.ru"
+    breaker, _ = make_breaker(threshold=2)
+
+    class _Resp:
+        status = 503
+        headers = {}
+        content = MagicMock(total_bytes=11)
+
+        async def text(self):
+            return "unavailable"
+
+    class _Ctx:
+        async def __aenter__(self):
+            return _Resp()
+
+        async def __aexit__(self, *args):
+            pass
+
+    session = MagicMock()
+    session.request = MagicMock(side_effect=lambda *a, **kw: _Ctx())
+    client = AmoCRMClient(auth, http_session=session, breaker=breaker)
+
+    with patch("asyncio.sleep", new_callable=AsyncMock):
+        with pytest.raises(Exception):
+            await client._request("GET", "/api/v4/leads")
+
+    assert breaker.state == BreakerState.OPEN
+    assert session.request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_client_deadline_timeouts_do_not_count_as_failures():
+    """A request cut short by our own deadline budget says nothing about AmoCRM."""
+    import asyncio
+
+    from src.services.amocrm.deadline import crm_deadline
+
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="test_token")
+    auth.base_url = "https://test.amocrm.ru"
+    breaker, _ = make_breaker(threshold=1)
+    session = MagicMock()
+    session.request = MagicMock(side_effect=asyncio.TimeoutError())
+    client = AmoCRMClient(auth, http_session=session, breaker=breaker)
+
+    with crm_deadline(0.05):
+        with pytest.raises(Exception):
+            await client._request("POST", "/api/v4/leads")
+    assert breaker.state == BreakerState.CLOSED
+
+    # Without a deadline, a timeout is AmoCRM's
+    with patch("asyncio.sleep", new_callable=AsyncMock):
+        with pytest.raises(Exception):
+            await client._request("POST", "/api/v4/leads")
+    assert breaker.state == BreakerState.OPEN
+
+
+def test_released_probe_can_be_retaken():
+    breaker, clock = make_breaker(threshold=1, recovery=10)
+    breaker.record_failure()
+    clock.now = 10
+
+    assert breaker.allow_request() is True
+    breaker.release_probe()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.allow_request() is True
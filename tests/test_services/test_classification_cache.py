@@ -0,0 +1,78 @@
+"""Tests for the classification result cache."""
+
+import fakeredis
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from src.services.openai_client.cache import ClassificationCache, normalize_message
+from src.services.openai_client.models import AIResponse
+
+
+def _response(**kwargs) -> AIResponse:
+    kwargs.setdefault("intent", "sell")
+    kwargs.setdefault("confidence", 0.9)
+    kwargs.setdefault("model_used", "gpt-4o-mini")
+    return AIResponse(**kwargs)
+
+
+def test_normalize_message():
+    assert normalize_message("  Хочу   ПРОДАТЬ\nмашину ") == "хочу продать машину"
+    assert normalize_message("камри 2015 года") == "камри 2015 года"
+    assert normalize_message("камри 2015 года", bucket_digits=True) == "камри #4 года"
+
+
+async def test_hit_is_tagged_and_normalized():
+    cache = ClassificationCache(max_entries=10, ttl=60, bucket_digits=False)
+    await cache.set("Хочу продать машину", _response(used_fallback=True), latency_ms=800)
+
+    hit = await cache.get("хочу  продать машину")
+
+    assert hit.intent == "sell"
+    assert hit.model_used == "cache:gpt-4o-mini"
+    assert hit.used_fallback is False
+    assert await cache.get("хочу купить машину") is None
+
+
+async def test_lru_evicts_least_recently_used():
+    cache = ClassificationCache(max_entries=2, ttl=60, bucket_digits=False)
+    await cache.set("a", _response(), 1)
+    await cache.set("b", _response(), 1)
+    await cache.get("a")
+    await cache.set("c", _response(), 1)
+
+    assert await cache.get("a") is not None
+    assert await cache.get("b") is None
+
+
+async def test_redis_tier_is_shared_between_processes():
+    server = fakeredis.FakeServer()
+    first = ClassificationCache(fakeredis.FakeAsyncRedis(server=server), 10, 60, False)
+    second = ClassificationCache(fakeredis.FakeAsyncRedis(server=server), 10, 60, False)
+    await first.set("сколько стоит проверка", _response(intent="check"), 500)
+
+    hit = await second.get("Сколько стоит проверка")
+
+    assert hit.intent == "check"
+    assert hit.model_used == "cache:gpt-4o-mini"
+
+
+@pytest.mark.parametrize("response", [
+    _response(intent="", confidence=0.0),
+    _response(intent="unknown", confidence=0.0),
+])
+async def test_failed_classifications_are_not_cached(response):
+    cache = ClassificationCache(max_entries=10, ttl=60, bucket_digits=False)
+    await cache.set("привет", response, 10)
+    assert await cache.get("привет") is None
+
+
+async def test_redis_errors_are_misses():
+    redis = MagicMock()
+    redis.get = AsyncMock(side_effect=ConnectionError("down"))
+    redis.set = AsyncMock(side_effect=ConnectionError("down"))
+    cache = ClassificationCache(redis, max_entries=10, ttl=60, bucket_digits=False)
+
+    assert await cache.get("привет") is None
+    await cache.set("привет", _response(), 10)
+    # Still answered from the in-process tier
+    assert await cache.get("привет") is not None
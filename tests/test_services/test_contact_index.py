@@ -0,0 +1,168 @@
+"""Tests for the local phone -> AmoCRM contact index."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.services.amocrm.client import AmoCRMError
+from src.services.amocrm.contact_index import CachedContact, ContactIndex
+from src.services.lead_processor import LeadProcessor
+
+PHONE = "+79991234567"
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, str] = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def patch_db_contact_id(contact_id):
+    patcher = patch("src.services.amocrm.contact_index.UserRepository")
+    repo_cls = patcher.start()
+    repo_cls.return_value.get_contact_id_by_phone = AsyncMock(return_value=contact_id)
+    repo_cls.return_value.clear_contact_id = AsyncMock()
+    return patcher, repo_cls
+
+
+def make_processor(index, find_result=None):
+    contacts = MagicMock()
+    contacts.find_by_phone = AsyncMock(return_value=find_result)
+    contacts.create = AsyncMock(return_value=1001)
+    contacts.update = AsyncMock()
+    leads = MagicMock()
+    leads.create = AsyncMock(return_value=2001)
+    processor = LeadProcessor(contacts, leads, MagicMock(), MagicMock(), index)
+    return processor, contacts, leads
+
+
+# ---------------------------------------------------------------
+# ContactIndex
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_lookup_prefers_db():
+    redis = FakeRedis()
+    index = ContactIndex(redis)
+    patcher, _ = patch_db_contact_id(5001)
+    try:
+        found = await index.lookup(MagicMock(), PHONE)
+    finally:
+        patcher.stop()
+
+    assert found == CachedContact(5001, repeat_tagged=False, source="db")
+
+
+@pytest.mark.asyncio
+async def test_lookup_db_hit_takes_tag_flag_from_redis():
+    redis = FakeRedis()
+    index = ContactIndex(redis)
+    await index.remember(PHONE, 5001, repeat_tagged=True)
+    patcher, _ = patch_db_contact_id(5001)
+    try:
+        found = await index.lookup(MagicMock(), PHONE)
+    finally:
+        patcher.stop()
+
+    assert found.repeat_tagged is True
+
+
+@pytest.mark.asyncio
+async def test_lookup_falls_back_to_redis_then_miss():
+    redis = FakeRedis()
+    index = ContactIndex(redis)
+    patcher, _ = patch_db_contact_id(None)
+    try:
+        assert await index.lookup(MagicMock(), PHONE) is None
+        await index.remember("8 (999) 123-45-67", 5002)
+        found = await index.lookup(MagicMock(), PHONE)
+    finally:
+        patcher.stop()
+
+    assert found == CachedContact(5002, repeat_tagged=False, source="redis")
+
+
+@pytest.mark.asyncio
+async def test_invalidate_clears_redis_and_db():
+    redis = FakeRedis()
+    index = ContactIndex(redis)
+    await index.remember(PHONE, 5001)
+    patcher, repo_cls = patch_db_contact_id(None)
+    try:
+        await index.invalidate(MagicMock(), PHONE, 5001)
+    finally:
+        patcher.stop()
+
+    assert redis.data == {}
+    repo_cls.return_value.clear_contact_id.assert_called_once_with(5001)
+
+
+# ---------------------------------------------------------------
+# LeadProcessor with index
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_index_hit_skips_find_by_phone():
+    index = ContactIndex(FakeRedis())
+    processor, contacts, _ = make_processor(index)
+    patcher, _ = patch_db_contact_id(5001)
+    try:
+        contact = await processor._find_contact(PHONE, session=AsyncMock())
+        contact_again = await processor._find_contact(PHONE, session=AsyncMock())
+    finally:
+        patcher.stop()
+
+    assert contact.contact_id == contact_again.contact_id == 5001
+    contacts.find_by_phone.assert_not_called()
+    # Repeat tag is sent once, then remembered
+    contacts.update.assert_called_once_with(5001)
+
+
+@pytest.mark.asyncio
+async def test_crm_contact_already_tagged_is_not_patched():
+    index = ContactIndex(FakeRedis())
+    existing = {"id": 5003, "_embedded": {"tags": [{"name": "telegram_repeat"}]}}
+    processor, contacts, _ = make_processor(index, find_result=existing)
+    patcher, _ = patch_db_contact_id(None)
+    try:
+        contact = await processor._find_contact(PHONE, session=AsyncMock())
+    finally:
+        patcher.stop()
+
+    assert contact.contact_id == 5003
+    contacts.update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stale_cached_contact_is_invalidated_on_404():
+    redis = FakeRedis()
+    index = ContactIndex(redis)
+    await index.remember(PHONE, 4040, repeat_tagged=True)
+    processor, contacts, leads = make_processor(index)
+    leads.create.side_effect = [AmoCRMError("not found", status=404), 2001]
+    patcher, _ = patch_db_contact_id(None)
+    try:
+        contact_id, lead_id = await processor._create_crm_lead(
+            phone=PHONE,
+            name="Ivan",
+            telegram_id=1,
+            telegram_username=None,
+            service_type="sell",
+            data={},
+            session=AsyncMock(),
+        )
+    finally:
+        patcher.stop()
+
+    assert (contact_id, lead_id) == (1001, 2001)
+    contacts.find_by_phone.assert_called_once_with(PHONE)
+    contacts.create.assert_called_once()
+    assert redis.data["amocrm:contact:" + PHONE] == "1001:0"
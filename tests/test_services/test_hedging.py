@@ -0,0 +1,51 @@
+"""Tests for latency windows and the hedge budget."""
+
+from src.services.openai_client.hedging import HedgeBudget, LatencyWindow
+
+
+class TestLatencyWindow:
+    def test_no_percentile_until_min_samples(self):
+        window = LatencyWindow(size=10, min_samples=3)
+        window.observe(1.0)
+        window.observe(2.0)
+        assert window.percentile(0.9) is None
+        window.observe(3.0)
+        assert window.percentile(0.9) == 3.0
+
+    def test_nearest_rank(self):
+        window = LatencyWindow(size=100, min_samples=1)
+        for ms in range(1, 101):
+            window.observe(ms / 1000)
+        assert window.percentile(0.9) == 0.09
+        assert window.percentile(0.99) == 0.099
+        assert window.percentile(1.0) == 0.1
+
+    def test_keeps_only_recent_samples(self):
+        window = LatencyWindow(size=5, min_samples=1)
+        for seconds in (10.0,) * 5 + (1.0,) * 5:
+            window.observe(seconds)
+        assert len(window) == 5
+        assert window.percentile(1.0) == 1.0
+
+
+class TestHedgeBudget:
+    def test_starts_with_burst(self):
+        budget = HedgeBudget(ratio=0.1, burst=2)
+        assert budget.spend() is True
+        assert budget.spend() is True
+        assert budget.spend() is False
+
+    def test_earns_ratio_per_request(self):
+        budget = HedgeBudget(ratio=0.25, burst=1)
+        assert budget.spend() is True
+        for _ in range(3):
+            budget.earn()
+        assert budget.spend() is False
+        budget.earn()
+        assert budget.spend() is True
+
+    def test_savings_capped_at_burst(self):
+        budget = HedgeBudget(ratio=0.5, burst=2)
+        for _ in range(100):
+            budget.earn()
+        assert budget.tokens == 2
@@ -0,0 +1,113 @@
+"""Tests for per-endpoint AmoCRM request metrics."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.services.amocrm.client import AmoCRMClient, AmoCRMError
+from src.services.amocrm.instrumentation import (
+    RESPONSES,
+    endpoint_metrics,
+    path_template,
+)
+from src.services.amocrm.rate_limiter import PriorityRateLimiter
+
+
+def test_path_template_replaces_ids():
+    assert path_template("/api/v4/leads/123/notes") == "/api/v4/leads/{id}/notes"
+    assert path_template("/api/v4/contacts/42") == "/api/v4/contacts/{id}"
+    assert path_template("/api/v4/leads") == "/api/v4/leads"
+
+
+def test_path_template_is_interned():
+    a = path_template("/api/v4/leads/" + str(1001) + "/notes")
+    b = path_template("/api/v4/leads/" + str(2002) + "/notes")
+    assert a is b
+
+
+def test_path_template_cached_for_constant_paths():
+    path_template.cache_clear()
+    for _ in range(3):
+        path_template("/api/v4/leads")
+    assert path_template.cache_info().hits == 2
+
+
+def test_endpoint_metrics_reused_across_ids():
+    assert endpoint_metrics("POST", "/api/v4/leads/1/notes") is endpoint_metrics(
+        "POST", "/api/v4/leads/2/notes"
+    )
+
+
+@pytest.fixture
+async def crm_server():
+    calls = {"n": 0}
+
+    async def create_leads(request: web.Request) -> web.Response:
+        calls["n"] += 1
+        if calls["n"] == 1:
+            return web.Response(status=429, text="slow down", headers={"Retry-After": "0"})
+        body = await request.json()
+        return web.json_response({"_embedded": {"leads": [{"id": 1, "n": len(body)}]}})
+
+    async def get_lead(_request: web.Request) -> web.Response:
+        return web.Response(status=400, text="bad request")
+
+    app = web.Application()
+    app.router.add_post("/api/v4/leads", create_leads)
+    app.router.add_get("/api/v4/leads/{lead_id}", get_lead)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+def _client(server: TestServer, session: aiohttp.ClientSession) -> AmoCRMClient:
+    auth = MagicMock()
+    auth.get_access_token = AsyncMock(return_value="token")
+    auth.base_url = str(server.make_url("")).rstrip("/")
+    return AmoCRMClient(
+        auth, http_session=session, rate_limiter=PriorityRateLimiter(rate=0, burst=1),
+    )
+
+
+@pytest.mark.asyncio
+async def test_request_records_status_attempts_bytes_and_latency(crm_server):
+    endpoint = endpoint_metrics("POST", "/api/v4/leads")
+    before = {
+        "429": RESPONSES.labels("POST", "/api/v4/leads", "429").value,
+        "200": RESPONSES.labels("POST", "/api/v4/leads", "200").value,
+        "sent": endpoint.sent_bytes.value,
+        "received": endpoint.received_bytes.value,
+        "calls": endpoint.call_duration.count,
+        "attempts": endpoint.attempts.sum,
+        "latency": endpoint.duration.count,
+    }
+
+    async with aiohttp.ClientSession() as session:
+        result = await _client(crm_server, session).post(
+            "/api/v4/leads", json=[{"name": "Lead"}],
+        )
+
+    assert result["_embedded"]["leads"][0]["n"] == 1
+    assert RESPONSES.labels("POST", "/api/v4/leads", "429").value == before["429"] + 1
+    assert RESPONSES.labels("POST", "/api/v4/leads", "200").value == before["200"] + 1
+    assert endpoint.sent_bytes.value - before["sent"] == 2 * len(b'[{"name": "Lead"}]')
+    assert endpoint.received_bytes.value > before["received"]
+    assert endpoint.call_duration.count == before["calls"] + 1
+    assert endpoint.attempts.sum == before["attempts"] + 2
+    assert endpoint.duration.count == before["latency"] + 2
+
+
+@pytest.mark.asyncio
+async def test_error_status_recorded_under_path_template(crm_server):
+    counter = RESPONSES.labels("GET", "/api/v4/leads/{id}", "400")
+    before = counter.value
+
+    async with aiohttp.ClientSession() as session:
+        with pytest.raises(AmoCRMError):
+            await _client(crm_server, session).get("/api/v4/leads/777")
+
+    assert counter.value == before + 1
@@ -20,6 +20,7 @@ def make_processor(
 
     leads_svc = MagicMock()
     leads_svc.create = AsyncMock(return_value=create_lead_id)
+    leads_svc.create_complex = AsyncMock(return_value=(create_lead_id, create_contact_id))
 
     notes = MagicMock()
     notes.add_to_lead = AsyncMock(return_value=create_note_id)
@@ -37,6 +38,15 @@ def make_processor(
     return processor, mocks
 
 
+def make_db_lead(lead_id=10, **kwargs):
+    """DB lead with no pipeline stage checkpointed yet."""
+    kwargs.setdefault("amo_contact_id", None)
+    kwargs.setdefault("amo_lead_id", None)
+    kwargs.setdefault("amo_note_id", None)
+    kwargs.setdefault("retry_count", 0)
+    return MagicMock(id=lead_id, **kwargs)
+
+
 def make_session():
     """Create a mock DB session with user/lead repos."""
     session = AsyncMock()
@@ -79,10 +89,10 @@ async def test_lead_processor_happy_path_new_contact():
         mock_user.amo_contact_id = None
         MockUserRepo.return_value.create_or_update = AsyncMock(return_value=mock_user)
 
-        mock_lead = MagicMock()
-        mock_lead.id = 10
+        mock_lead = make_db_lead()
         MockLeadRepo.return_value.create = AsyncMock(return_value=mock_lead)
         MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
 
         result = await processor.process(
             session=session,
@@ -112,10 +122,10 @@ async def test_lead_processor_existing_contact():
         mock_user.id = 1
         MockUserRepo.return_value.create_or_update = AsyncMock(return_value=mock_user)
 
-        mock_lead = MagicMock()
-        mock_lead.id = 10
+        mock_lead = make_db_lead()
         MockLeadRepo.return_value.create = AsyncMock(return_value=mock_lead)
         MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
 
         result = await processor.process(
             session=session,
@@ -148,10 +158,10 @@ async def test_lead_processor_crm_failure():
         mock_user.id = 1
         MockUserRepo.return_value.create_or_update = AsyncMock(return_value=mock_user)
 
-        mock_lead = MagicMock()
-        mock_lead.id = 10
+        mock_lead = make_db_lead()
         MockLeadRepo.return_value.create = AsyncMock(return_value=mock_lead)
         MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
 
         result = await processor.process(
             session=session,
@@ -169,6 +179,146 @@ async def test_lead_processor_crm_failure():
     mock_notify.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_failure_alert_goes_to_digest_by_error_class():
+    from src.services.amocrm.client import AmoCRMError
+
+    processor, mocks = make_processor()
+    alerts = MagicMock(record=AsyncMock())
+    processor._alerts = alerts
+    mocks["leads"].create.side_effect = AmoCRMError("Service Unavailable", status=503)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock) as mock_notify:
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        await processor._deliver(
+            make_session(), None, make_db_lead(), TELEGRAM_USER, "sell", SELL_DATA,
+        )
+
+    mock_notify.assert_not_called()
+    key, text = alerts.record.call_args.args
+    assert key == "Не отправлены в AmoCRM (AmoCRM 503)"
+    assert "#10" in text
+
+
+def test_error_class():
+    from src.services.amocrm.client import AmoCRMDeadlineExceeded, AmoCRMError
+    from src.services.lead_processor import error_class
+
+    assert error_class(AmoCRMError("x", status=503)) == "AmoCRM 503"
+    assert error_class(AmoCRMDeadlineExceeded("x")) == "AmoCRM timeout"
+    assert error_class(AmoCRMError("x")) == "AmoCRM"
+    assert error_class(TimeoutError()) == "TimeoutError"
+
+
+@pytest.mark.asyncio
+async def test_lead_processor_circuit_open_saves_lead_without_alert():
+    """Open circuit -> lead saved as error for later delivery, no per-lead alert."""
+    from src.services.amocrm.client import AmoCRMCircuitOpen
+
+    processor, mocks = make_processor()
+    mocks["contacts"].find_by_phone.side_effect = AmoCRMCircuitOpen("circuit open")
+    session = make_session()
+
+    with patch("src.services.lead_processor.UserRepository") as MockUserRepo, \
+         patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock) as mock_notify:
+
+        mock_user = MagicMock()
+        mock_user.id = 1
+        MockUserRepo.return_value.create_or_update = AsyncMock(return_value=mock_user)
+
+        mock_lead = make_db_lead()
+        MockLeadRepo.return_value.create = AsyncMock(return_value=mock_lead)
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+
+        result = await processor.process(
+            session=session,
+            telegram_user=TELEGRAM_USER,
+            service_type="sell",
+            data=SELL_DATA,
+        )
+
+    assert result is False
+    assert MockLeadRepo.return_value.update_status.call_args.kwargs["status"] == "error"
+    mock_notify.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_circuit_open_does_not_use_up_retries():
+    """A claimed lead rejected by the breaker gets its attempt back, never goes dead."""
+    from src.services.amocrm.client import AmoCRMCircuitOpen
+
+    processor, mocks = make_processor()
+    mocks["contacts"].find_by_phone.side_effect = AmoCRMCircuitOpen("circuit open")
+    db_lead = make_db_lead(retry_count=5, status="retrying")
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock) as mock_notify:
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.unclaim = AsyncMock(return_value=1)
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        result = await processor._deliver(
+            make_session(), None, db_lead, TELEGRAM_USER, "sell", SELL_DATA, alert=False,
+        )
+
+    assert result is False
+    MockLeadRepo.return_value.unclaim.assert_awaited_once_with([10])
+    kwargs = MockLeadRepo.return_value.update_status.call_args.kwargs
+    assert kwargs["status"] == "error"
+    assert kwargs["next_retry_at"] is not None
+    mock_notify.assert_not_called()
+
+
+# ---------------------------------------------------------------
+# Complex pipeline mode
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_complex_mode_creates_contact_and_lead_in_one_call():
+    processor, mocks = make_processor(find_contact_result=None)
+
+    with patch("src.services.lead_processor.settings") as mock_settings:
+        mock_settings.AMOCRM_PIPELINE_MODE = "complex"
+        contact_id, lead_id = await processor._create_crm_lead(
+            phone="+79991234567",
+            name="Ivan",
+            telegram_id=123456,
+            telegram_username="testuser",
+            service_type="sell",
+            data=SELL_DATA,
+        )
+
+    assert (contact_id, lead_id) == (1001, 2001)
+    mocks["leads"].create_complex.assert_called_once()
+    contact = mocks["leads"].create_complex.call_args.kwargs["contact"]
+    assert contact["name"] == "Ivan"
+    mocks["contacts"].create.assert_not_called()
+    mocks["leads"].create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_complex_mode_existing_contact_uses_classic_lead():
+    processor, mocks = make_processor(find_contact_result={"id": 5001})
+
+    with patch("src.services.lead_processor.settings") as mock_settings:
+        mock_settings.AMOCRM_PIPELINE_MODE = "complex"
+        contact_id, _ = await processor._create_crm_lead(
+            phone="+79991234567",
+            name="Ivan",
+            telegram_id=123456,
+            telegram_username=None,
+            service_type="sell",
+            data=SELL_DATA,
+        )
+
+    assert contact_id == 5001
+    mocks["leads"].create.assert_called_once()
+    mocks["leads"].create_complex.assert_not_called()
+
+
 # ---------------------------------------------------------------
 # Data persistence
 # ---------------------------------------------------------------
@@ -186,10 +336,10 @@ async def test_lead_processor_saves_user():
         mock_user.id = 1
         MockUserRepo.return_value.create_or_update = AsyncMock(return_value=mock_user)
 
-        mock_lead = MagicMock()
-        mock_lead.id = 10
+        mock_lead = make_db_lead()
         MockLeadRepo.return_value.create = AsyncMock(return_value=mock_lead)
         MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
 
         await processor.process(
             session=session,
@@ -204,3 +354,458 @@ async def test_lead_processor_saves_user():
         first_name="Ivan",
         phone="+79991234567",
     )
+
+
+# ---------------------------------------------------------------
+# Concurrent submissions for the same phone
+# ---------------------------------------------------------------
+
+def make_mock_crm_processor():
+    from src.services.amocrm.contacts import ContactsService
+    from src.services.amocrm.leads import LeadsService
+    from src.services.amocrm.mock import MockAmoCRMClient
+    from src.services.amocrm.notes import NotesService
+    from src.utils.singleflight import SingleFlight
+
+    client = MockAmoCRMClient(latency=0.02)
+    client.post = AsyncMock(side_effect=client.post)
+    bot = MagicMock()
+    processor = LeadProcessor(
+        ContactsService(client), LeadsService(client), NotesService(client), bot,
+        contact_flights=SingleFlight("test_contact"),
+    )
+    return processor, client
+
+
+def contact_creations(client) -> int:
+    return sum(
+        1 for call in client.post.call_args_list
+        if call.args[0] == "/api/v4/contacts"
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_create_one_contact():
+    import asyncio
+
+    processor, client = make_mock_crm_processor()
+
+    results = await asyncio.gather(*(
+        processor._create_crm_lead(
+            phone=phone,
+            name="Ivan",
+            telegram_id=123456,
+            telegram_username=None,
+            service_type="sell",
+            data=SELL_DATA,
+        )
+        # Same number written two ways: keyed by the normalized phone
+        for phone in ["+79991234567", "89991234567"] * 4
+    ))
+
+    assert contact_creations(client) == 1
+    assert len({contact_id for contact_id, _ in results}) == 1
+    assert len({lead_id for _, lead_id in results}) == 8
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_complex_mode_one_contact():
+    import asyncio
+
+    processor, client = make_mock_crm_processor()
+
+    with patch("src.services.lead_processor.settings") as mock_settings:
+        mock_settings.AMOCRM_PIPELINE_MODE = "complex"
+        results = await asyncio.gather(*(
+            processor._create_crm_lead(
+                phone="+79991234567",
+                name="Ivan",
+                telegram_id=123456,
+                telegram_username=None,
+                service_type="sell",
+                data=SELL_DATA,
+            )
+            for _ in range(5)
+        ))
+
+    complex_calls = [
+        call for call in client.post.call_args_list
+        if call.args[0] == "/api/v4/leads/complex"
+    ]
+    assert len(complex_calls) == 1
+    assert contact_creations(client) == 0
+    assert len({contact_id for contact_id, _ in results}) == 1
+    assert len({lead_id for _, lead_id in results}) == 5
+
+
+# ---------------------------------------------------------------
+# Outbox: enqueue / deliver
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_enqueue_saves_lead_and_outbox_row_without_crm_calls():
+    processor, mocks = make_processor()
+    session = make_session()
+
+    with patch("src.services.lead_processor.UserRepository") as MockUserRepo, \
+         patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.OutboxRepository") as MockOutboxRepo:
+        MockUserRepo.return_value.create_or_update = AsyncMock(return_value=MagicMock(id=1))
+        MockLeadRepo.return_value.create = AsyncMock(return_value=MagicMock(id=10))
+        MockOutboxRepo.return_value.add = AsyncMock()
+
+        lead_id = await processor.enqueue(
+            session, TELEGRAM_USER, "sell", SELL_DATA, chat_id=555, message_id=77,
+        )
+
+    assert lead_id == 10
+    MockLeadRepo.return_value.create.assert_called_once()
+    assert MockLeadRepo.return_value.create.call_args.kwargs["status"] == "pending"
+    MockOutboxRepo.return_value.add.assert_called_once_with(10, 555, 77)
+    session.commit.assert_called_once()
+    mocks["leads"].create.assert_not_called()
+    mocks["contacts"].find_by_phone.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_deliver_sends_saved_lead():
+    processor, mocks = make_processor()
+    session = make_session()
+
+    db_lead = make_db_lead(status="pending", service_type="sell", data=SELL_DATA)
+    db_lead.user = MagicMock(telegram_id=123456, username="testuser", first_name="Ivan")
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.get_with_user = AsyncMock(return_value=db_lead)
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+
+        result = await processor.deliver(session, 10)
+
+    assert result is True
+    mocks["leads"].create.assert_called_once()
+    mocks["notes"].add_to_lead.assert_called_once()
+    assert db_lead.user.amo_contact_id == 1001
+    MockLeadRepo.return_value.update_status.assert_called_once_with(
+        lead_id=10, status="sent", amo_lead_id=2001,
+    )
+
+
+@pytest.mark.asyncio
+async def test_deliver_is_idempotent_for_sent_lead():
+    processor, mocks = make_processor()
+    session = make_session()
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.get_with_user = AsyncMock(
+            return_value=MagicMock(id=10, status="sent"),
+        )
+
+        result = await processor.deliver(session, 10)
+
+    assert result is True
+    mocks["leads"].create.assert_not_called()
+    mocks["notes"].add_to_lead.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_deliver_missing_lead_returns_none():
+    processor, mocks = make_processor()
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.get_with_user = AsyncMock(return_value=None)
+        result = await processor.deliver(make_session(), 10)
+
+    assert result is None
+    mocks["leads"].create.assert_not_called()
+
+
+# ---------------------------------------------------------------
+# Pipeline checkpoints
+# ---------------------------------------------------------------
+
+async def _deliver_lead(processor, db_lead):
+    db_lead.status = "error"
+    db_lead.service_type = "sell"
+    db_lead.data = SELL_DATA
+    db_lead.user = MagicMock(telegram_id=123456, username="testuser", first_name="Ivan")
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock):
+        MockLeadRepo.return_value.get_with_user = AsyncMock(return_value=db_lead)
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        return await processor.deliver(make_session(), db_lead.id)
+
+
+@pytest.mark.asyncio
+async def test_note_failure_keeps_crm_lead_and_retry_only_adds_note():
+    processor, mocks = make_processor()
+    mocks["notes"].add_to_lead.side_effect = [RuntimeError("timeout"), 3001]
+    db_lead = make_db_lead()
+
+    assert await _deliver_lead(processor, db_lead) is False
+    assert (db_lead.amo_contact_id, db_lead.amo_lead_id) == (1001, 2001)
+    assert db_lead.amo_note_id is None
+
+    assert await _deliver_lead(processor, db_lead) is True
+    assert db_lead.amo_note_id == 3001
+    mocks["contacts"].find_by_phone.assert_called_once()
+    mocks["contacts"].create.assert_called_once()
+    mocks["leads"].create.assert_called_once()
+    assert mocks["notes"].add_to_lead.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_lead_create_failure_keeps_contact_for_retry():
+    processor, mocks = make_processor()
+    mocks["leads"].create.side_effect = [RuntimeError("timeout"), 2001]
+    db_lead = make_db_lead()
+
+    assert await _deliver_lead(processor, db_lead) is False
+    assert db_lead.amo_contact_id == 1001
+    assert db_lead.amo_lead_id is None
+
+    assert await _deliver_lead(processor, db_lead) is True
+    mocks["contacts"].find_by_phone.assert_called_once()
+    mocks["contacts"].create.assert_called_once()
+    assert mocks["leads"].create.call_args.kwargs["contact_id"] == 1001
+
+
+@pytest.mark.asyncio
+async def test_checkpointed_contact_gone_is_resolved_again():
+    from src.services.amocrm.client import AmoCRMError
+
+    processor, mocks = make_processor()
+    mocks["leads"].create.side_effect = [AmoCRMError("not found", status=404), 2001]
+    db_lead = make_db_lead(amo_contact_id=4040)
+
+    assert await _deliver_lead(processor, db_lead) is True
+    mocks["contacts"].find_by_phone.assert_called_once()
+    assert db_lead.amo_contact_id == 1001
+    assert mocks["leads"].create.call_args.kwargs["contact_id"] == 1001
+
+
+# ---------------------------------------------------------------
+# Retry schedule
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_failure_schedules_retry_with_backoff():
+    from datetime import datetime, timedelta, timezone
+
+    processor, mocks = make_processor()
+    mocks["leads"].create.side_effect = RuntimeError("timeout")
+    db_lead = make_db_lead(retry_count=2)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock):
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        before = datetime.now(timezone.utc)
+        await processor._deliver(
+            make_session(), None, db_lead, TELEGRAM_USER, "sell", SELL_DATA, alert=False,
+        )
+
+    kwargs = MockLeadRepo.return_value.update_status.call_args.kwargs
+    assert kwargs["status"] == "error"
+    # Third retry: initial 60s * 2**2, minus up to half of it as jitter
+    delay = kwargs["next_retry_at"] - before
+    assert timedelta(seconds=119) <= delay <= timedelta(seconds=241)
+    # Retry schedulers are woken to pick up the new due time
+    MockLeadRepo.return_value.notify_retry.assert_awaited_once_with("lead_failed")
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_dead_letter_the_lead():
+    processor, mocks = make_processor()
+    mocks["leads"].create.side_effect = RuntimeError("timeout")
+    db_lead = make_db_lead(retry_count=5)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.notify_admin", new_callable=AsyncMock) as mock_notify:
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        result = await processor._deliver(
+            make_session(), None, db_lead, TELEGRAM_USER, "sell", SELL_DATA, alert=False,
+        )
+
+    assert result is False
+    kwargs = MockLeadRepo.return_value.update_status.call_args.kwargs
+    assert kwargs["status"] == "dead"
+    assert kwargs["next_retry_at"] is None
+    MockLeadRepo.return_value.notify_retry.assert_not_called()
+    # Dead letters need a human even when per-lead alerts are off
+    mock_notify.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sleeps_until_earliest_due_lead():
+    from datetime import datetime, timedelta, timezone
+
+    from src.services.lead_processor import MIN_RETRY_SLEEP_SECONDS, seconds_until_next_retry
+
+    async def delay_for(due):
+        with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+            MockLeadRepo.return_value.next_retry_due = AsyncMock(return_value=due)
+            return await seconds_until_next_retry(make_session_factory(), ceiling=300)
+
+    now = datetime.now(timezone.utc)
+    assert await delay_for(None) == 300
+    assert 89 <= await delay_for(now + timedelta(seconds=90)) <= 90
+    assert await delay_for(now + timedelta(hours=1)) == 300
+    assert await delay_for(now - timedelta(minutes=1)) == MIN_RETRY_SLEEP_SECONDS
+
+
+# ---------------------------------------------------------------
+# Retry sweep
+# ---------------------------------------------------------------
+
+def make_session_factory():
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=make_session())
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_retry_sweep_claims_batches_with_bounded_concurrency():
+    import asyncio
+
+    from src.services.lead_processor import _retry_failed_leads
+
+    processor, _ = make_processor()
+    in_flight = peak = 0
+
+    async def deliver(session, lead_id, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return lead_id != 3
+
+    processor.deliver = AsyncMock(side_effect=deliver)
+    batches = [[1, 2, 3, 4], [5, 6, 7, 8], [9]]
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.claim_failed_leads = AsyncMock(side_effect=batches)
+        MockLeadRepo.return_value.rescue_stale_pending = AsyncMock(return_value=0)
+        retried = await _retry_failed_leads(
+            make_session_factory(), processor, batch_size=4, concurrency=2,
+        )
+
+    assert retried == 8
+    assert peak == 2
+    assert MockLeadRepo.return_value.claim_failed_leads.call_count == 3
+    assert processor.deliver.call_count == 9
+    # Retries neither alert per lead nor run under the confirm:send budget
+    assert processor.deliver.call_args.kwargs == {"deadline": 0, "alert": False}
+
+
+@pytest.mark.asyncio
+async def test_retry_sweep_stops_when_circuit_opens():
+    from src.services.lead_processor import _retry_failed_leads
+
+    processor, _ = make_processor()
+    processor.deliver = AsyncMock(return_value=True)
+    breaker = MagicMock(is_open=True)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.all_breakers", return_value=[breaker]):
+        MockLeadRepo.return_value.claim_failed_leads = AsyncMock(return_value=[1, 2])
+        MockLeadRepo.return_value.rescue_stale_pending = AsyncMock(return_value=0)
+        retried = await _retry_failed_leads(make_session_factory(), processor)
+
+    assert retried == 0
+    MockLeadRepo.return_value.claim_failed_leads.assert_not_called()
+    processor.deliver.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_retry_sweep_gives_back_leads_skipped_by_open_circuit():
+    from src.services.lead_processor import _retry_failed_leads
+
+    processor, _ = make_processor()
+    breaker = MagicMock(is_open=False)
+
+    async def deliver(session, lead_id, **kwargs):
+        breaker.is_open = True
+        return False
+
+    processor.deliver = AsyncMock(side_effect=deliver)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.all_breakers", return_value=[breaker]):
+        MockLeadRepo.return_value.claim_failed_leads = AsyncMock(return_value=[1, 2, 3])
+        MockLeadRepo.return_value.rescue_stale_pending = AsyncMock(return_value=0)
+        MockLeadRepo.return_value.unclaim = AsyncMock(return_value=2)
+        await _retry_failed_leads(make_session_factory(), processor, concurrency=1)
+
+    processor.deliver.assert_awaited_once()
+    MockLeadRepo.return_value.unclaim.assert_awaited_once_with([2, 3])
+
+
+@pytest.mark.asyncio
+async def test_retry_sweep_stops_claiming_once_stopped():
+    import asyncio
+
+    from src.services.lead_processor import _retry_failed_leads
+
+    processor, _ = make_processor()
+    stop = asyncio.Event()
+
+    async def deliver(session, lead_id, **kwargs):
+        stop.set()
+        return True
+
+    processor.deliver = AsyncMock(side_effect=deliver)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.claim_failed_leads = AsyncMock(return_value=[1, 2])
+        MockLeadRepo.return_value.rescue_stale_pending = AsyncMock(return_value=0)
+        retried = await _retry_failed_leads(
+            make_session_factory(), processor, batch_size=2, stop=stop,
+        )
+
+    # The claimed batch is finished, no further batch is claimed
+    assert retried == 2
+    MockLeadRepo.return_value.claim_failed_leads.assert_awaited_once()
+
+
+# ---------------------------------------------------------------
+# Shutdown
+# ---------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_cancelled_delivery_is_released_for_retry():
+    import asyncio
+
+    from src.services import lead_processor
+
+    processor, mocks = make_processor()
+    started = asyncio.Event()
+
+    async def hang(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    mocks["leads"].create.side_effect = hang
+    db_lead = make_db_lead(lead_id=77)
+    with patch("src.services.lead_processor.LeadRepository"):
+        task = asyncio.create_task(processor._deliver(
+            make_session(), None, db_lead, TELEGRAM_USER, "sell", SELL_DATA, deadline=0,
+        ))
+        await started.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with patch("src.services.lead_processor.LeadRepository") as MockLeadRepo, \
+         patch("src.services.lead_processor.OutboxRepository") as MockOutboxRepo:
+        MockLeadRepo.return_value.release_unfinished = AsyncMock(return_value=1)
+        MockOutboxRepo.return_value.release = AsyncMock()
+        assert await lead_processor.release_unfinished(make_session_factory()) == 1
+
+    MockLeadRepo.return_value.release_unfinished.assert_awaited_once_with([77])
+    MockOutboxRepo.return_value.release.assert_awaited_once_with([77])
+    # Released once: nothing left for the next call
+    assert await lead_processor.release_unfinished(make_session_factory()) == 0
@@ -0,0 +1,196 @@
+"""Tests for AmoCRM account metadata and field mapping compilation."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.config import settings
+from src.services.amocrm.leads import LeadsService
+from src.services.amocrm.metadata import (
+    AccountMetadata,
+    MetadataCache,
+    compile_field_mapping,
+    parse_number,
+)
+from src.services.amocrm.mock import MockAmoCRMClient
+
+
+@pytest.fixture
+def field_settings(monkeypatch):
+    values = {
+        "AMOCRM_FIELD_SERVICE_TYPE": 10,
+        "AMOCRM_FIELD_SOURCE": 0,
+        "AMOCRM_FIELD_CAR_BRAND": 11,
+        "AMOCRM_FIELD_MILEAGE": 12,
+        "AMOCRM_FIELD_TRANSMISSION": 13,
+        "AMOCRM_FIELD_VIN_NUMBER": 99,
+        "AMOCRM_FIELD_TELEGRAM_ID": 20,
+        "AMOCRM_FIELD_TELEGRAM_USERNAME": 0,
+        "AMOCRM_PIPELINE_ID": 500,
+        "AMOCRM_STATUS_ID": 501,
+    }
+    for name in (
+        "AMOCRM_FIELD_CAR_YEAR", "AMOCRM_FIELD_BUDGET", "AMOCRM_FIELD_DRIVE_TYPE",
+        "AMOCRM_FIELD_BODY_TYPE", "AMOCRM_FIELD_CHECK_TYPE",
+    ):
+        values[name] = 0
+    for name, value in values.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+LEAD_FIELDS = [
+    {"id": 10, "name": "Услуга", "type": "text", "enums": None},
+    {"id": 11, "name": "Марка", "type": "text", "enums": None},
+    {"id": 12, "name": "Пробег", "type": "numeric", "enums": None},
+    {
+        "id": 13, "name": "КПП", "type": "select",
+        "enums": [{"id": 131, "value": "Автомат"}, {"id": 132, "value": "Механика"}],
+    },
+]
+CONTACT_FIELDS = [{"id": 20, "name": "Telegram ID", "type": "text", "enums": None}]
+PIPELINES = [{"id": 500, "_embedded": {"statuses": [{"id": 501}, {"id": 502}]}}]
+
+
+def test_compile_without_metadata_uses_configured_ids(field_settings):
+    field_map = compile_field_mapping()
+
+    assert field_map.service_type.field_id == 10
+    assert field_map.source is None
+    assert [(f.data_key, f.field_id) for f in field_map.data] == [
+        ("car_brand", 11), ("mileage", 12), ("transmission", 13), ("vin", 99),
+    ]
+    assert field_map.problems == ()
+
+
+def test_compile_with_metadata_drops_and_reports_unknown_ids(field_settings):
+    metadata = AccountMetadata(
+        lead_fields={f["id"]: f for f in LEAD_FIELDS},
+        contact_fields={},
+        pipelines={500: {502}},
+    )
+
+    field_map = compile_field_mapping(metadata)
+
+    assert [f.data_key for f in field_map.data] == ["car_brand", "mileage", "transmission"]
+    assert field_map.data[1].value_type == "numeric"
+    problems = "\n".join(field_map.problems)
+    assert "AMOCRM_FIELD_VIN_NUMBER=99" in problems
+    assert "AMOCRM_FIELD_TELEGRAM_ID=20" in problems
+    assert "AMOCRM_STATUS_ID=501" in problems
+
+
+@pytest.mark.asyncio
+async def test_cache_loads_metadata_from_mock_client(field_settings):
+    client = MockAmoCRMClient(
+        lead_fields=LEAD_FIELDS, contact_fields=CONTACT_FIELDS, pipelines=PIPELINES,
+    )
+    cache = MetadataCache(client)
+
+    problems = await cache.load()
+
+    assert problems == ["AMOCRM_FIELD_VIN_NUMBER=99: no such lead field"]
+    assert cache.metadata.pipelines == {500: {501, 502}}
+    assert 99 not in {f.field_id for f in cache.field_map.data}
+
+
+@pytest.mark.asyncio
+async def test_mock_serves_configured_metadata_by_default(field_settings):
+    cache = MetadataCache(MockAmoCRMClient())
+
+    assert await cache.load() == []
+
+
+@pytest.mark.asyncio
+async def test_leads_use_compiled_value_types(field_settings):
+    client = MockAmoCRMClient(
+        lead_fields=LEAD_FIELDS, contact_fields=CONTACT_FIELDS, pipelines=PIPELINES,
+    )
+    client.post = AsyncMock(side_effect=client.post)
+    cache = MetadataCache(client)
+    await cache.load()
+    service = LeadsService(client, metadata=cache)
+
+    await service.create(
+        title="Продажа",
+        contact_id=1,
+        service_type="sell",
+        data={
+            "car_brand": "Toyota",
+            "mileage": "85 000 км",
+            "transmission": "автомат",
+            "vin": "XW8ZZZ",
+        },
+    )
+
+    lead = client.post.call_args.kwargs["json"][0]
+    values = {cf["field_id"]: cf["values"][0] for cf in lead["custom_fields_values"]}
+    assert values == {
+        10: {"value": "Продажа авто"},
+        11: {"value": "Toyota"},
+        12: {"value": "85000"},
+        13: {"enum_id": 131},
+    }
+
+
+@pytest.mark.asyncio
+async def test_unmatched_enum_value_is_skipped(field_settings):
+    metadata = AccountMetadata(lead_fields={f["id"]: f for f in LEAD_FIELDS})
+    transmission = compile_field_mapping(metadata).data[2]
+
+    assert transmission.encode("Вариатор") is None
+    assert transmission.encode(" Механика ") == {"enum_id": 132}
+
+
+@pytest.mark.parametrize("value, number", [
+    ("85 000 км", "85000"),
+    ("до 1 500 000 руб.", "1500000"),
+    ("500 000 - 1 000 000", "1000000"),
+    ("от 3 000 000", "3000000"),
+    ("2,5", "2.5"),
+    (120000, "120000"),
+    ("1,5 млн", None),
+    ("2018 или 2019", None),
+    ("Указать свой", None),
+])
+def test_parse_number(value, number):
+    assert parse_number(value) == number
+
+
+@pytest.mark.asyncio
+async def test_value_that_is_not_a_number_is_skipped(field_settings, caplog):
+    metadata = AccountMetadata(lead_fields={f["id"]: f for f in LEAD_FIELDS})
+    cache = MetadataCache(MagicMock())
+    cache.field_map = compile_field_mapping(metadata)
+    service = LeadsService(MagicMock(), metadata=cache)
+
+    lead = service._build_lead("Продажа", "sell", {"mileage": "около 100 тыс"})
+
+    assert 12 not in {cf["field_id"] for cf in lead["custom_fields_values"]}
+    assert "doesn't fit numeric field 12" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_custom_fields_are_paginated():
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=[
+        {"_embedded": {"custom_fields": [{"id": 1}]}, "_links": {"next": {"href": "..."}}},
+        {"_embedded": {"custom_fields": [{"id": 2}]}, "_links": {}},
+    ])
+
+    fields = await MetadataCache(client)._fetch_fields("/api/v4/leads/custom_fields")
+
+    assert set(fields) == {1, 2}
+    assert client.get.call_args_list[1].kwargs["params"]["page"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_load_keeps_unvalidated_mapping(field_settings):
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=RuntimeError("down"))
+    cache = MetadataCache(client)
+
+    with pytest.raises(RuntimeError):
+        await cache.load()
+
+    assert cache.metadata is None
+    assert len(cache.field_map.data) == 4
@@ -1,10 +1,13 @@
 """Tests for OpenAI client with smart fallback."""
 
+import asyncio
 import json
+import time
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from src.services.openai_client.client import OpenAIClient
+from src.config import settings
+from src.services.openai_client.client import REQUEST_TIMEOUT, OpenAIClient
 from src.services.openai_client.models import AIResponse
 
 
@@ -250,6 +253,230 @@ async def test_classify_truncates_long_message():
 # AIResponse model
 # ---------------------------------------------------------------
 
+@pytest.mark.asyncio
+async def test_classify_answers_repeated_message_from_cache():
+    from src.services.openai_client.cache import ClassificationCache
+
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(
+        return_value=_make_completion(_good_response())
+    )
+    cache = ClassificationCache(max_entries=10, ttl=60, bucket_digits=False)
+    client = OpenAIClient(client=mock_openai, cache=cache)
+
+    first = await client.classify("Хочу продать Toyota Camry 2022")
+    second = await client.classify("хочу продать  toyota camry 2022")
+
+    mock_openai.chat.completions.create.assert_called_once()
+    assert first.model_used == "gpt-4o-mini"
+    assert second.model_used == "cache:gpt-4o-mini"
+    assert second.entities["brand"] == "Toyota"
+
+
+@pytest.mark.asyncio
+async def test_classify_obvious_message_skips_the_api():
+    from src.services.openai_client.rules import RuleClassifier
+
+    mock_openai = AsyncMock()
+    client = OpenAIClient(client=mock_openai, rules=RuleClassifier())
+
+    result = await client.classify("продам камри 2018")
+
+    mock_openai.chat.completions.create.assert_not_called()
+    assert result.intent == "sell"
+    assert result.model_used == "rules"
+    assert result.entities["year"] == "2018"
+
+
+@pytest.mark.asyncio
+async def test_classify_falls_back_to_rules_when_api_is_down():
+    from src.services.openai_client.rules import RuleClassifier
+
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API down"))
+    client = OpenAIClient(client=mock_openai, rules=RuleClassifier())
+
+    # Below the threshold: the API is tried first
+    result = await client.classify("ищу авто до 1.5 млн")
+
+    assert mock_openai.chat.completions.create.call_count == 2
+    assert result.intent == "buy"
+    assert result.model_used == "rules"
+
+
+@pytest.mark.asyncio
+async def test_classify_prefers_api_answer_below_rules_threshold():
+    from src.services.openai_client.rules import RuleClassifier
+
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(
+        return_value=_make_completion(_good_response(intent="find"))
+    )
+    client = OpenAIClient(client=mock_openai, rules=RuleClassifier())
+
+    result = await client.classify("ищу авто до 1.5 млн")
+
+    assert result.intent == "find"
+    assert result.model_used == "gpt-4o-mini"
+
+
+# ---------------------------------------------------------------
+# Hedging and adaptive timeouts
+# ---------------------------------------------------------------
+
+def _delayed_create(delays: dict[str, float], contents: dict[str, str] | None = None):
+    """``chat.completions.create`` answering each model after its delay."""
+    contents = contents or {}
+    calls = []
+
+    async def create(*, model, **kwargs):
+        calls.append((model, kwargs["timeout"]))
+        await asyncio.sleep(delays[model])
+        return _make_completion(contents.get(model, _good_response()))
+
+    return AsyncMock(side_effect=create), calls
+
+
+def _warm_client(mock_openai, seconds: float = 0.01) -> OpenAIClient:
+    """Client that has already seen enough fast primary calls to hedge."""
+    client = OpenAIClient(client=mock_openai)
+    window = client._window(settings.OPENAI_MODEL)
+    for _ in range(settings.AI_LATENCY_MIN_SAMPLES):
+        window.observe(seconds)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_classify_hedges_slow_primary():
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, calls = _delayed_create(
+        {settings.OPENAI_MODEL: 5.0, settings.OPENAI_FALLBACK_MODEL: 0.02},
+    )
+    client = _warm_client(mock_openai)
+
+    start = time.monotonic()
+    result = await client.classify("Хочу продать Toyota Camry 2022")
+
+    assert time.monotonic() - start < 1.0
+    assert result.used_fallback is True
+    assert result.model_used == settings.OPENAI_FALLBACK_MODEL
+    assert [model for model, _ in calls] == [
+        settings.OPENAI_MODEL, settings.OPENAI_FALLBACK_MODEL,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_lost_hedges_keep_primary_latency_percentiles_up():
+    """Cancelled slow primaries still count, so the hedge delay can't drift down."""
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, _ = _delayed_create(
+        {settings.OPENAI_MODEL: 5.0, settings.OPENAI_FALLBACK_MODEL: 0.01},
+    )
+    client = _warm_client(mock_openai)
+    window = client._window(settings.OPENAI_MODEL)
+
+    delays = [client._hedge_delay()]
+    for _ in range(5):
+        result = await client.classify("Хочу продать Toyota Camry 2022")
+        assert result.used_fallback is True
+        delays.append(client._hedge_delay())
+
+    assert delays == sorted(delays)
+    assert delays[-1] > delays[0]
+    assert len(window) == settings.AI_LATENCY_MIN_SAMPLES + 5
+
+
+@pytest.mark.asyncio
+async def test_classify_hedge_keeps_primary_if_it_answers_first():
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, calls = _delayed_create(
+        {settings.OPENAI_MODEL: 0.05, settings.OPENAI_FALLBACK_MODEL: 5.0},
+    )
+    client = _warm_client(mock_openai)
+
+    result = await client.classify("Хочу продать Toyota Camry 2022")
+
+    assert len(calls) == 2
+    assert result.used_fallback is False
+    assert result.model_used == settings.OPENAI_MODEL
+
+
+@pytest.mark.asyncio
+async def test_classify_hedge_waits_for_fallback_after_weak_primary():
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, _ = _delayed_create(
+        {settings.OPENAI_MODEL: 0.05, settings.OPENAI_FALLBACK_MODEL: 0.2},
+        {settings.OPENAI_MODEL: _low_confidence_response()},
+    )
+    client = _warm_client(mock_openai)
+
+    result = await client.classify("Хочу что-то")
+
+    assert result.used_fallback is True
+    assert result.intent == "sell"
+
+
+@pytest.mark.asyncio
+async def test_classify_does_not_hedge_past_budget(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_BUDGET_BURST", 1.0)
+    monkeypatch.setattr(settings, "AI_HEDGE_BUDGET_RATIO", 0.0)
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, calls = _delayed_create(
+        {settings.OPENAI_MODEL: 0.05, settings.OPENAI_FALLBACK_MODEL: 0.01},
+    )
+    client = _warm_client(mock_openai)
+
+    first = await client.classify("Хочу продать Toyota Camry 2022")
+    second = await client.classify("Хочу продать Toyota Camry 2022")
+
+    assert first.used_fallback is True
+    assert second.used_fallback is False
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_classify_cold_client_uses_fixed_timeout_and_no_hedge():
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create, calls = _delayed_create(
+        {settings.OPENAI_MODEL: 0.05, settings.OPENAI_FALLBACK_MODEL: 0.01},
+    )
+    client = OpenAIClient(client=mock_openai)
+
+    await client.classify("Хочу продать Toyota Camry 2022")
+
+    assert calls == [(settings.OPENAI_MODEL, REQUEST_TIMEOUT)]
+
+
+def test_timeout_adapts_to_observed_latency():
+    client = OpenAIClient(client=MagicMock())
+    window = client._window(settings.OPENAI_MODEL)
+    for _ in range(settings.AI_LATENCY_MIN_SAMPLES):
+        window.observe(1.5)
+    assert client._timeout(settings.OPENAI_MODEL) == 1.5 * settings.AI_TIMEOUT_MULTIPLIER
+
+    for _ in range(settings.AI_LATENCY_WINDOW):
+        window.observe(0.1)
+    assert client._timeout(settings.OPENAI_MODEL) == settings.AI_TIMEOUT_MIN_SECONDS
+
+    for _ in range(settings.AI_LATENCY_WINDOW):
+        window.observe(30.0)
+    assert client._timeout(settings.OPENAI_MODEL) == REQUEST_TIMEOUT
+
+
+@pytest.mark.asyncio
+async def test_timeouts_raise_the_adaptive_timeout():
+    """A model that got slower for good isn't stuck timing out forever."""
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(side_effect=TimeoutError())
+    client = _warm_client(mock_openai, seconds=0.5)
+    before = client._timeout(settings.OPENAI_MODEL)
+
+    for _ in range(settings.AI_LATENCY_WINDOW // 50):
+        await client._call_model("Хочу продать", model=settings.OPENAI_MODEL)
+
+    assert client._timeout(settings.OPENAI_MODEL) > before
+
+
 class TestAIResponse:
     def test_has_intent(self):
         assert AIResponse(intent="sell").has_intent is True
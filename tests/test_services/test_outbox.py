@@ -0,0 +1,187 @@
+"""Tests for the lead outbox delivery workers."""
+
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.services.outbox import LeadOutbox
+
+
+def make_item(item_id=1, lead_id=10, attempts=1, chat_id=555, message_id=77):
+    return MagicMock(
+        id=item_id,
+        lead_id=lead_id,
+        attempts=attempts,
+        chat_id=chat_id,
+        message_id=message_id,
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def make_outbox(deliver_result=True, **kwargs):
+    session = AsyncMock()
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    processor = MagicMock()
+    processor.deliver = AsyncMock(return_value=deliver_result)
+
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    bot.send_message = AsyncMock()
+
+    kwargs.setdefault("workers", 2)
+    kwargs.setdefault("poll_interval", 0.01)
+    outbox = LeadOutbox(factory, processor, bot, "sent", "saved", **kwargs)
+    return outbox, processor, bot, session
+
+
+@pytest.fixture
+def repo():
+    with patch("src.services.outbox.OutboxRepository") as MockRepo:
+        instance = MockRepo.return_value
+        instance.claim = AsyncMock(return_value=[])
+        instance.delete = AsyncMock()
+        instance.renew = AsyncMock(return_value=datetime.now(timezone.utc))
+        instance.release = AsyncMock()
+        instance.stats = AsyncMock(return_value=(0, None))
+        yield instance
+
+
+@pytest.mark.asyncio
+async def test_run_once_delivers_deletes_and_edits_confirmation(repo):
+    outbox, processor, bot, _ = make_outbox(batch_size=5)
+    repo.claim.return_value = [make_item(1, 10), make_item(2, 11)]
+
+    assert await outbox.run_once() == 2
+
+    repo.claim.assert_called_once_with(5, outbox._lease_seconds)
+    assert [c.args[1] for c in processor.deliver.call_args_list] == [10, 11]
+    assert [c.args[0] for c in repo.delete.call_args_list] == [1, 2]
+    bot.edit_message_text.assert_called_with("sent", chat_id=555, message_id=77)
+
+
+@pytest.mark.asyncio
+async def test_row_with_lost_lease_is_not_delivered(repo):
+    outbox, processor, bot, _ = make_outbox()
+    first, second = make_item(1, 10), make_item(2, 11)
+    repo.claim.return_value = [first, second]
+    # The first delivery outlasted the batch lease; another worker took row 2
+    repo.renew.side_effect = [datetime.now(timezone.utc), None]
+
+    await outbox.run_once()
+
+    assert repo.renew.call_args_list[1].args == (2, second.locked_until, outbox._lease_seconds)
+    assert [c.args[1] for c in processor.deliver.call_args_list] == [10]
+    repo.delete.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_leaves_outbox_with_saved_text(repo):
+    outbox, _, bot, _ = make_outbox(deliver_result=False)
+    repo.claim.return_value = [make_item()]
+
+    await outbox.run_once()
+
+    repo.delete.assert_called_once_with(1)
+    bot.edit_message_text.assert_called_once_with("saved", chat_id=555, message_id=77)
+
+
+@pytest.mark.asyncio
+async def test_crash_keeps_row_for_lease_retry(repo):
+    outbox, processor, bot, _ = make_outbox()
+    processor.deliver.side_effect = RuntimeError("db gone")
+    repo.claim.return_value = [make_item()]
+
+    await outbox.run_once()
+
+    repo.delete.assert_not_called()
+    bot.edit_message_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_exhausted_attempts_mark_lead_error(repo):
+    outbox, processor, _, _ = make_outbox(max_attempts=3)
+    repo.claim.return_value = [make_item(attempts=4)]
+
+    with patch("src.services.outbox.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.update_status = AsyncMock()
+        await outbox.run_once()
+
+    processor.deliver.assert_not_called()
+    assert MockLeadRepo.return_value.update_status.call_args.kwargs["status"] == "error"
+    repo.delete.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_edit_failure_falls_back_to_new_message(repo):
+    outbox, _, bot, _ = make_outbox()
+    bot.edit_message_text.side_effect = RuntimeError("message is too old")
+    repo.claim.return_value = [make_item()]
+
+    await outbox.run_once()
+
+    bot.send_message.assert_called_once_with(555, "sent")
+
+
+@pytest.mark.asyncio
+async def test_workers_wake_up_on_notify(repo):
+    outbox, processor, _, _ = make_outbox(poll_interval=60)
+    outbox.start()
+    try:
+        await asyncio.sleep(0.01)
+        pending = [make_item()]
+        repo.claim.side_effect = lambda *args: [pending.pop()] if pending else []
+        outbox.notify()
+        for _ in range(100):
+            if processor.deliver.called:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await outbox.stop()
+
+    processor.deliver.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stop_finishes_delivery_in_hand_and_releases_the_rest(repo):
+    outbox, processor, bot, _ = make_outbox(workers=1, poll_interval=60)
+    started = asyncio.Event()
+
+    async def deliver(session, lead_id):
+        started.set()
+        await asyncio.sleep(0.05)
+        return True
+
+    processor.deliver = AsyncMock(side_effect=deliver)
+    batches = [[make_item(1, 10), make_item(2, 11)]]
+    repo.claim.side_effect = lambda *args: batches.pop() if batches else []
+    outbox.start()
+    await started.wait()
+    await outbox.stop(grace=5)
+
+    # Lead 10 was delivered and answered; lead 11 was never started
+    assert [c.args[1] for c in processor.deliver.call_args_list] == [10]
+    bot.edit_message_text.assert_called_once()
+    repo.release.assert_awaited_once_with([11])
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_deliveries_past_grace(repo):
+    outbox, processor, _, _ = make_outbox(workers=1, poll_interval=60)
+    started = asyncio.Event()
+
+    async def hang(session, lead_id):
+        started.set()
+        await asyncio.sleep(3600)
+
+    processor.deliver = AsyncMock(side_effect=hang)
+    repo.claim.return_value = [make_item()]
+    outbox.start()
+    await started.wait()
+    await asyncio.wait_for(outbox.stop(grace=0.05), 1)
+
+    repo.delete.assert_not_called()
@@ -0,0 +1,94 @@
+"""Tests for the AmoCRM priority rate limiter."""
+
+import asyncio
+
+import pytest
+
+from src.services.amocrm.rate_limiter import (
+    Priority,
+    PriorityRateLimiter,
+    crm_priority,
+    current_priority,
+)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_served_without_waiting():
+    limiter = PriorityRateLimiter(rate=1, burst=3)
+
+    waits = [await limiter.acquire() for _ in range(3)]
+
+    assert waits == [0.0, 0.0, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_waits_when_bucket_empty():
+    limiter = PriorityRateLimiter(rate=50, burst=1)
+    await limiter.acquire()
+
+    waited = await limiter.acquire()
+
+    assert waited > 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_overtakes_background_backlog():
+    limiter = PriorityRateLimiter(rate=100, burst=1)
+    await limiter.acquire()  # drain the bucket
+    order: list[str] = []
+
+    async def call(name: str, priority: Priority) -> None:
+        await limiter.acquire(priority)
+        order.append(name)
+
+    tasks = [
+        asyncio.create_task(call(f"bg{i}", Priority.BACKGROUND)) for i in range(3)
+    ]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("live", Priority.INTERACTIVE)))
+    await asyncio.gather(*tasks)
+
+    assert order[0] == "live"
+    assert order[1:] == ["bg0", "bg1", "bg2"]
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_tracks_waiters():
+    limiter = PriorityRateLimiter(rate=20, burst=1)
+    await limiter.acquire()
+
+    tasks = [asyncio.create_task(limiter.acquire()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 2
+
+    await asyncio.gather(*tasks)
+    assert limiter.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_consume_token():
+    limiter = PriorityRateLimiter(rate=20, burst=1)
+    await limiter.acquire()
+
+    cancelled = asyncio.create_task(limiter.acquire())
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await asyncio.wait_for(waiting, timeout=1) > 0
+
+
+@pytest.mark.asyncio
+async def test_zero_rate_disables_limiting():
+    limiter = PriorityRateLimiter(rate=0, burst=1)
+
+    waits = [await limiter.acquire() for _ in range(10)]
+
+    assert waits == [0.0] * 10
+
+
+def test_crm_priority_context():
+    assert current_priority() is Priority.INTERACTIVE
+    with crm_priority(Priority.BACKGROUND):
+        assert current_priority() is Priority.BACKGROUND
+    assert current_priority() is Priority.INTERACTIVE
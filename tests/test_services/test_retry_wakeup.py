@@ -0,0 +1,77 @@
+"""Tests for the LISTEN/NOTIFY retry scheduler wakeup."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.services.retry_wakeup import (
+    CRM_RECOVERED,
+    RetryWakeup,
+    announce_crm_recovered,
+    asyncpg_dsn,
+)
+
+
+def test_asyncpg_dsn_drops_driver_and_keeps_password():
+    assert (
+        asyncpg_dsn("postgresql+asyncpg://user:secret@db:5432/smartdrive")
+        == "postgresql://user:secret@db:5432/smartdrive"
+    )
+
+
+async def test_wait_times_out_without_notification():
+    wakeup = RetryWakeup(dsn="postgresql://unused")
+    assert await wakeup.wait(0.01) is False
+
+
+async def test_notification_ends_wait_early():
+    wakeup = RetryWakeup(dsn="postgresql://unused")
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.01, wakeup._on_notify, None, 1, "lead_retry", "lead_failed")
+
+    started = loop.time()
+    assert await wakeup.wait(5) is True
+    assert loop.time() - started < 1
+    # Consumed: the next wait sleeps again
+    assert await wakeup.wait(0.01) is False
+
+
+async def test_listener_reconnects_and_wakes_after_drop():
+    first, second = MagicMock(), MagicMock()
+    for conn in (first, second):
+        conn.add_listener = AsyncMock()
+        conn.is_closed.return_value = False
+        conn.close = AsyncMock()
+    first.execute = AsyncMock(side_effect=ConnectionError("gone"))
+    second.execute = AsyncMock()
+    connect = AsyncMock(side_effect=[first, second])
+
+    wakeup = RetryWakeup(dsn="postgresql://unused")
+    with patch("src.services.retry_wakeup.asyncpg.connect", connect), \
+         patch("src.services.retry_wakeup.PING_INTERVAL_SECONDS", 0.01):
+        wakeup.start()
+        # Woken on connect (notifications may have been missed)
+        assert await wakeup.wait(1) is True
+        for _ in range(100):
+            if connect.await_count == 2:
+                break
+            await asyncio.sleep(0.01)
+        await wakeup.stop()
+
+    assert connect.await_count == 2
+    first.close.assert_awaited_once()
+    second.add_listener.assert_awaited_once_with("lead_retry", wakeup._on_notify)
+
+
+async def test_announce_crm_recovered_reschedules_and_notifies():
+    session = AsyncMock()
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch("src.services.retry_wakeup.LeadRepository") as MockLeadRepo:
+        MockLeadRepo.return_value.make_due_now = AsyncMock(return_value=3)
+        MockLeadRepo.return_value.notify_retry = AsyncMock()
+        await announce_crm_recovered(factory)
+
+    MockLeadRepo.return_value.notify_retry.assert_awaited_once_with(CRM_RECOVERED)
+    session.commit.assert_awaited_once()
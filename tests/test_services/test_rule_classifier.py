@@ -0,0 +1,69 @@
+"""Tests for the rule-based pre-classifier."""
+
+import pytest
+
+from src.services.openai_client.rules import RuleClassifier
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return RuleClassifier()
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("продам камри 2018", "sell"),
+    ("куплю солярис до 1 млн", "buy"),
+    ("нужен подбор авто", "find"),
+    ("сколько стоит проверка", "check"),
+    ("нужен юрист", "legal"),
+])
+def test_obvious_messages_clear_the_threshold(classifier, message, intent):
+    response = classifier.classify(message)
+    assert response.intent == intent
+    assert response.confidence >= 0.85
+    assert response.model_used == "rules"
+    assert response.reply
+
+
+@pytest.mark.parametrize("message", ["привет", "какой у вас адрес?", "спасибо"])
+def test_no_match_is_unknown(classifier, message):
+    response = classifier.classify(message)
+    assert response.intent == "unknown"
+    assert response.confidence == 0.0
+
+
+def test_wanting_to_sell_is_not_buying(classifier):
+    response = classifier.classify("хочу продать машину")
+    assert response.intent == "sell"
+    assert response.confidence >= 0.85
+
+
+@pytest.mark.parametrize("message", [
+    "не продам машину",
+    "не хочу продавать машину",
+    "не собираюсь купить машину",
+])
+def test_negated_intent_is_left_to_the_model(classifier, message):
+    assert classifier.classify(message).confidence < 0.5
+
+
+def test_negation_only_covers_the_next_words(classifier):
+    assert classifier.classify("продам, не битая").intent == "sell"
+
+
+def test_competing_intents_lower_confidence(classifier):
+    # Check vs legal: neither should skip the model
+    assert classifier.classify("проверка юридической чистоты авто").confidence < 0.5
+
+
+def test_entities(classifier):
+    entities = classifier.classify("Продаю Kia Rio 2016, пробег 120 тыс, цена 900 тыс").entities
+    assert entities == {
+        "brand": "Kia",
+        "model": "Rio",
+        "year": "2016",
+        "budget": "900000",
+        "mileage": "120000",
+    }
+    assert classifier.extract_entities("ищу тойоту до 2,5 млн")["budget"] == "2500000"
+    assert classifier.extract_entities("продам ладу весту")["model"] == "Vesta"
@@ -0,0 +1,149 @@
+"""Tests for the Redis-shared AmoCRM token store (several replicas, one Redis)."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+import pytest
+
+from src.services.amocrm.auth import AmoCRMAuth
+from src.services.amocrm.token_store import RedisTokenStore, TokenPair
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_store(server) -> RedisTokenStore:
+    return RedisTokenStore(fakeredis.FakeAsyncRedis(server=server))
+
+
+class FakeOAuth:
+    """Stands in for AmoCRM's token endpoint: refresh tokens are single-use."""
+
+    def __init__(self, valid_refresh: str) -> None:
+        self.valid_refresh = valid_refresh
+        self.calls = 0
+
+    async def post_refresh(self, _http_session, payload: dict) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        if payload["refresh_token"] != self.valid_refresh:
+            raise RuntimeError("AmoCRM token refresh failed: 400")
+        self.valid_refresh = f"refresh_{self.calls}"
+        return {
+            "access_token": f"access_{self.calls}",
+            "refresh_token": self.valid_refresh,
+            "expires_in": 86400,
+        }
+
+
+def make_replica(server, oauth: FakeOAuth) -> AmoCRMAuth:
+    auth = AmoCRMAuth(
+        session_factory=MagicMock(),
+        http_session=MagicMock(),
+        token_store=make_store(server),
+    )
+    auth._post_refresh = oauth.post_refresh
+    auth._save_to_db = AsyncMock()
+    auth._load_from_db = AsyncMock()
+    return auth
+
+
+async def seed(server, access: str, refresh: str, expires_in: float) -> None:
+    store = make_store(server)
+    fence = await store.acquire()
+    pair = TokenPair(
+        access, refresh, datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+    )
+    assert await store.save(pair, fence)
+    await store.release(fence)
+
+
+@pytest.mark.asyncio
+async def test_replicas_refresh_once_and_share_the_pair(server):
+    await seed(server, "access_0", "refresh_0", expires_in=60)
+    oauth = FakeOAuth("refresh_0")
+    replicas = [make_replica(server, oauth) for _ in range(3)]
+
+    tokens = await asyncio.gather(*(
+        auth.get_access_token() for auth in replicas for _ in range(5)
+    ))
+
+    assert oauth.calls == 1
+    assert set(tokens) == {"access_1"}
+    assert sum(auth._save_to_db.call_count for auth in replicas) == 1
+    for auth in replicas:
+        auth._load_from_db.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_replica_adopts_pair_on_401_instead_of_refreshing(server):
+    await seed(server, "access_0", "refresh_0", expires_in=3600)
+    oauth = FakeOAuth("refresh_0")
+    first, second = make_replica(server, oauth), make_replica(server, oauth)
+    assert await first.get_access_token() == "access_0"
+    assert await second.get_access_token() == "access_0"
+
+    await first.handle_401("access_0")
+    await second.handle_401("access_0")
+
+    assert oauth.calls == 1
+    assert await second.get_access_token() == "access_1"
+
+
+@pytest.mark.asyncio
+async def test_store_is_seeded_from_db_when_empty(server):
+    auth = make_replica(server, FakeOAuth("unused"))
+
+    async def load():
+        auth._access_token = "db_access"
+        auth._refresh_token = "db_refresh"
+        auth._expires_at = datetime.now(timezone.utc) + timedelta(hours=12)
+
+    auth._load_from_db = AsyncMock(side_effect=load)
+
+    assert await auth.get_access_token() == "db_access"
+    pair = await make_store(server).get()
+    assert (pair.access_token, pair.refresh_token) == ("db_access", "db_refresh")
+
+
+@pytest.mark.asyncio
+async def test_stale_lock_holder_cannot_overwrite_newer_pair(server):
+    store = make_store(server)
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    stale = await store.acquire(ttl=0.05)
+    await asyncio.sleep(0.1)  # lock expires mid-"refresh"
+    current = await store.acquire()
+    assert await store.save(TokenPair("new", "new_r", expires), current)
+    await store.release(current)
+
+    assert not await store.save(TokenPair("old", "old_r", expires), stale)
+    assert (await store.get()).access_token == "new"
+
+
+@pytest.mark.asyncio
+async def test_lock_is_exclusive_and_released_only_by_holder(server):
+    store = make_store(server)
+
+    fence = await store.acquire()
+    assert fence is not None
+    assert await store.acquire() is None
+
+    await store.release(fence + 100)
+    assert await store.acquire() is None
+
+    await store.release(fence)
+    assert await store.acquire() is not None
+
+
+@pytest.mark.asyncio
+async def test_waiter_times_out_when_holder_never_writes(server):
+    store = make_store(server)
+    await store.acquire()
+
+    with patch("src.services.amocrm.token_store.POLL_INTERVAL_SECONDS", 0.01):
+        assert await store.wait_for_newer(0, timeout=0.05) is None
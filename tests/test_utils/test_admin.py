@@ -0,0 +1,128 @@
+"""Tests for admin alert digests."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+import pytest
+
+from src.utils.admin import MAX_FLUSH_FAILURES, AlertDigest
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture(autouse=True)
+def admin_chat():
+    with patch("src.utils.admin.settings.ADMIN_CHAT_ID", 42):
+        yield
+
+
+def make_digest(server, bot=None, **kwargs):
+    bot = bot or MagicMock(send_message=AsyncMock())
+    kwargs.setdefault("flush_interval", 60)
+    kwargs.setdefault("flush_count", 100)
+    kwargs.setdefault("max_per_minute", 3)
+    return AlertDigest(bot, fakeredis.FakeAsyncRedis(server=server), **kwargs), bot
+
+
+async def test_alerts_are_coalesced_by_key(server):
+    digest, bot = make_digest(server)
+    for lead_id in range(37):
+        await digest.record("AmoCRM 503", f"lead #{lead_id}")
+    await digest.record("AmoCRM timeout", "lead #99")
+
+    assert await digest.flush() is True
+
+    bot.send_message.assert_awaited_once()
+    text = bot.send_message.call_args.kwargs["text"]
+    assert "AmoCRM 503: 37 шт." in text
+    assert "lead #36" in text
+    assert "AmoCRM timeout: 1 шт." in text
+    # Sent once: nothing left for the next flush
+    assert await digest.flush() is False
+
+
+async def test_counts_survive_restart(server):
+    digest, _ = make_digest(server)
+    await digest.record("AmoCRM 503", "lead #1")
+    await digest.record("AmoCRM 503", "lead #2")
+
+    restarted, bot = make_digest(server)
+    assert await restarted.flush() is True
+    assert "AmoCRM 503: 2 шт." in bot.send_message.call_args.kwargs["text"]
+
+
+async def test_sends_are_capped_per_minute(server):
+    digest, bot = make_digest(server, max_per_minute=2)
+    for _ in range(3):
+        await digest.record("AmoCRM 503", "lead")
+        await digest.flush()
+
+    assert bot.send_message.await_count == 2
+    # The third batch stays pending for the next minute
+    assert await digest._redis.hget("admin_alerts:counts", "AmoCRM 503") == b"1"
+
+
+async def test_failed_send_keeps_alerts_pending(server):
+    bot = MagicMock(send_message=AsyncMock(side_effect=RuntimeError("telegram down")))
+    digest, _ = make_digest(server, bot=bot)
+    await digest.record("AmoCRM 503", "lead #1")
+
+    assert await digest.flush() is False
+
+    bot.send_message = AsyncMock()
+    assert await digest.flush() is True
+    assert "lead #1" in bot.send_message.call_args.kwargs["text"]
+
+
+async def test_digest_is_plain_text(server):
+    digest, bot = make_digest(server)
+    await digest.record("AmoCRM 502", "AmoCRM API error: 502 <html><body>Bad")
+
+    assert await digest.flush() is True
+    kwargs = bot.send_message.call_args.kwargs
+    assert kwargs["parse_mode"] is None
+    assert "502 <html><body>Bad" in kwargs["text"]
+
+
+async def test_digest_rejected_repeatedly_is_dropped(server):
+    bot = MagicMock(send_message=AsyncMock(side_effect=RuntimeError("bad request")))
+    digest, _ = make_digest(server, bot=bot, max_per_minute=10)
+    await digest.record("AmoCRM 503", "lead #1")
+
+    for _ in range(MAX_FLUSH_FAILURES):
+        assert await digest.flush() is False
+
+    assert bot.send_message.await_count == MAX_FLUSH_FAILURES
+    # Later alerts aren't stuck behind it
+    assert not await digest._redis.exists("admin_alerts:counts")
+
+
+async def test_count_threshold_triggers_early_flush(server):
+    digest, bot = make_digest(server, flush_interval=3600, flush_count=3)
+    digest.start()
+    try:
+        for _ in range(3):
+            await digest.record("AmoCRM 503", "lead")
+        for _ in range(100):
+            if bot.send_message.await_count:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await digest.stop()
+
+    bot.send_message.assert_awaited_once()
+
+
+async def test_redis_failure_falls_back_to_direct_send():
+    redis = MagicMock()
+    redis.register_script.return_value = AsyncMock(side_effect=ConnectionError("down"))
+    bot = MagicMock(send_message=AsyncMock())
+    digest = AlertDigest(bot, redis, flush_interval=60, flush_count=10, max_per_minute=3)
+
+    await digest.record("AmoCRM 503", "lead #1")
+
+    bot.send_message.assert_awaited_once_with(chat_id=42, text="AmoCRM 503\nlead #1")
@@ -0,0 +1,46 @@
+"""Tests for IdempotencyGuard."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import pytest
+
+from src.utils.idempotency import PENDING, IdempotencyGuard
+
+
+@pytest.fixture
+def guard():
+    return IdempotencyGuard(fakeredis.FakeAsyncRedis(), "test", ttl=60)
+
+
+async def test_first_call_claims_key(guard):
+    assert await guard.begin("k") is None
+
+
+async def test_duplicate_sees_pending_then_outcome(guard):
+    await guard.begin("k")
+    assert await guard.begin("k") == PENDING
+
+    await guard.finish("k", "sent")
+    assert await guard.begin("k") == "sent"
+
+
+async def test_abort_releases_key(guard):
+    await guard.begin("k")
+    await guard.abort("k")
+
+    assert await guard.begin("k") is None
+
+
+async def test_finish_does_not_resurrect_released_key(guard):
+    await guard.finish("k", "sent")
+
+    assert await guard.begin("k") is None
+
+
+async def test_redis_failure_lets_call_through():
+    redis = MagicMock()
+    redis.set = AsyncMock(side_effect=ConnectionError("down"))
+    guard = IdempotencyGuard(redis, "test", ttl=60)
+
+    assert await guard.begin("k") is None
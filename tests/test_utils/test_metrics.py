@@ -0,0 +1,65 @@
+"""Tests for the in-process metrics registry."""
+
+import pytest
+
+from src.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_counter_with_labels_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.register(
+        Counter("test_requests_total", "Requests", ["method"])
+    )
+
+    requests.labels("GET").inc()
+    requests.labels("GET").inc()
+    requests.labels("POST").inc(3)
+
+    text = registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{method="GET"} 2' in text
+    assert 'test_requests_total{method="POST"} 3' in text
+
+
+def test_gauge_without_labels():
+    registry = MetricsRegistry()
+    depth = registry.register(Gauge("test_depth", "Depth"))
+
+    depth.inc()
+    depth.inc()
+    depth.dec()
+
+    assert depth.value == 1
+    assert "test_depth 1" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.register(
+        Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    )
+
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_latency_seconds_count 3" in text
+
+
+def test_register_returns_existing_metric():
+    registry = MetricsRegistry()
+    first = registry.register(Counter("test_total", "Total"))
+    second = registry.register(Counter("test_total", "Total"))
+
+    assert first is second
+
+
+def test_wrong_label_count_raises():
+    metric = Counter("test_labelled_total", "Total", ["a", "b"])
+
+    with pytest.raises(ValueError):
+        metric.labels("only-one")
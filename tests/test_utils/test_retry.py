@@ -1,6 +1,6 @@
 import pytest
 
-from src.utils.retry import async_retry
+from src.utils.retry import async_retry, backoff_delay
 
 
 class FakeHTTPError(Exception):
@@ -77,3 +77,15 @@ async def test_retry_does_not_catch_unrelated_exception():
 
     with pytest.raises(TypeError, match="wrong type"):
         await wrong_error()
+
+
+def test_backoff_delay_grows_exponentially_with_jitter():
+    for attempt, full in enumerate([60, 120, 240, 480]):
+        delays = [backoff_delay(attempt, 60, 2, 3600) for _ in range(50)]
+        assert all(full / 2 <= delay <= full for delay in delays)
+        # Jittered: simultaneous failures don't get the same slot
+        assert len(set(delays)) > 1
+
+
+def test_backoff_delay_is_capped():
+    assert backoff_delay(20, 60, 2, 3600, jitter=0) == 3600
@@ -0,0 +1,139 @@
+"""Tests for single-flight call coalescing."""
+
+import asyncio
+
+import pytest
+
+from src.utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flights.do("k", fn) for _ in range(10)))
+
+    assert calls == 1
+    assert results == [1] * 10
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flights = SingleFlight("test")
+    seen = []
+
+    async def fn(key):
+        seen.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    results = await asyncio.gather(
+        flights.do("a", lambda: fn("a")), flights.do("b", lambda: fn("b")),
+    )
+
+    assert results == ["a", "b"]
+    assert sorted(seen) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_is_cancelled():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(flights.do("k", fn))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flights.do("k", fn)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    # Not a cancellation of their own: one of them runs fn, the others share it
+    assert await asyncio.gather(*followers) == [2, 2, 2]
+    assert leader.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_exception_is_shared_and_key_released():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(flights.do("k", failing) for _ in range(3)), return_exceptions=True,
+    )
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return "fresh"
+
+    assert await flights.do("k", ok) == "fresh"
+
+
+class FakeLock:
+    def __init__(self, acquired=True):
+        self.acquired = acquired
+        self.released = False
+
+    async def acquire(self):
+        return self.acquired
+
+    async def release(self):
+        self.released = True
+
+
+class FakeRedis:
+    def __init__(self, acquired=True):
+        self.locks = []
+        self._acquired = acquired
+
+    def lock(self, name, timeout, blocking_timeout):
+        lock = FakeLock(self._acquired)
+        lock.name = name
+        lock.blocking_timeout = blocking_timeout
+        self.locks.append(lock)
+        return lock
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_wraps_execution():
+    redis = FakeRedis()
+    flights = SingleFlight("contact", redis=redis, lock_timeout=10.0)
+
+    async def fn():
+        return 42
+
+    assert await flights.do("+79991234567", fn, wait=2.0) == 42
+    (lock,) = redis.locks
+    assert lock.name == "singleflight:contact:+79991234567"
+    assert lock.blocking_timeout == 2.0
+    assert lock.released
+
+
+@pytest.mark.asyncio
+async def test_runs_without_lock_when_not_acquired():
+    redis = FakeRedis(acquired=False)
+    flights = SingleFlight("contact", redis=redis)
+
+    async def fn():
+        return "done"
+
+    assert await flights.do("k", fn) == "done"
+    assert not redis.locks[0].released